@@ -12,12 +12,17 @@ class ValveData():
     def __init__(self, name) -> None:
         self._name = name
 
-    def set_opening_closing(self, open, closed):
+    def set_opening_closing(self, open, closed, t_open=None, t_closed=None):
         self._open = open
         self._closed = closed
+        self._t_open = t_open
+        self._t_closed = t_closed
 
     def __repr__(self) -> str:
-        return f"Valve {self._name}: \n" + f" - opening ind: {self._open} \n" + f" - closing ind: {self._closed} \n"
+        out = f"Valve {self._name}: \n" + f" - opening ind: {self._open} \n" + f" - closing ind: {self._closed} \n"
+        if self._t_open is not None:
+            out += f" - opening time: {self._t_open:.4e} \n" + f" - closing time: {self._t_closed:.4e} \n"
+        return out
 
     @property
     def open(self):
@@ -27,6 +32,14 @@ class ValveData():
     def closed(self):
         return self._closed
 
+    @property
+    def t_open(self):
+        return self._t_open
+
+    @property
+    def t_closed(self):
+        return self._t_closed
+
 
 class VentricleData():
     def __init__(self, name:str, volume_unit:str='ml') -> None:
@@ -175,6 +188,9 @@ class BaseAnalysis():
         Output values are stored in:
             - `self.valve[component].open`
             - `self.valve[component].closed`
+        When the model was solved with events (see `Solver.setup`) the opening and closing are the zero crossings
+        of the pressure difference located by the solver, their exact times (relative to the start of the analysed
+        cycles) are stored in `self.valve[component].t_open` and `self.valve[component].t_closed`.
 
         ## Inputs
         component : str
@@ -186,6 +202,23 @@ class BaseAnalysis():
         nshift= int(shift/ self.model.time_object.dt)
         self.valves[component] = ValveData(component)
 
+        events = valve._Q_i.events
+        if not hasattr(valve, 'PHI') and events is not None:
+            dt = self.model.time_object.dt
+            t0 = self.model.time_object._sym_t.values[self.tind[0]]
+            tl = len(self.tind) * dt
+            events = events[(events['switch'] == 0) & (events['t'] >= t0) & (events['t'] < t0 + tl)]
+            times  = (events['t'].values - t0 - shift) % tl
+            opening = times[events['direction'].values > 0]
+            closing = times[events['direction'].values < 0]
+            if len(opening) > 0 and len(closing) > 0:
+                t_open, t_closed = np.min(opening), np.max(closing)
+                self.valves[component].set_opening_closing(open  = min(int(np.ceil(t_open / dt)), len(self.tind) - 1),
+                                                           closed= int(np.floor(t_closed / dt)),
+                                                           t_open= t_open,
+                                                           t_closed=t_closed)
+                return
+
         if not hasattr(valve, 'PHI'):
             pi    = valve.P_i.values[self.tind]
             po    = valve.P_o.values[self.tind]
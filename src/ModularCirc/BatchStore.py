@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+
+# status of the cases of a store
+PENDING   = 0
+CONVERGED = 1
+FAILED    = -1
+
+
+class BatchStore():
+    """
+    On-disk store of the outputs of a batch, filled case by case as the results arrive (see `BatchRunner.run_batch`).
+
+    The outputs of the cases are stored in a memory-mapped block of shape (cases, time points, outputs), the file
+    `outputs.npy` (NaN for the cases which did not converge or are not solved yet), the status and the number of
+    time points of every case in `status.npy` and `lengths.npy` (the cycles of cases with different durations may
+    differ by one time point), and the labels of the cases, the names of the outputs and the number of time points
+    of the block in `meta.json`.
+    The block is mapped, not loaded, so the slices (e.g. `store[:100, :, 0]`) are only read from the disk when
+    they are accessed.
+    """
+    def __init__(self, path:str, mode:str='r') -> None:
+        """
+        ## Inputs
+        path : str
+            directory of the store.
+        mode : str
+            'r' to read the store, 'r+' to write the outputs of the cases.
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        self.index   = pd.Index(meta['index'], name='realization')
+        self.columns = list(meta['columns'])
+        self._outputs = np.load(os.path.join(path, 'outputs.npy'), mmap_mode=mode)
+        self._status  = np.load(os.path.join(path, 'status.npy'), mmap_mode=mode)
+        self._lengths = np.load(os.path.join(path, 'lengths.npy'), mmap_mode=mode)
+        self._position = {label: i for i, label in enumerate(self.index)}
+
+    @classmethod
+    def create(cls, path:str, index, columns:list, n_t:int) -> 'BatchStore':
+        """
+        Creates an empty store for the cases `index`, with `n_t` time points and the outputs `columns`, and
+        returns it open for writing.
+        """
+        os.makedirs(path, exist_ok=True)
+        outputs = np.lib.format.open_memmap(os.path.join(path, 'outputs.npy'), mode='w+', dtype=np.float64,
+                                           shape=(len(index), n_t, len(columns)))
+        outputs[:] = np.nan
+        outputs.flush()
+        status = np.lib.format.open_memmap(os.path.join(path, 'status.npy'), mode='w+', dtype=np.int8,
+                                          shape=(len(index),))
+        status[:] = PENDING
+        status.flush()
+        lengths = np.lib.format.open_memmap(os.path.join(path, 'lengths.npy'), mode='w+', dtype=np.int64,
+                                           shape=(len(index),))
+        lengths[:] = 0
+        lengths.flush()
+        del outputs, status, lengths
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump({'index': pd.Index(index).tolist(), 'columns': list(columns), 'n_t': int(n_t)}, file)
+        return cls(path, mode='r+')
+
+    @staticmethod
+    def exists(path:str) -> bool:
+        """ True if the directory `path` holds a store (the metadata are written once the files are created)."""
+        return os.path.exists(os.path.join(path, 'meta.json'))
+
+    @staticmethod
+    def remove(path:str) -> None:
+        """ Removes the files of the store in the directory `path`, if any."""
+        for name in ['meta.json', 'outputs.npy', 'status.npy', 'lengths.npy']:
+            if os.path.exists(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def position(self, label) -> int:
+        """ Position of the case `label` along the first axis of the block."""
+        return self._position[label]
+
+    def write(self, label, output) -> None:
+        """
+        Writes the outputs of the case `label`, a frame with the time points in rows (at most the time points of the
+        block) and the outputs of the store in columns, or an array of the outputs in the order of the columns of
+        the store, or False when the case did not converge.
+        """
+        i = self._position[label]
+        if output is False:
+            self._status[i] = FAILED
+            return
+        if len(output) > self._outputs.shape[1]:
+            raise Exception(f"The case {label} has {len(output)} time points, the store {self.n_t}.")
+        if isinstance(output, pd.DataFrame):
+            output = output[self.columns].to_numpy(dtype=np.float64)
+        self._outputs[i, :len(output)] = output
+        self._lengths[i] = len(output)
+        self._status[i]  = CONVERGED
+
+    def flush(self) -> None:
+        """ Writes the changes of the mapped files to the disk."""
+        self._outputs.flush()
+        self._status.flush()
+        self._lengths.flush()
+
+    @property
+    def n_cases(self) -> int:
+        return len(self.index)
+
+    @property
+    def n_t(self) -> int:
+        """ Number of time points of the block, 0 for the store of a batch where no case converged."""
+        return self._outputs.shape[1]
+
+    @property
+    def status(self) -> pd.Series:
+        """ Status of every case, `CONVERGED`, `FAILED` or `PENDING`."""
+        return pd.Series(np.array(self._status), index=self.index, name='status')
+
+    @property
+    def converged(self) -> pd.Series:
+        return self.status == CONVERGED
+
+    def __getitem__(self, key) -> np.ndarray[float]:
+        """ Slice of the block of outputs (cases, time points, outputs), read from the disk."""
+        return np.array(self._outputs[key])
+
+    def case(self, label) -> pd.DataFrame:
+        """ Outputs of the case `label` (one row per time point), None when the case did not converge."""
+        i = self._position[label]
+        if self._status[i] != CONVERGED:
+            return None
+        n_t = int(self._lengths[i])
+        return pd.DataFrame(self[i, :n_t], columns=self.columns, index=pd.RangeIndex(n_t, name='time_ind'))
+
+    def to_frame(self, labels=None) -> pd.DataFrame:
+        """
+        Outputs of the converged cases among `labels` (default all) in a single frame indexed by (realization,
+        time_ind), as the outputs of `BatchRunner.run_batch` without a store.
+        """
+        labels = self.index if labels is None else pd.Index(labels)
+        frames = [self.case(label) for label in labels]
+        frames = {label: frame for label, frame in zip(labels, frames) if frame is not None}
+        if len(frames) == 0:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, names=['realization', 'time_ind'])
+
+    def __repr__(self) -> str:
+        status = self.status
+        return (f"BatchStore: {self.n_cases} cases x {self.n_t} time points x {len(self.columns)} "
+                f"outputs at {self.path} \n - converged: {int(np.sum(status == CONVERGED))}, "
+                f"failed: {int(np.sum(status == FAILED))}, pending: {int(np.sum(status == PENDING))}")
+
+
+class BatchManifest():
+    """
+    Manifest of the run directory of a batch: the parameters of the samples, in `samples.csv`, and a journal of the
+    solved samples, in `manifest.csv`. The journal gets one line per sample as soon as its outputs are stored
+    (see `BatchRunner.run_batch`): status, wall clock time, number of cycles and location of the outputs. The lines
+    are only appended, so a run which is killed loses at most the samples being solved, and the last line of a
+    sample gives its status. The samples without a line are pending.
+    """
+    COLUMNS = ['realization', 'status', 'wall_time', 'n_cycles', 'output']
+
+    def __init__(self, path:str, samples:pd.DataFrame, resume:bool=False) -> None:
+        """
+        ## Inputs
+        path : str
+            run directory of the batch.
+        samples : pd.DataFrame
+            parameters of the samples, one row per sample.
+        resume : bool
+            flag used to continue the journal of a previous run, whose samples need to be the same. Otherwise the
+            manifest is started again.
+        """
+        self.path = path
+        self._samples_path = os.path.join(path, 'samples.csv')
+        self._journal_path = os.path.join(path, 'manifest.csv')
+        os.makedirs(path, exist_ok=True)
+        if resume and os.path.exists(self._samples_path) and os.path.exists(self._journal_path):
+            recorded = pd.read_csv(self._samples_path, index_col=0)
+            if not (list(recorded.index) == list(samples.index) and list(recorded.columns) == list(samples.columns)
+                    and np.allclose(recorded.to_numpy(dtype=np.float64), samples.to_numpy(dtype=np.float64),
+                                    rtol=1e-12, atol=0.0, equal_nan=True)):
+                raise Exception(f"The samples are not the ones of the batch in {path}, it can not be resumed.")
+            # a line cut by the end of the previous run is closed, it is skipped when the journal is read
+            with open(self._journal_path, 'rb') as file:
+                closed = True
+                if file.seek(0, os.SEEK_END) > 0:
+                    file.seek(-1, os.SEEK_END)
+                    closed = file.read(1) == b'\n'
+            if not closed:
+                with open(self._journal_path, 'a') as file:
+                    file.write('\n')
+        else:
+            temp = f'{self._samples_path}.{os.getpid()}.tmp'
+            samples.to_csv(temp)
+            os.replace(temp, self._samples_path)
+            with open(self._journal_path, 'w') as file:
+                file.write(','.join(self.COLUMNS) + '\n')
+        self._samples = samples
+
+    def record(self, label, status:str, wall_time:float=np.nan, n_cycles:int=-1, output:str='') -> None:
+        """ Appends the line of the sample `label` to the journal, `status` is 'converged' or 'failed'."""
+        with open(self._journal_path, 'a') as file:
+            file.write(f'{label},{status},{wall_time!r},{n_cycles},{output}\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    @property
+    def table(self) -> pd.DataFrame:
+        """
+        Parameters and last journal line of every sample, one row per sample, the status of the samples without
+        a line is 'pending'.
+        """
+        journal = pd.read_csv(self._journal_path, on_bad_lines='skip', dtype={'status': str, 'output': str})
+        journal = journal[journal['status'].isin(['converged', 'failed'])]
+        journal['realization'] = journal['realization'].astype(self._samples.index.dtype)
+        journal = journal.drop_duplicates('realization', keep='last').set_index('realization')
+        table = self._samples.join(journal, how='left')
+        table['status'] = table['status'].fillna('pending')
+        return table
+
+    @property
+    def completed(self) -> pd.Index:
+        """ Samples which converged, the other ones are solved again when the batch is resumed."""
+        table = self.table
+        return table.index[table['status'] == 'converged']
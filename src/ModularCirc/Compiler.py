@@ -0,0 +1,399 @@
+import numpy as np
+import numba as nb
+import hashlib
+import os
+import sys
+import types
+
+from numba.core.registry import CPUDispatcher
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Cache of the numba twins of the python kernels, shared by all the compiled models.
+_JIT_KERNELS = dict()
+
+
+@nb.njit
+def _scalar(x):
+    """Kernels relying on `np.where` return 0-d arrays, this maps every kernel output to a float."""
+    return np.asarray(x).ravel()[0]
+
+
+def jit_kernel(func):
+    """
+    Returns the numba compiled twin of a plain python kernel (e.g. the functions in `HelperRoutines`).
+
+    The python version of the kernel is left untouched, the global functions it calls (e.g. `time_shift`)
+    and the functions used as default values are replaced by their own compiled twins.
+
+    Args:
+        func (function): python kernel
+
+    Returns:
+        CPUDispatcher: numba compiled kernel
+    """
+    if isinstance(func, CPUDispatcher):
+        return func
+    if func in _JIT_KERNELS:
+        return _JIT_KERNELS[func]
+    if not isinstance(func, types.FunctionType):
+        raise Exception(f'Kernel {func} can not be compiled, only python functions are supported.')
+
+    globals_ = dict(func.__globals__)
+    for name in func.__code__.co_names:
+        if isinstance(globals_.get(name), types.FunctionType):
+            globals_[name] = jit_kernel(globals_[name])
+
+    def jit_value(val):
+        return jit_kernel(val) if isinstance(val, types.FunctionType) else val
+
+    closure  = None if func.__closure__ is None else \
+        tuple(types.CellType(jit_value(cell.cell_contents)) for cell in func.__closure__)
+    defaults = None if func.__defaults__ is None else tuple(jit_value(val) for val in func.__defaults__)
+
+    twin = types.FunctionType(func.__code__, globals_, func.__name__, defaults, closure)
+    _JIT_KERNELS[func] = nb.njit(twin)
+    return _JIT_KERNELS[func]
+
+
+def _code_fingerprint(code:types.CodeType) -> str:
+    consts = [_code_fingerprint(const) if isinstance(const, types.CodeType) else repr(const)
+              for const in code.co_consts]
+    return f"{code.co_code.hex()}|{','.join(consts)}|{','.join(code.co_names)}"
+
+
+def fingerprint(obj, seen:set=None) -> str:
+    """
+    Returns a string identifying a kernel (or a kernel parameter) by its content: the bytecode of the function,
+    its default values, the contents of its closure and the functions it calls, so two kernels with the same
+    fingerprint compile to the same code. Used to key the on-disk cache of the compiled models.
+    """
+    seen = set() if seen is None else seen
+    if isinstance(obj, CPUDispatcher):
+        obj = obj.py_func
+    if isinstance(obj, types.FunctionType):
+        if id(obj) in seen:
+            return obj.__qualname__
+        seen.add(id(obj))
+        parts = [obj.__module__ or '', obj.__qualname__, _code_fingerprint(obj.__code__)]
+        parts += [fingerprint(val, seen) for val in (obj.__defaults__ or ())]
+        parts += [fingerprint(cell.cell_contents, seen) for cell in (obj.__closure__ or ())]
+        parts += [fingerprint(obj.__globals__[name], seen) for name in obj.__code__.co_names
+                  if isinstance(obj.__globals__.get(name), (types.FunctionType, CPUDispatcher))]
+        return '(' + ';'.join(parts) + ')'
+    if isinstance(obj, np.ndarray):
+        return f'array({obj.dtype},{obj.shape},{hashlib.sha256(obj.tobytes()).hexdigest()})'
+    if isinstance(obj, tuple):
+        return '(' + ','.join(fingerprint(val, seen) for val in obj) + ')'
+    return repr(obj)
+
+
+# Tolerance (on the Newton step, relative to the largest secondary variable) and maximum number of iterations of
+# the Newton solver of the secondary state variables.
+NEWTON_TOL      = 1.0e-10
+NEWTON_MAX_ITER = 50
+
+
+def secondary_dependencies(ssv_ids:dict) -> np.ndarray[bool]:
+    """
+    Dependency pattern of the secondary state variables on each other, entry (i, j) is True when the i-th secondary
+    function (in the order of `ssv_ids`) reads the j-th secondary state variable.
+    """
+    keys4 = np.array(list(ssv_ids.keys()), dtype=np.int64)
+    pattern = np.zeros((len(keys4), len(keys4)), dtype=bool)
+    for i, ids in enumerate(ssv_ids.values()):
+        pattern[i] = np.isin(keys4, np.asarray(ids))
+    return pattern
+
+
+def secondary_order(pattern:np.ndarray[bool]) -> list[tuple[np.ndarray[int], bool]]:
+    """
+    Evaluation order of the secondary state variables from their dependency pattern (see `secondary_dependencies`):
+    the strongly connected components of the dependency graph, each one after the components it reads. Returns
+    (indexes, loop) pairs, `loop` flags the algebraic loops (several variables, or one variable reading itself)
+    which need to be iterated, the other variables are computed exactly in a single evaluation.
+    """
+    n = pattern.shape[0]
+    if n == 0:
+        return []
+    n_comp, labels = connected_components(csr_matrix(pattern), directed=True, connection='strong')
+    members = [np.flatnonzero(labels == c) for c in range(n_comp)]
+    reads = [set(labels[np.flatnonzero(np.any(pattern[comp], axis=0))]) - {c} for c, comp in enumerate(members)]
+
+    # topological sort (Kahn), the ready components are taken in the order of their first variable
+    order, done = [], set()
+    while len(order) < n_comp:
+        ready = [c for c in range(n_comp) if c not in done and reads[c] <= done]
+        c = min(ready, key=lambda c: members[c][0])
+        order.append((members[c], len(members[c]) > 1 or bool(pattern[members[c][0], members[c][0]])))
+        done.add(c)
+    return order
+
+
+def column_coloring(pattern:np.ndarray[bool]) -> np.ndarray[int]:
+    """
+    Greedy coloring of the columns of a sparsity pattern, the columns sharing a color have no row in common, so
+    their finite differences are taken together with a single evaluation of the function (Curtis, Powell, Reid).
+    """
+    colors = np.full(pattern.shape[1], -1, dtype=np.int64)
+    for j in range(pattern.shape[1]):
+        used = {colors[k] for k in range(j) if np.any(pattern[:, j] & pattern[:, k])}
+        colors[j] = min(set(range(j + 1)) - used)
+    return colors
+
+
+def newton_secondary(s_u, t, y, P, keys, pattern, colors, tol, max_iter) -> bool:
+    """
+    Solves the secondary state variables `y[keys]` of the state vector `y` in place with a Newton iteration on the
+    residual z - s_u(t, y, P), starting from the values in `y`. The Jacobian of the secondary functions is
+    approximated by finite differences, one evaluation per color of its columns (see `column_coloring`).
+
+    Plain python, so it runs with the python secondary functions and, compiled by `CompiledModel`, with the numba
+    compiled ones. Returns False when the iteration does not converge.
+    """
+    n = len(keys)
+    if n == 0:
+        return True
+    z = y[keys].copy()
+    for _ in range(max_iter):
+        s0 = s_u(t, y, P)
+        r  = z - s0
+        if not np.all(np.isfinite(r)):
+            return False
+        A = np.eye(n)
+        for c in range(colors.max() + 1):
+            h = np.zeros(n)
+            for j in range(n):
+                if colors[j] == c:
+                    h[j] = 1.4901161193847656e-08 * max(abs(z[j]), 1.0)
+            y[keys] = z + h
+            ds = s_u(t, y, P) - s0
+            for j in range(n):
+                if colors[j] == c:
+                    for i in range(n):
+                        if pattern[i, j]:
+                            A[i, j] -= ds[i] / h[j]
+        dz = np.linalg.solve(A, r)
+        z  = z - dz
+        y[keys] = z
+        if not np.all(np.isfinite(z)):
+            return False
+        if np.max(np.abs(dz)) <= tol * (1.0 + np.max(np.abs(z))):
+            return True
+    return False
+
+
+_NEWTON_SECONDARY = nb.njit(newton_secondary)
+
+
+class CompiledModel():
+    """
+    Straight-line, numba compiled version of the functions generated by `Solver.generate_dfdt_functions`.
+
+    Every state variable function is described by a (kernel, parameters) pair, see `StateVariable.set_dudt_func`.
+    The numerical values of the parameters are not frozen in the compiled code, they are stored in the parameter
+    vector `P` (first entry is the duration of the heart cycle) which is passed to the compiled functions at run time.
+    Python callables found among the parameters (e.g. activation functions) are compiled and baked in the code.
+    The models whose secondary state variables depend on each other solve them with `s_u_newton` (compiled
+    `newton_secondary`) and compute the derivatives from the solved state vector with `pv_dfdt_update_secondary`.
+
+    With a `cache_dir`, the generated code is written to `cache_dir/compiled_<key>.py` and imported from there, so
+    numba caches the compiled functions next to it and the processes building a model with the same `key` (e.g.
+    `Solver.topology_hash`) load them instead of compiling them again.
+    """
+    def __init__(self,
+                 init_specs:dict,
+                 init_ids:dict,
+                 ssv_specs:dict,
+                 ssv_ids:dict,
+                 psv_specs:dict,
+                 psv_ids:dict,
+                 perm:np.ndarray[int],
+                 N_sv:int,
+                 tcycle:float,
+                 n_sub_iter:int=1,
+                 cache_dir:str=None,
+                 key:str=None,
+                 ) -> None:
+        self._globals = {'np': np, '_scalar': _scalar}
+        self._n_globals = 0
+        self._parameters = [float(tcycle),]
+        self._parameter_names = ['T',]
+
+        keys3 = np.array(list(psv_specs.keys()), dtype=np.int64)
+        keys4 = np.array(list(ssv_specs.keys()), dtype=np.int64)
+        self._add_global('KEYS3', keys3)
+        self._add_global('KEYS4', keys4)
+        self._add_global('PERM', np.asarray(perm, dtype=np.int64))
+        self._add_global('INV_PERM', np.argsort(perm).astype(np.int64))
+
+        # dependencies of the secondary state variables on each other, used by the Newton solver
+        pattern = secondary_dependencies(ssv_ids)
+        order   = secondary_order(pattern)
+        self._add_global('SSV_PATTERN', pattern)
+        self._add_global('SSV_COLORS', column_coloring(pattern))
+        self._add_global('NEWTON', _NEWTON_SECONDARY)
+
+        # secondary state variables, updated in place in dependency order, the algebraic loops are iterated
+        ssv_keys  = list(ssv_specs.keys())
+        ssv_calls = [self._kernel_call(key, spec, ssv_ids[key], 't') for key, spec in ssv_specs.items()]
+        ssv_lines = []
+        for comp, loop in order:
+            if loop:
+                ssv_lines.append(f'    for _ in range({n_sub_iter}):')
+            ssv_lines.extend(f'{"    " * (2 if loop else 1)}y_temp[{ssv_keys[i]}] = {ssv_calls[i]}' for i in comp)
+        psv_calls = [self._kernel_call(key, spec, psv_ids[key], 'ht') for key, spec in psv_specs.items()]
+        init_calls= [self._kernel_call(key, spec, init_ids[key], '0.0') for key, spec in init_specs.items()]
+
+        source = ['def pv_dfdt_compiled(t, y, P):',
+                  '    ht = t % P[0]',
+                  f'    y_temp = np.zeros({N_sv})',
+                  '    y_temp[KEYS3] = y[INV_PERM]',
+                  '    s_u_sweep_compiled(t, y_temp, P)',
+                  f'    dydt = np.empty({len(psv_calls)})',
+                  *[f'    dydt[{i}] = {call}' for i, call in enumerate(psv_calls)],
+                  '    return dydt[PERM]',
+                  '',
+                  'def s_u_sweep_compiled(t, y_temp, P):',
+                  *ssv_lines,
+                  '    return y_temp[KEYS4]',
+                  '',
+                  'def s_u_sweep_block_compiled(t, Y, P):',
+                  '    for j in range(Y.shape[1]):',
+                  '        y_temp = np.ascontiguousarray(Y[:, j])',
+                  '        s_u_sweep_compiled(t, y_temp, P)',
+                  '        Y[:, j] = y_temp',
+                  '    return Y[KEYS4]',
+                  '',
+                  'def pv_dfdt_secondary_compiled(t, y_temp, P):',
+                  '    ht = t % P[0]',
+                  f'    dydt = np.empty({len(psv_calls)})',
+                  *[f'    dydt[{i}] = {call}' for i, call in enumerate(psv_calls)],
+                  '    return dydt[PERM]',
+                  '',
+                  'def s_u_update_compiled(t, y, P):',
+                  '    y_temp = y',
+                  f'    out = np.empty({len(ssv_calls)})',
+                  *[f'    out[{i}] = {call}' for i, call in enumerate(ssv_calls)],
+                  '    return out',
+                  '',
+                  'def s_u_newton_compiled(y, P):',
+                  f'    return NEWTON(s_u_update_compiled, 0.0, y, P, KEYS4, SSV_PATTERN, SSV_COLORS, '
+                  f'{NEWTON_TOL!r}, {NEWTON_MAX_ITER})',
+                  '',
+                  'def pv_dfdt_block_compiled(t, Y, P):',
+                  f'    out = np.empty(({len(psv_calls)}, Y.shape[1]))',
+                  '    for j in range(Y.shape[1]):',
+                  '        out[:, j] = pv_dfdt_compiled(t, np.ascontiguousarray(Y[:, j]), P)',
+                  '    return out',
+                  '',
+                  'def s_u_block_compiled(t, Y, P):',
+                  f'    out = np.empty(({len(ssv_calls)}, Y.shape[1]))',
+                  '    for j in range(Y.shape[1]):',
+                  '        out[:, j] = s_u_update_compiled(t, np.ascontiguousarray(Y[:, j]), P)',
+                  '    return out',
+                  '',
+                  'def pv_dfdt_ensemble_compiled(tau, Y, PP):',
+                  '    out = np.empty(Y.shape)',
+                  '    for m in range(Y.shape[0]):',
+                  '        out[m] = PP[m, 0] * pv_dfdt_compiled(tau * PP[m, 0], np.ascontiguousarray(Y[m]), PP[m])',
+                  '    return out',
+                  '',
+                  'def initialize_by_function_compiled(y, P):',
+                  '    y_temp = y',
+                  f'    out = np.empty({len(init_calls)})',
+                  *[f'    out[{i}] = {call}' for i, call in enumerate(init_calls)],
+                  '    return out',
+                  '']
+        self.source = '\n'.join(source)
+
+        if cache_dir is None:
+            exec(compile(self.source, '<ModularCirc compiled model>', 'exec'), self._globals)
+        else:
+            self._globals = self._load_module(cache_dir, key)
+        # the block versions (one state vector per column) call the compiled single vector functions
+        for name in ['s_u_sweep_compiled', 's_u_sweep_block_compiled', 'pv_dfdt_compiled',
+                     'pv_dfdt_secondary_compiled', 's_u_update_compiled', 's_u_newton_compiled',
+                     'pv_dfdt_block_compiled', 's_u_block_compiled', 'pv_dfdt_ensemble_compiled',
+                     'initialize_by_function_compiled']:
+            self._globals[name] = nb.njit(self._globals[name], cache=cache_dir is not None)
+        self.pv_dfdt_update           = self._globals['pv_dfdt_compiled']
+        self.pv_dfdt_update_secondary = self._globals['pv_dfdt_secondary_compiled']
+        self.s_u_update               = self._globals['s_u_update_compiled']
+        self.s_u_sweep                = self._globals['s_u_sweep_compiled']
+        self.s_u_sweep_block          = self._globals['s_u_sweep_block_compiled']
+        self.s_u_newton               = self._globals['s_u_newton_compiled']
+        self.pv_dfdt_update_block     = self._globals['pv_dfdt_block_compiled']
+        self.s_u_update_block         = self._globals['s_u_block_compiled']
+        self.pv_dfdt_update_ensemble  = self._globals['pv_dfdt_ensemble_compiled']
+        self.initialize_by_function   = self._globals['initialize_by_function_compiled']
+        self.P = np.array(self._parameters, dtype=np.float64)
+
+    def _load_module(self, cache_dir:str, key:str) -> dict:
+        """
+        Writes the generated code to the cache directory (unless it is already there) and executes it as a module
+        registered in `sys.modules`, numba needs to import the module to load the cached functions.
+        Returns the namespace of the module.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, f'compiled_{key}.py')
+        if not os.path.exists(path) or open(path).read() != self.source:
+            # written atomically, the other processes see the complete file or none
+            temp = f'{path}.{os.getpid()}.tmp'
+            with open(temp, 'w') as file:
+                file.write(self.source)
+            os.replace(temp, path)
+
+        module = types.ModuleType(f'ModularCirc_compiled_{key}')
+        module.__file__ = path
+        module.__dict__.update(self._globals)
+        sys.modules[module.__name__] = module
+        exec(compile(self.source, path, 'exec'), module.__dict__)
+        return module.__dict__
+
+    @staticmethod
+    def parameter_vector(init_specs:dict, ssv_specs:dict, psv_specs:dict, tcycle:float) -> np.ndarray[float]:
+        """
+        Returns the parameter vector of a model without generating the compiled functions, the layout is the
+        same as `P` for any model with the same topology (e.g. the members of an ensemble).
+        """
+        values = [float(tcycle),]
+        for specs in [ssv_specs, psv_specs, init_specs]:
+            for _, parameters in specs.values():
+                for value in parameters.values():
+                    if callable(value):
+                        continue
+                    elif isinstance(value, tuple):
+                        values.extend(float(val) for val in value)
+                    else:
+                        values.append(float(value))
+        return np.array(values, dtype=np.float64)
+
+    def _add_global(self, name:str, value) -> str:
+        self._globals[name] = value
+        return name
+
+    def _add_parameter(self, key:int, name:str, value) -> str:
+        self._parameter_names.append(f'{key}.{name}')
+        self._parameters.append(float(value))
+        return f'P[{len(self._parameters) - 1}]'
+
+    def _kernel_call(self, key:int, spec:tuple, ids, t:str) -> str:
+        kernel, parameters = spec
+        kname = self._add_global(f'K_{self._n_globals}', jit_kernel(kernel))
+        iname = self._add_global(f'I_{self._n_globals}', np.asarray(ids, dtype=np.int64))
+        self._n_globals += 1
+        args = [f't={t}', f'y=y_temp[{iname}]']
+        for name, value in parameters.items():
+            if callable(value):
+                args.append(f'{name}={self._add_global(f"F_{self._n_globals}_{name}", jit_kernel(value))}')
+            elif isinstance(value, tuple):
+                args.append(f'{name}=(' + ''.join(self._add_parameter(key, f'{name}[{i}]', val) + ', '
+                                                  for i, val in enumerate(value)) + ')')
+            else:
+                args.append(f'{name}={self._add_parameter(key, name, value)}')
+        return f'_scalar({kname}({", ".join(args)}))'
+
+    @property
+    def parameter_names(self) -> list[str]:
+        return self._parameter_names
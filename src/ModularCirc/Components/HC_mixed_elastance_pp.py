@@ -1,6 +1,7 @@
 from .ComponentBase import ComponentBase
 from ..HelperRoutines import activation_function_1, \
     chamber_volume_rate_change, \
+        chamber_volume_rate_change_jac, \
                 time_shift
 from ..Time import TimeClass
 
@@ -11,10 +12,7 @@ import numpy as np
 def dvdt(t, q_in=None, q_out=None, v=None, v_ref=0.0, y=None):
     if y is not None:
         q_in, q_out, v = y[:3]
-    if q_in - q_out > 0.0 or v > v_ref:
-        return q_in - q_out
-    else:
-        return 0.0
+    return np.where((q_in - q_out > 0.0) | (v > v_ref), q_in - q_out, 0.0)
 
 def gen_active_p(E_act, v_ref):
     def active_p(v):
@@ -66,6 +64,41 @@ def gen__af(af, time_shifter, kwargs):
         return af(time_shifter(t), dt=dt, **kwargs2)
     return _af
 
+def gen_af_args(af, kwargs):
+    """Positional arguments of the activation function (other than `t` and `dt`), None if any is missing."""
+    argnames = af.__code__.co_varnames[:af.__code__.co_argcount]
+    try:
+        return tuple(kwargs[name] for name in argnames if name not in ('t', 'dt'))
+    except KeyError:
+        return None
+
+# Kernels used by the compiled solver, parameters are passed explicitly instead of being captured in closures.
+def total_p_kernel(t, y, E_pas, E_act, k_pas, v_ref, af, af_args, delay, T):
+    _af_t = af(time_shift(t, delay, T), *af_args, False)
+    return _af_t * (E_act * (y - v_ref)) + E_pas * (np.exp(k_pas * (y - v_ref)) - 1.0)
+
+def total_dpdt_kernel(t, y, E_pas, E_act, k_pas, v_ref, af, af_args, delay, T):
+    ht = time_shift(t, delay, T)
+    _af_t    = af(ht, *af_args, False)
+    _d_af_dt = af(ht, *af_args, True)
+    v, q_i, q_o = y[0], y[1], y[2]
+    return (_d_af_dt * (E_act * (v - v_ref)) +
+            _af_t * (E_act * (q_i - q_o)) +
+            E_pas * k_pas * np.exp(k_pas * (v - v_ref)) * (q_i - q_o))
+
+def total_dpdt_jac(t, y, E_pas, E_act, k_pas, v_ref, af, af_args, delay, T):
+    ht = time_shift(t, delay, T)
+    _af_t    = af(ht, *af_args, False)
+    _d_af_dt = af(ht, *af_args, True)
+    v, q_i, q_o = y[0], y[1], y[2]
+    e = np.exp(k_pas * (v - v_ref))
+    d_q = _af_t * E_act + E_pas * k_pas * e
+    d_v = _d_af_dt * E_act + E_pas * k_pas**2.0 * e * (q_i - q_o)
+    return np.array([d_v, d_q, -d_q])
+
+def comp_v_kernel(t, y, E_pas, v_ref, k_pas):
+    return v_ref + np.log(y[0] / E_pas + 1.0) / k_pas
+
 class HC_mixed_elastance_pp(ComponentBase):
     def __init__(self,
                  name:str,
@@ -116,22 +149,36 @@ class HC_mixed_elastance_pp(ComponentBase):
                                       _af=_af, active_dpdt=active_dpdt, passive_dpdt=passive_dpdt)
         comp_v       = gen_comp_v(E_pas=E_pas, v_ref=v_ref, k_pas=k_pas)
 
+        af_args      = gen_af_args(af=af, kwargs=kwargs)
+        p_parameters = {'E_pas': E_pas, 'E_act': E_act, 'k_pas': k_pas, 'v_ref': v_ref,
+                        'af': af, 'af_args': af_args, 'delay': kwargs['delay'], 'T': T}
+
         self._V.set_dudt_func(chamber_volume_rate_change,
-                              function_name='chamber_volume_rate_change')
+                              function_name='chamber_volume_rate_change',
+                              kernel=chamber_volume_rate_change,
+                              parameters={},
+                              jac=chamber_volume_rate_change_jac)
         self._V.set_inputs(pd.Series({'q_in' :self._Q_i.name,
                                       'q_out':self._Q_o.name}))
 
-        self._P_i.set_dudt_func(total_dpdt, function_name='total_dpdt')
+        self._P_i.set_dudt_func(total_dpdt, function_name='total_dpdt',
+                                kernel=total_dpdt_kernel if af_args is not None else None,
+                                parameters=p_parameters,
+                                jac=total_dpdt_jac if af_args is not None else None)
         self._P_i.set_inputs(pd.Series({'v'  :self._V.name,
                                         'q_i':self._Q_i.name,
                                         'q_o':self._Q_o.name}))
         if self.p0 is None or self.p0 is np.NaN:
-            self._P_i.set_i_func(total_p, function_name='total_p')
+            self._P_i.set_i_func(total_p, function_name='total_p',
+                                 kernel=total_p_kernel if af_args is not None else None,
+                                 parameters=p_parameters)
             self._P_i.set_i_inputs(pd.Series({'v':self._V.name}))
         else:
             self.P_i.loc[0] = self.p0
         if self.v0 is None or self.v0 is np.NaN:
-            self._V.set_i_func(comp_v, function_name='comp_v')
+            self._V.set_i_func(comp_v, function_name='comp_v',
+                               kernel=comp_v_kernel,
+                               parameters={'E_pas': E_pas, 'v_ref': v_ref, 'k_pas': k_pas})
             self._V.set_i_inputs(pd.Series({'p':self._P_i.name}))
         if (self.v0 is None or self.v0 is np.NaN) and (self.p0 is None or self.p0 is np.NaN):
             raise Exception("Solver needs at least the initial volume or pressure to be defined!")
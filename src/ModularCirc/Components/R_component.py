@@ -1,6 +1,6 @@
 from .ComponentBase import ComponentBase
 from ..Time import TimeClass
-from ..HelperRoutines import resistor_upstream_pressure
+from ..HelperRoutines import resistor_upstream_pressure, resistor_upstream_pressure_jac
 
 import pandas as pd
 
@@ -25,6 +25,8 @@ class R_component(ComponentBase):
 
     def setup(self) -> None:
         r=self.R
-        self._P_i.set_u_func(lambda t, y: resistor_upstream_pressure(t, y, r=r), function_name='resistor_upstream_pressure')
+        self._P_i.set_u_func(lambda t, y: resistor_upstream_pressure(t, y, r=r), function_name='resistor_upstream_pressure',
+                             kernel=resistor_upstream_pressure, parameters={'r': r},
+                             jac=resistor_upstream_pressure_jac)
         self._P_i.set_inputs(pd.Series({'q_in' :self._Q_i.name,
                                         'p_out':self._P_o.name}))
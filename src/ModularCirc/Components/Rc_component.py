@@ -3,7 +3,10 @@ from ..HelperRoutines import grounded_capacitor_model_dpdt, \
     grounded_capacitor_model_pressure, \
         grounded_capacitor_model_volume, \
             resistor_model_flow, \
-                chamber_volume_rate_change
+                chamber_volume_rate_change, \
+                    grounded_capacitor_model_dpdt_jac, \
+                        resistor_model_flow_jac, \
+                            chamber_volume_rate_change_jac
 from ..Time import TimeClass
 
 import pandas as pd
@@ -68,30 +71,43 @@ class Rc_component(ComponentBase):
         c = self.C
         # Set the dudt function for the input pressure state variable
         self._P_i.set_dudt_func(gen_p_i_dudt_func(C=c),
-                                function_name='grounded_capacitor_model_dpdt')
+                                function_name='grounded_capacitor_model_dpdt',
+                                kernel=grounded_capacitor_model_dpdt,
+                                parameters={'c': c},
+                                jac=grounded_capacitor_model_dpdt_jac)
         # Set the mapping betwen the local input names and the global names of the state variables
         self._P_i.set_inputs(pd.Series({'q_in' :self._Q_i.name,
                                         'q_out':self._Q_o.name}))
         if self.p0 is None or self.p0 is np.NaN:
             # Set the initialization function for the input pressure state variable
             self._P_i.set_i_func(gen_p_i_i_func(v_ref=v_ref, c=c),
-                                 function_name='grounded_capacitor_model_pressure')
+                                 function_name='grounded_capacitor_model_pressure',
+                                 kernel=grounded_capacitor_model_pressure,
+                                 parameters={'v_ref': v_ref, 'c': c})
             self._P_i.set_i_inputs(pd.Series({'v':self._V.name}))
         else:
             self.P_i.loc[0] = self.p0
         # Set the function for computing the flows based on the current pressure values at the nodes of the componet
         self._Q_o.set_u_func(gen_q_o_u_func(r=r),
-                             function_name='resistor_model_flow' )
+                             function_name='resistor_model_flow',
+                             kernel=resistor_model_flow,
+                             parameters={'r': r},
+                             jac=resistor_model_flow_jac)
         self._Q_o.set_inputs(pd.Series({'p_in':self._P_i.name,
                                         'p_out':self._P_o.name}))
         # Set the dudt function for the compartment volume
         self._V.set_dudt_func(chamber_volume_rate_change,
-                              function_name='chamber_volume_rate_change')
+                              function_name='chamber_volume_rate_change',
+                              kernel=chamber_volume_rate_change,
+                              parameters={},
+                              jac=chamber_volume_rate_change_jac)
         self._V.set_inputs(pd.Series({'q_in':self._Q_i.name,
                                       'q_out':self._Q_o.name}))
         if self.v0 is None or self.v0 is np.NaN:
             # Set the initialization function for the input volume state variable
-            self._V.set_i_func(self.v_i_func, function='grounded_capacitor_model_volume')
+            self._V.set_i_func(self.v_i_func, function_name='grounded_capacitor_model_volume',
+                               kernel=grounded_capacitor_model_volume,
+                               parameters={'v_ref': v_ref, 'c': c})
             self._V.set_i_inputs(pd.Series({'p':self._P_i.name}))
 
     def __del__(self):
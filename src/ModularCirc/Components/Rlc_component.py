@@ -1,5 +1,5 @@
 from .Rc_component import Rc_component
-from ..HelperRoutines import resistor_impedance_flux_rate
+from ..HelperRoutines import resistor_impedance_flux_rate, resistor_impedance_flux_rate_jac
 from ..Time import TimeClass
 
 import pandas as pd
@@ -33,7 +33,10 @@ class Rlc_component(Rc_component):
             L = self.L
             R = self.R
             self._Q_o.set_dudt_func(gen_q_o_dudt_func(r=R, l=L),
-                                    function_name='resistor_impedance_flux_rate')
+                                    function_name='resistor_impedance_flux_rate',
+                                    kernel=resistor_impedance_flux_rate,
+                                    parameters={'r': R, 'l': L},
+                                    jac=resistor_impedance_flux_rate_jac)
             self._Q_o.set_inputs(pd.Series({'p_in':self._P_i.name,
                                             'p_out':self._P_o.name,
                                             'q_out':self._Q_o.name}))
@@ -1,6 +1,8 @@
 from .ComponentBase import ComponentBase
 from ..Time import TimeClass
-from ..HelperRoutines import maynard_valve_flow, maynard_phi_law, maynard_impedance_dqdt
+from ..HelperRoutines import maynard_valve_flow, maynard_phi_law, maynard_impedance_dqdt, \
+    maynard_valve_flow_jac, maynard_phi_law_jac, maynard_impedance_dqdt_jac, valve_pressure_switch, \
+    maynard_impedance_switch
 from ..StateVariable import StateVariable
 
 import pandas as pd
@@ -66,7 +68,9 @@ class Valve_maynard(ComponentBase):
         RRA = self.RRA
         if self.L < 1.0e-6:
             q_i_u_func = gen_q_i_u_func(CQ=CQ, RRA=RRA)
-            self._Q_i.set_u_func(q_i_u_func, function_name='maynard_valve_flow')
+            self._Q_i.set_u_func(q_i_u_func, function_name='maynard_valve_flow',
+                                 kernel=maynard_valve_flow, parameters={'CQ': CQ, 'RRA': RRA},
+                                 jac=maynard_valve_flow_jac)
             self._Q_i.set_inputs(pd.Series({'p_in' : self._P_i.name,
                                             'p_out': self._P_o.name,
                                             'phi'  : self._PHI.name}))
@@ -74,16 +78,23 @@ class Valve_maynard(ComponentBase):
             R = self.R
             L = self.L
             q_i_dudt_func = gen_q_i_dudt_func(CQ=CQ, RRA=RRA, L=L, R=R)
-            self._Q_i.set_dudt_func(q_i_dudt_func, function_name='maynard_impedance_dqdt')
+            self._Q_i.set_dudt_func(q_i_dudt_func, function_name='maynard_impedance_dqdt',
+                                    kernel=maynard_impedance_dqdt,
+                                    parameters={'CQ': CQ, 'RRA': RRA, 'L': L, 'R': R},
+                                    jac=maynard_impedance_dqdt_jac)
             self._Q_i.set_inputs(pd.Series({'p_in' : self._P_i.name,
                                             'p_out': self._P_o.name,
                                             'q_in' : self._Q_i.name,
                                             'phi'  : self._PHI.name}))
+            self._Q_i.add_switch_func(maynard_impedance_switch, parameters={'RRA': RRA})
 
         Ko = self.Ko
         Kc = self.Kc
         phi_dudt_func = gen_phi_dudt_func(Ko=Ko, Kc=Kc)
-        self._PHI.set_dudt_func(phi_dudt_func, function_name='maynard_phi_law')
+        self._PHI.set_dudt_func(phi_dudt_func, function_name='maynard_phi_law',
+                                kernel=maynard_phi_law, parameters={'Ko': Ko, 'Kc': Kc},
+                                jac=maynard_phi_law_jac)
+        self._PHI.add_switch_func(valve_pressure_switch)
         self._PHI.set_inputs(pd.Series({'p_in' : self._P_i.name,
                                         'p_out': self._P_o.name,
                                         'phi'  : self._PHI.name}))
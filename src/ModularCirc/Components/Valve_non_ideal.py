@@ -1,6 +1,6 @@
 from .ComponentBase import ComponentBase
 from ..Time import TimeClass
-from ..HelperRoutines import non_ideal_diode_flow
+from ..HelperRoutines import non_ideal_diode_flow, non_ideal_diode_flow_jac, valve_pressure_switch
 
 import pandas as pd
 
@@ -31,6 +31,9 @@ class Valve_non_ideal(ComponentBase):
         max_func = self.max_func
         # q_i_u_func = lambda t, y: non_ideal_diode_flow(t, y=y, r=r, max_func=max_func)
         q_i_u_func = gen_q_i_u_func(r=r, max_func=max_func)
-        self._Q_i.set_u_func(q_i_u_func, function_name='non_ideal_diode_flow + max_func')
+        self._Q_i.set_u_func(q_i_u_func, function_name='non_ideal_diode_flow + max_func',
+                             kernel=non_ideal_diode_flow, parameters={'r': r, 'max_func': max_func},
+                             jac=non_ideal_diode_flow_jac)
+        self._Q_i.add_switch_func(valve_pressure_switch)
         self._Q_i.set_inputs(pd.Series({'p_in':self._P_i.name,
                                         'p_out':self._P_o.name}))
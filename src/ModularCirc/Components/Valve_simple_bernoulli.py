@@ -1,6 +1,6 @@
 from .ComponentBase import ComponentBase
 from ..Time import TimeClass
-from ..HelperRoutines import simple_bernoulli_diode_flow
+from ..HelperRoutines import simple_bernoulli_diode_flow, simple_bernoulli_diode_flow_jac, valve_pressure_switch
 
 import pandas as pd
 
@@ -26,6 +26,9 @@ class Valve_simple_bernoulli(ComponentBase):
         CQ  = self.CQ
         RRA = self.RRA
         q_i_u_func = lambda t, y: simple_bernoulli_diode_flow(t, y=y, CQ=CQ, RRA=RRA)
-        self._Q_i.set_u_func(q_i_u_func, function_name='simple_bernoulli_diode_flow')
+        self._Q_i.set_u_func(q_i_u_func, function_name='simple_bernoulli_diode_flow',
+                             kernel=simple_bernoulli_diode_flow, parameters={'CQ': CQ, 'RRA': RRA},
+                             jac=simple_bernoulli_diode_flow_jac)
+        self._Q_i.add_switch_func(valve_pressure_switch)
         self._Q_i.set_inputs(pd.Series({'p_in':self._P_i.name,
                                         'p_out':self._P_o.name}))
@@ -0,0 +1,291 @@
+from .Models.OdeModel import OdeModel
+from .Compiler import CompiledModel
+from .Solver import Solver
+
+import pandas as pd
+import numpy as np
+
+from scipy.integrate import solve_ivp
+from scipy.sparse import kron, identity
+
+import warnings
+
+class EnsembleSolver():
+    """
+    Solver integrating many realizations (members) of the same model topology as one stacked system.
+
+    The members only differ by their parameter vector (see `Compiler.CompiledModel`) and their initial conditions,
+    the derivatives of all members are computed by a single compiled function. Time is normalized by the duration
+    of the heart cycle of each member, so members with different heart rates share the same integration steps.
+    Members are retired from the stacked system as soon as they converge, following the test used by `Solver`.
+    """
+    def __init__(self,
+                 model:OdeModel=None,
+                 P:np.ndarray[float]=None,
+                 y0:np.ndarray[float]=None,
+                 ) -> None:
+        """
+        ## Inputs
+        model : OdeModel
+            template model, defines the topology and the time discretization shared by all members.
+        P : np.ndarray
+            parameter matrix, one row per member, columns as in `parameter_names`. Defaults to the template.
+        y0 : np.ndarray
+            initial values of the state variables, one row per member (NaN for the variables initialized by
+            function). Defaults to the initial values of the template.
+        """
+        self.model = model
+        self._to   = model.time_object
+        self._P    = P
+        self._y0   = y0
+
+        # Template solver, provides the compiled functions and the reordering of the system.
+        self._solver = Solver(model=model)
+
+        # Converged flags, numbers of cycles and outputs of the members.
+        self.converged = None
+        self._Nconv    = None
+        self._results  = None
+
+
+    @staticmethod
+    def member_parameters(model:OdeModel) -> tuple[np.ndarray[float], np.ndarray[float]]:
+        """
+        Returns the parameter vector and the initial values of the state variables of a model, to be used as
+        a row of `P` and `y0` respectively.
+        """
+        solver = Solver(model=model)
+        solver.setup(suppress_output=True)
+        P = CompiledModel.parameter_vector(init_specs=solver._global_sv_init_ker,
+                                           ssv_specs=solver._global_ssv_update_ker,
+                                           psv_specs=solver._global_psv_update_ker,
+                                           tcycle=model.time_object.tcycle)
+        return P, model.all_sv_data.iloc[0].to_numpy(dtype=np.float64)
+
+
+    def setup(self,
+              suppress_output:bool=False,
+              step_tol:float=1e-2,
+              conv_cols:list=None,
+              method:str='LSODA',
+              atol=1e-6,
+              rtol=1e-6,
+              )->None:
+        """
+        Sets up the template solver with the compiled functions and the parameters of the members.
+
+        ## Inputs
+        conv_cols : list
+            state variables used in the convergence test, as in `Solver.setup`. Only primary state variables are
+            tested, the secondary ones are computed once the members are retired.
+        """
+        self._step_tol = step_tol
+        self._method   = method
+        self._atol     = atol
+        self._rtol     = rtol
+
+        self._solver.setup(suppress_output=suppress_output,
+                           step_tol=step_tol,
+                           conv_cols=conv_cols,
+                           method=method,
+                           atol=atol,
+                           rtol=rtol,
+                           compiled=True)
+        self._cm = self._solver._compiled_model
+        self.set_members(P=self._P, y0=self._y0)
+
+        self._keys3 = np.array(list(self._solver._global_psv_update_fun.keys()))
+        self._keys4 = np.array(list(self._solver._global_ssv_update_fun.keys()), dtype=np.int64)
+        self._keys1 = np.array(list(self._solver._global_sv_init_fun.keys()), dtype=np.int64)
+
+        # indexes (within the primary state variables) of the variables used in the convergence test
+        self._cols = [self._solver._global_sv_id[col] for col in self._solver._cols]
+        self._cols_ind = np.array([i for i, key in enumerate(self._keys3) if key in self._cols], dtype=np.int64)
+        return None
+
+
+    def set_members(self, P:np.ndarray[float]=None, y0:np.ndarray[float]=None) -> None:
+        """
+        Sets the parameters and initial values of the members, the compiled functions are reused so a set up
+        ensemble can solve several batches of members.
+        """
+        if P is None:
+            P = self._solver._P[np.newaxis, :]
+        self._P = np.ascontiguousarray(P, dtype=np.float64)
+        if self._P.ndim != 2 or self._P.shape[1] != len(self._solver._P):
+            raise Exception(f"The parameter matrix needs {len(self._solver._P)} columns, one per parameter.")
+        if y0 is None:
+            y0 = np.tile(self.model.all_sv_data.iloc[0].to_numpy(dtype=np.float64), (self.n_members, 1))
+        self._y0 = np.asarray(y0, dtype=np.float64)
+        if self._y0.shape != (self.n_members, self._solver._N_sv):
+            raise Exception(f"The initial values need one row per member and {self._solver._N_sv} columns.")
+        self.converged = None
+        self._Nconv    = None
+        self._results  = None
+        return
+
+
+    @property
+    def n_members(self) -> int:
+        return self._P.shape[0]
+
+
+    @property
+    def parameter_names(self) -> list[str]:
+        return self._cm.parameter_names
+
+
+    @property
+    def Nconv(self) -> np.ndarray[int]:
+        return self._Nconv
+
+
+    def integrate_members(self, y0:np.ndarray[float], members:np.ndarray[int], cycleID:int):
+        """
+        Integrates the members over one heart cycle, `y0` has one (reordered) state vector per row.
+
+        Returns the values of the primary state variables at the time points of the cycle, with shape
+        (members, time points, variables), or None if the integration fails.
+        """
+        n = len(self._keys3)
+        n_t = self._to.n_c - 1
+        tau = cycleID + np.linspace(0.0, 1.0, n_t + 1)
+        PP = self._P[members]
+        pv_dfdt_ensemble = self._cm.pv_dfdt_update_ensemble
+
+        def fun(t, y):
+            return pv_dfdt_ensemble(t, y.reshape(len(members), n), PP).ravel()
+
+        # the error is controlled with the RMS norm of the stacked system, the tolerances are scaled so that the
+        # error of every member stays within the tolerances of the Solver
+        atol = self._atol / np.sqrt(len(members))
+        rtol = self._rtol / np.sqrt(len(members))
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if self._method != 'LSODA':
+                if self._method in ('BDF', 'Radau'):
+                    jac_options = {'jac_sparsity': kron(identity(len(members)), self._solver.jac_sparsity, format='csc')}
+                else:
+                    jac_options = {}
+                res = solve_ivp(fun=fun,
+                                t_span=(tau[0], tau[-1]),
+                                y0=y0.ravel(),
+                                t_eval=tau,
+                                max_step=1.0 / n_t,
+                                method=self._method,
+                                atol=atol,
+                                rtol=rtol,
+                                **jac_options,
+                                )
+            else:
+                # the members are stored one after the other, the stacked system has the bandwidth of the template
+                res = solve_ivp(fun=fun,
+                                t_span=(tau[0], tau[-1]),
+                                y0=y0.ravel(),
+                                t_eval=tau,
+                                method=self._method,
+                                atol=atol,
+                                rtol=rtol,
+                                lband=self._solver.lband,
+                                uband=self._solver.uband,
+                                )
+
+        if res.status == -1 or res.y.shape[1] != n_t + 1 or not np.all(np.isfinite(res.y)):
+            return None
+        return res.y.reshape(len(members), n, n_t + 1).transpose(0, 2, 1)[:, :, self._solver.inv_perm]
+
+
+    def advance_members(self, y0:np.ndarray[float], members:np.ndarray[int], cycleID:int):
+        """
+        Integrates the members over one heart cycle, when the stacked integration fails the members are split
+        in two halves which are integrated separately, until the failing members are isolated.
+
+        Returns the integrated members and their primary state variables over the cycle.
+        """
+        y = self.integrate_members(y0, members, cycleID)
+        if y is not None:
+            return members, y
+        if len(members) == 1:
+            return members[:0], np.zeros((0, self._to.n_c, len(self._keys3)))
+        half = len(members) // 2
+        members_1, y_1 = self.advance_members(y0[:half], members[:half], cycleID)
+        members_2, y_2 = self.advance_members(y0[half:], members[half:], cycleID)
+        return np.concatenate([members_1, members_2]), np.concatenate([y_1, y_2])
+
+
+    def solve(self):
+        """
+        Solves the system for all members, the outputs of the last cycle of each member are available through
+        `member_output`.
+        """
+        n_t = self._to.n_c - 1
+        self.converged = np.zeros(self.n_members, dtype=bool)
+        self._Nconv    = np.full(self.n_members, -1, dtype=np.int64)
+        self._results  = [None, ] * self.n_members
+
+        # initialize the solution fields
+        y_init = self._y0.copy()
+        for m in range(self.n_members):
+            if len(self._keys1) > 0:
+                y_init[m, self._keys1] = self._cm.initialize_by_function(y_init[m], self._P[m])
+
+        members = np.arange(self.n_members)
+        y0 = y_init[:, self._keys3][:, self._solver.perm]
+        previous = None
+
+        for i in range(0, self._to.ncycles):
+            integrated, y = self.advance_members(y0, members, i)
+            if previous is not None:
+                previous = previous[np.isin(members, integrated)]
+            members = integrated
+            if len(members) == 0:
+                break
+
+            # convergence test of every member, same as `Solver.advance_cycle`
+            flags = np.zeros(len(members), dtype=bool)
+            if previous is not None:
+                for j in range(len(members)):
+                    cs = y[j, :n_t][:, self._cols_ind]
+                    cp = previous[j, :n_t][:, self._cols_ind]
+                    flags[j] = not (np.max(Solver.cycle_error(cs, cp)) > self._step_tol)
+
+            if i > self._to.export_min:
+                retire = flags.copy()
+            else:
+                retire = np.zeros(len(members), dtype=bool)
+            if i == self._to.ncycles - 1:
+                retire[:] = True
+            for j in np.nonzero(retire)[0]:
+                self.retire_member(members[j], y[j], cycleID=i, converged=flags[j])
+
+            members  = members[~retire]
+            previous = y[~retire]
+            y0 = y[~retire, -1][:, self._solver.perm]
+            if len(members) == 0:
+                break
+        return
+
+
+    def retire_member(self, member:int, y:np.ndarray[float], cycleID:int, converged:bool) -> None:
+        """ Stores the outputs of a member over its last cycle, computing its secondary state variables."""
+        self.converged[member] = converged and cycleID > self._to.export_min
+        self._Nconv[member]    = cycleID
+
+        values = np.full((self._to.n_c, self._solver._N_sv), np.nan)
+        values[:, self._keys3] = y
+        if len(self._keys4) > 0:
+            values[:, self._keys4] = self._cm.s_u_sweep_block(0.0, np.ascontiguousarray(values.T), self._P[member]).T
+        self._results[member] = values
+
+
+    def member_output(self, member:int) -> pd.DataFrame:
+        """
+        Returns the state variables of a member over its last cycle, with the time points in column 'T'.
+        """
+        if self._results is None or self._results[member] is None:
+            return None
+        output = pd.DataFrame(self._results[member], columns=self.model.all_sv_data.columns)
+        T = self._P[member, 0]
+        output['T'] = self._Nconv[member] * T + np.linspace(0.0, T, self._to.n_c)
+        return output
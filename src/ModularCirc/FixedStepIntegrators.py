@@ -0,0 +1,217 @@
+import numpy as np
+import numba as nb
+
+# Fixed step integrators, the steps are the intervals of the output time grid. The integrators take the numba
+# compiled derivative function `f(t, y, P)` of `Compiler.CompiledModel` and write the state vector at every time
+# point into the rows `row0 + i` of `out`, the j-th entry of the state vector being stored in column `cols[j]`.
+# The implicit methods solve their stages with a simplified Newton iteration, the inverse of the iteration matrix
+# (finite difference Jacobian) is stored in `Minv` and reused from one step to the next.
+
+# diagonal coefficient of the two stage, L-stable, stiffly accurate SDIRK method
+SDIRK_GAMMA = 1.0 - 1.0 / np.sqrt(2.0)
+
+
+@nb.njit
+def _store(out, row, cols, y):
+    for j in range(len(cols)):
+        out[row, cols[j]] = y[j]
+
+
+@nb.njit
+def _iteration_matrix(f, t, y, P, c):
+    """Inverse of the Newton iteration matrix I - c J, with J the finite difference Jacobian of f at (t, y)."""
+    n  = len(y)
+    f0 = f(t, y, P)
+    M  = np.eye(n)
+    for j in range(n):
+        dy = np.sqrt(np.finfo(np.float64).eps) * max(abs(y[j]), 1.0)
+        yj = y.copy()
+        yj[j] += dy
+        M[:, j] -= c * (f(t, yj, P) - f0) / dy
+    return np.linalg.inv(M)
+
+
+@nb.njit
+def _solve_stage(f, t, base, z, P, c, Minv, atol, rtol):
+    """
+    Solves z = base + c f(t, z) with a simplified Newton iteration, using the inverse iteration matrix `Minv`.
+    Returns the solution and a flag, False when the iteration does not converge in a few iterations.
+    """
+    for _ in range(7):
+        dz = Minv @ (z - base - c * f(t, z, P))
+        z  = z - dz
+        if not np.all(np.isfinite(z)):
+            return z, False
+        if np.max(np.abs(dz) / (atol + rtol * np.abs(z))) < 1.0:
+            return z, True
+    return z, False
+
+
+@nb.njit
+def _solve_stage_damped(f, t, base, z, P, c, Minv, atol, rtol):
+    """
+    Solves z = base + c f(t, z) with a Newton iteration updating the iteration matrix at every iteration and
+    halving the steps which do not reduce the residual. Slower than `_solve_stage` but it converges across the
+    kinks of the valve laws, where the simplified iteration alternates between the open and the closed valve.
+    """
+    scale = atol + rtol * np.abs(z)
+    r = z - base - c * f(t, z, P)
+    for _ in range(20):
+        Minv[:, :] = _iteration_matrix(f, t, z, P, c)
+        dz  = Minv @ r
+        lam = 1.0
+        while True:
+            z_new = z - lam * dz
+            r_new = z_new - base - c * f(t, z_new, P)
+            if np.max(np.abs(r_new) / scale) < np.max(np.abs(r) / scale) or lam < 1.0e-3:
+                break
+            lam *= 0.5
+        z, r = z_new, r_new
+        if not np.all(np.isfinite(z)):
+            return z, False
+        if np.max(np.abs(r) / scale) < 1.0:
+            return z, True
+    return z, False
+
+
+@nb.njit
+def _implicit_step(f, t, base, z, P, c, Minv, atol, rtol):
+    """
+    Implicit stage, the iteration matrix (shared by all the stages and steps, stored in `Minv`) is only updated
+    when the simplified Newton iteration fails. Returns the solution and a flag, False when the damped Newton
+    iteration fails too.
+    """
+    res, ok = _solve_stage(f, t, base, z, P, c, Minv, atol, rtol)
+    if ok:
+        return res, True
+    Minv[:, :] = _iteration_matrix(f, t, z, P, c)
+    res, ok = _solve_stage(f, t, base, z, P, c, Minv, atol, rtol)
+    if ok:
+        return res, True
+    return _solve_stage_damped(f, t, base, z, P, c, Minv, atol, rtol)
+
+
+@nb.njit
+def _rk4_step(f, t, h, y, P, Minv, atol, rtol):
+    """Classical explicit fourth order Runge-Kutta method."""
+    k1 = f(t, y, P)
+    k2 = f(t + 0.5 * h, y + 0.5 * h * k1, P)
+    k3 = f(t + 0.5 * h, y + 0.5 * h * k2, P)
+    k4 = f(t + h, y + h * k3, P)
+    y1 = y + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+    return y1, np.all(np.isfinite(y1))
+
+
+@nb.njit
+def _backward_euler_step(f, t, h, y, P, Minv, atol, rtol):
+    """Backward Euler method, y1 = y0 + h f(t1, y1)."""
+    return _implicit_step(f, t + h, y, y + h * f(t, y, P), P, h, Minv, atol, rtol)
+
+
+@nb.njit
+def _trapezoidal_step(f, t, h, y, P, Minv, atol, rtol):
+    """Implicit trapezoidal rule, y1 = y0 + h/2 (f(t0, y0) + f(t1, y1))."""
+    f0 = f(t, y, P)
+    return _implicit_step(f, t + h, y + 0.5 * h * f0, y + h * f0, P, 0.5 * h, Minv, atol, rtol)
+
+
+@nb.njit
+def _sdirk_step(f, t, h, y, P, Minv, atol, rtol):
+    """
+    Two stage, L-stable, singly diagonally implicit Runge-Kutta method (Alexander, 1977), second order:
+    z1 = y0 + g h f(t0 + g h, z1), z2 = y0 + (1 - g) h k1 + g h f(t1, z2), y1 = z2, with k1 = (z1 - y0) / (g h).
+    """
+    g  = SDIRK_GAMMA
+    f0 = f(t, y, P)
+    z1, ok = _implicit_step(f, t + g * h, y, y + g * h * f0, P, g * h, Minv, atol, rtol)
+    if not ok:
+        return z1, False
+    k1 = (z1 - y) / (g * h)
+    return _implicit_step(f, t + h, y + (1.0 - g) * h * k1, y + h * k1, P, g * h, Minv, atol, rtol)
+
+
+# identifiers of the fixed step methods
+FIXED_STEP_METHODS = {'RK4'          : 0,
+                      'BackwardEuler': 1,
+                      'Trapezoidal'  : 2,
+                      'SDIRK'        : 3}
+
+
+@nb.njit
+def _step(method, f, t, h, y, P, Minv, atol, rtol):
+    if method == 0:
+        return _rk4_step(f, t, h, y, P, Minv, atol, rtol)
+    elif method == 1:
+        return _backward_euler_step(f, t, h, y, P, Minv, atol, rtol)
+    elif method == 2:
+        return _trapezoidal_step(f, t, h, y, P, Minv, atol, rtol)
+    return _sdirk_step(f, t, h, y, P, Minv, atol, rtol)
+
+
+@nb.njit
+def _advance(method, f, t, h, y, P, Minv, atol, rtol):
+    """
+    Advances the state vector by one time step of the output. When the step fails (e.g. the Newton iteration does
+    not converge across the opening of a valve), it is split in 2, 4, ... 32 substeps, these have their own
+    iteration matrix and leave `Minv` untouched.
+    """
+    y1, ok = _step(method, f, t, h, y, P, Minv, atol, rtol)
+    if ok:
+        return y1, True
+    for k in range(1, 6):
+        m  = 2 ** k
+        hk = h / m
+        Mk = np.full(Minv.shape, np.nan)
+        yk = y.copy()
+        for j in range(m):
+            yk, ok = _step(method, f, t + j * hk, hk, yk, P, Mk, atol, rtol)
+            if not ok:
+                break
+        if ok:
+            return yk, True
+    return y1, False
+
+
+def _integrate(method, f, t, y0, P, out, row0, cols, Minv, atol, rtol):
+    y = y0.copy()
+    _store(out, row0, cols, y)
+    for i in range(len(t) - 1):
+        y, ok = _advance(method, f, t[i], t[i+1] - t[i], y, P, Minv, atol, rtol)
+        if not ok:
+            return False
+        _store(out, row0 + i + 1, cols, y)
+    return True
+
+
+# signature of the compiled derivative functions, `f(t, y, P)`
+RHS_SIGNATURE = nb.float64[::1](nb.float64, nb.float64[::1], nb.float64[::1])
+
+# the derivative function is passed as a first class function, so the integrator is compiled once (on its first
+# use, then loaded from the numba cache) and shared by all the models instead of being specialized for every model
+_INTEGRATOR_SIGNATURE = nb.boolean(nb.int64,                                          # method
+                                   nb.types.FunctionType(RHS_SIGNATURE),              # f
+                                   nb.types.Array(nb.float64, 1, 'A', readonly=True), # t
+                                   nb.float64[::1],                                   # y0
+                                   nb.float64[::1],                                   # P
+                                   nb.types.Array(nb.float64, 2, 'A'),                # out
+                                   nb.int64,                                          # row0
+                                   nb.int64[::1],                                     # cols
+                                   nb.float64[:, ::1],                                # Minv
+                                   nb.float64,                                        # atol
+                                   nb.float64)                                        # rtol
+_INTEGRATOR = None
+
+
+def integrate(method:str, f, t, y0, P, out, row0:int, cols, Minv, atol:float, rtol:float) -> bool:
+    """
+    Integrates the state vector over the time points `t` with the fixed step method `method`, the j-th entry of
+    the state vector at the time point `t[i]` is written in `out[row0 + i, cols[j]]`.
+
+    Returns False if the integration fails, i.e. the Newton iteration of a step does not converge even after
+    splitting it in substeps.
+    """
+    global _INTEGRATOR
+    if _INTEGRATOR is None:
+        _INTEGRATOR = nb.njit(_INTEGRATOR_SIGNATURE, cache=True)(_integrate)
+    f.compile(RHS_SIGNATURE)
+    return _INTEGRATOR(FIXED_STEP_METHODS[method], f, t, y0, P, out, row0, cols, Minv, atol, rtol)
@@ -27,6 +27,12 @@ def resistor_model_flow(t:float,
         p_in, p_out= y[:2]
     return (p_in - p_out) / r
 
+def resistor_model_flow_jac(t:float, r:float=None, y:np.ndarray[float]=None) -> np.ndarray[float]:
+    """
+    Partial derivatives of `resistor_model_flow` with respect to (p_in, p_out).
+    """
+    return np.array([1.0 / r, -1.0 / r])
+
 def resistor_upstream_pressure(t:float,
                                q_in:float=None,
                                p_out:float=None,
@@ -37,6 +43,12 @@ def resistor_upstream_pressure(t:float,
         q_in, p_out = y[:2]
     return p_out + r * q_in
 
+def resistor_upstream_pressure_jac(t:float, r:float=None, y:np.ndarray[float]=None) -> np.ndarray[float]:
+    """
+    Partial derivatives of `resistor_upstream_pressure` with respect to (q_in, p_out).
+    """
+    return np.array([r, 1.0])
+
 def resistor_model_dp(q_in:float, r:float) -> float:
     return q_in * r
 
@@ -66,6 +78,12 @@ def resistor_impedance_flux_rate(t:float,
         p_in, p_out, q_out = y[:3]
     return (p_in - p_out - q_out * r ) / l
 
+def resistor_impedance_flux_rate_jac(t:float, r:float=None, l:float=None, y:np.ndarray[float]=None) -> np.ndarray[float]:
+    """
+    Partial derivatives of `resistor_impedance_flux_rate` with respect to (p_in, p_out, q_out).
+    """
+    return np.array([1.0 / l, -1.0 / l, -r / l])
+
 def grounded_capacitor_model_pressure(t:float,
                                       v:float=None,
                                       v_ref:float=None,
@@ -110,6 +128,12 @@ def grounded_capacitor_model_dpdt(t:float,
         q_in, q_out = y[:2]
     return (q_in - q_out) / c
 
+def grounded_capacitor_model_dpdt_jac(t:float, c:float=None, y:np.ndarray[float]=None) -> np.ndarray[float]:
+    """
+    Partial derivatives of `grounded_capacitor_model_dpdt` with respect to (q_in, q_out).
+    """
+    return np.array([1.0 / c, -1.0 / c])
+
 # @nb.njit(cache=True)
 def chamber_volume_rate_change(t:float,
                                q_in:float=None,
@@ -130,6 +154,12 @@ def chamber_volume_rate_change(t:float,
         q_in, q_out = y[:2]
     return q_in - q_out
 
+def chamber_volume_rate_change_jac(t:float, y:np.ndarray[float]=None) -> np.ndarray[float]:
+    """
+    Partial derivatives of `chamber_volume_rate_change` with respect to (q_in, q_out).
+    """
+    return np.array([1.0, -1.0])
+
 # @nb.njit(cache=True)
 def relu_max(val:float) -> float:
     return np.maximum(val, 0.0)
@@ -180,6 +210,20 @@ def non_ideal_diode_flow(t:float,
         p_in, p_out = y[:2]
     return (max_func((p_in - p_out)/ r))
 
+def non_ideal_diode_flow_jac(t:float,
+                             r:float=None,
+                             max_func:Callable[[float],float]=relu_max,
+                             y:np.ndarray[float]=None,
+                             eps:float=1.0e-6,
+                             ) -> np.ndarray[float]:
+    """
+    Partial derivatives of `non_ideal_diode_flow` with respect to (p_in, p_out), the derivative of
+    `max_func` is approximated with a central difference.
+    """
+    x = (y[0] - y[1]) / r
+    dq = (max_func(x + eps) - max_func(x - eps)) / (2.0 * eps * r)
+    return np.array([dq, -dq])
+
 # @jit(cache=True, nopython=True)
 def simple_bernoulli_diode_flow(t:float,
                          p_in:float=None,
@@ -208,6 +252,26 @@ def simple_bernoulli_diode_flow(t:float,
                     CQ * np.sqrt(np.abs(dp)),
                    -CQ * RRA *np.sqrt(np.abs(dp)))
 
+def simple_bernoulli_diode_flow_jac(t:float,
+                                    CQ:float=None,
+                                    RRA:float=0.0,
+                                    y:np.ndarray[float]=None,
+                                    eps:float=1.5e-8,
+                                    ) -> np.ndarray[float]:
+    """
+    Partial derivatives of `simple_bernoulli_diode_flow` with respect to (p_in, p_out). Close to the opening
+    point the derivative of the square root is unbounded, there it is replaced by the forward secant over a
+    pressure increment of `eps * max(1, |p_in|)`.
+    """
+    dp  = y[0] - y[1]
+    h   = eps * np.maximum(1.0, np.abs(y[0]))
+    q_0 = CQ * np.sqrt(np.abs(dp))     * np.where(dp >= 0.0, 1.0, -RRA)
+    q_h = CQ * np.sqrt(np.abs(dp + h)) * np.where(dp + h >= 0.0, 1.0, -RRA)
+    dq  = np.where(np.abs(dp) > h,
+                   0.5 * CQ / np.sqrt(np.maximum(np.abs(dp), h)) * np.where(dp >= 0.0, 1.0, RRA),
+                   (q_h - q_0) / h)
+    return np.array([dq, -dq])
+
 # @jit(cache=True, nopython=True)
 def maynard_valve_flow(t:float,
                        p_in:np.ndarray[float]=None,
@@ -223,6 +287,26 @@ def maynard_valve_flow(t:float,
     aeff = (1.0 - RRA) * phi + RRA
     return np.where(dp >= 0.0, aeff, -aeff) * CQ * np.sqrt(np.abs(dp))
 
+def maynard_valve_flow_jac(t:float,
+                           CQ:float=None,
+                           RRA:float=0.0,
+                           y:np.ndarray[float]=None,
+                           eps:float=1.5e-8,
+                           )->np.ndarray[float]:
+    """
+    Partial derivatives of `maynard_valve_flow` with respect to (p_in, p_out, phi), close to the opening point
+    the pressure derivative is replaced by a forward secant (see `simple_bernoulli_diode_flow_jac`).
+    """
+    dp   = y[0] - y[1]
+    aeff = (1.0 - RRA) * y[2] + RRA
+    sign = np.where(dp >= 0.0, 1.0, -1.0)
+    h    = eps * np.maximum(1.0, np.abs(y[0]))
+    dq   = np.where(np.abs(dp) > h,
+                    0.5 * aeff * CQ / np.sqrt(np.maximum(np.abs(dp), h)),
+                    aeff * CQ * (np.where(dp + h >= 0.0, 1.0, -1.0) * np.sqrt(np.abs(dp + h))
+                                 - sign * np.sqrt(np.abs(dp))) / h)
+    return np.array([dq, -dq, sign * (1.0 - RRA) * CQ * np.sqrt(np.abs(dp))])
+
 # @nb.njit(cache=True,)
 def maynard_phi_law(t:float,
                     p_in:nb.types.Array =None,
@@ -237,6 +321,14 @@ def maynard_phi_law(t:float,
     dp = p_in - p_out
     return np.where(dp >= 0.0, Ko * (1.0 - phi) * dp, Kc * phi * dp)
 
+def maynard_phi_law_jac(t:float, Ko:float=None, Kc:float=None, y:np.ndarray[float]=None)->np.ndarray[float]:
+    """
+    Partial derivatives of `maynard_phi_law` with respect to (p_in, p_out, phi).
+    """
+    dp, phi = y[0] - y[1], y[2]
+    d_p = np.where(dp >= 0.0, Ko * (1.0 - phi), Kc * phi)
+    return np.array([d_p, -d_p, np.where(dp >= 0.0, -Ko * dp, Kc * dp)])
+
 # @nb.njit(cache=True)
 def maynard_impedance_dqdt(t:float,
                            p_in:nb.types.Array =None,
@@ -255,6 +347,40 @@ def maynard_impedance_dqdt(t:float,
     aeff = (1.0 - RRA) * phi + RRA
     return np.where(aeff > 1.0e-5, (dp * aeff - q_in * R * aeff  - q_in * np.abs(q_in) / CQ**2.0 * aeff**(-1.0)  ) / L, 0.0)
 
+def maynard_impedance_dqdt_jac(t:float,
+                               CQ:float=None,
+                               R :float=None,
+                               L :float=None,
+                               RRA:float=0.0,
+                               y:np.ndarray[float]=None,
+                               )->np.ndarray[float]:
+    """
+    Partial derivatives of `maynard_impedance_dqdt` with respect to (p_in, p_out, q_in, phi).
+    """
+    dp, q_in, phi = y[0] - y[1], y[2], y[3]
+    aeff = (1.0 - RRA) * phi + RRA
+    # the derivatives are 0 where the flow derivative is set to 0, the effective area is bounded to keep them finite
+    open_ = aeff > 1.0e-5
+    aeff  = np.maximum(aeff, 1.0e-5)
+    d_dp  = np.where(open_, aeff / L, 0.0)
+    d_q   = np.where(open_, (- R * aeff - 2.0 * np.abs(q_in) / CQ**2.0 / aeff) / L, 0.0)
+    d_phi = np.where(open_, (1.0 - RRA) * (dp - q_in * R + q_in * np.abs(q_in) / CQ**2.0 / aeff**2.0) / L, 0.0)
+    return np.array([d_dp, -d_dp, d_q, d_phi])
+
+def valve_pressure_switch(t:float, y:np.ndarray[float]=None) -> float:
+    """
+    Switching function of the valve laws, the pressure difference (p_in - p_out) across the valve changes sign
+    when the valve opens or closes, i.e. at the kinks of the flow laws.
+    """
+    return y[0] - y[1]
+
+def maynard_impedance_switch(t:float, RRA:float=0.0, y:np.ndarray[float]=None) -> float:
+    """
+    Switching function of `maynard_impedance_dqdt`, the flow derivative is set to 0 when the effective valve area
+    drops below 1e-5. The inputs are (p_in, p_out, q_in, phi).
+    """
+    return (1.0 - RRA) * y[3] + RRA - 1.0e-5
+
 def leaky_diode_flow(p_in:float, p_out:float, r_o:float, r_r:float) -> float:
     """
     Leaky diode model that outputs the flow rate through a leaky diode
@@ -285,47 +411,33 @@ def activation_function_1(t:float, t_max:float, t_tr:float, tau:float, dt: bool=
     Returns:
         float: activation function value
     """
+    # the phases are selected by masks (0 or 1), the exponential decay is bounded by 1 before the transition
+    rise  = t <= t_tr
+    coeff = 0.5 * (1.0 - np.cos(np.pi * t_tr / t_max))
+    decay = np.exp(-np.maximum(t - t_tr, 0.0) / tau) * coeff
     if not dt:
-        if t <= t_tr:
-            return 0.5 * (1.0 - np.cos(np.pi * t / t_max))
-        else:
-            coeff = 0.5 * (1.0 - np.cos(np.pi * t_tr / t_max))
-            return  np.exp(-(t - t_tr)/tau) * coeff
+        return rise * 0.5 * (1.0 - np.cos(np.pi * t / t_max)) + (1 - rise) * decay
     else:
-        if t <= t_tr:
-            return 0.5 * np.pi / t_max * np.sin(np.pi * t / t_max)
-        else:
-            coeff = 0.5 * (1.0 - np.cos(np.pi * t_tr / t_max))
-            return - np.exp(-(t - t_tr)/tau) * coeff / tau
+        return rise * 0.5 * np.pi / t_max * np.sin(np.pi * t / t_max) - (1 - rise) * decay / tau
 
 def activation_function_2(t:float, tr:float, td:float, dt: bool=True) -> float:
+    # the phases are selected by masks (0 or 1), the activation is 0 after td
+    rise, fall = t < tr, (t >= tr) & (t < td)
     if not dt:
-        result = (
-            0.5 * (1.0 - np.cos(np.pi * t / tr)) if t < tr else
-            0.5 * (1.0 + np.cos(np.pi * (t - tr) / (td - tr))) if t < td else
-            0.0
-        )
+        result = (rise * 0.5 * (1.0 - np.cos(np.pi * t / tr)) +
+                  fall * 0.5 * (1.0 + np.cos(np.pi * (t - tr) / (td - tr))))
     else:
-        result = (
-            0.5 * np.pi / tr * np.sin(np.pi * t / tr) if t < tr else
-           -0.5 * np.pi /(td - tr) * np.sin(np.pi * (t - tr) / (td - tr)) if t < td else
-            0.0
-        )
+        result = (rise * 0.5 * np.pi / tr * np.sin(np.pi * t / tr) -
+                  fall * 0.5 * np.pi /(td - tr) * np.sin(np.pi * (t - tr) / (td - tr)))
     return result
 
 def activation_function_3(t:float, tpwb:float, tpww:float, dt: bool=True) -> float:
+    # the wave is selected by a mask (0 or 1)
+    wave = (t >= tpwb) & (t < tpwb + tpww)
     if not dt:
-        result = (
-            0.0 if t < tpwb else
-            0.5 * (1 - np.cos(2.0 * np.pi * (t - tpwb) / tpww)) if t < tpwb + tpww else
-            0.0
-        )
+        result = wave * 0.5 * (1 - np.cos(2.0 * np.pi * (t - tpwb) / tpww))
     else:
-        result = (
-            0.0 if t < tpwb else
-            np.pi /tpww * np.sin(2.0 * np.pi * (t - tpwb) / tpww) if t < tpwb + tpww else
-            0.0
-        )
+        result = wave * np.pi /tpww * np.sin(2.0 * np.pi * (t - tpwb) / tpww)
     return result
 
 def activation_function_4(t:float, t_max:float, t_tr:float, tau:float, dt: bool=True) -> float:
@@ -342,18 +454,13 @@ def activation_function_4(t:float, t_max:float, t_tr:float, tau:float, dt: bool=
     Returns:
         float: activation function value
     """
+    # the phases are selected by masks (0 or 1), the exponential decay is bounded by 1 before the transition
+    rise, fall = (t >= 0) & (t <= t_tr), t > t_tr
+    decay = np.exp(-np.maximum(t - t_tr, 0.0) / tau)
     if not dt:
-        return (
-            0.5 * (1.0 - np.cos(np.pi * t / t_max)) if 0 <= t <= t_tr else
-            np.exp(-(t - t_tr) / tau) if t >= 0 else
-            0.0
-        )
+        return rise * 0.5 * (1.0 - np.cos(np.pi * t / t_max)) + fall * decay
     else:
-        return (
-            0.5 * np.sin(np.pi * t / t_max) / t_max if 0 <= t <= t_tr else
-            - np.exp(-(t - t_tr) / tau) / tau if t >= 0 else
-            0.0
-        )
+        return rise * 0.5 * np.sin(np.pi * t / t_max) / t_max - fall * decay / tau
 
 def chamber_linear_elastic_law(v:float, E:float, v_ref:float, *args, **kwargs) -> float:
     """
@@ -410,12 +517,10 @@ def chamber_pressure_function(t:float, v:float, v_ref:float, E_pas:float, E_act:
             + (1 - a) * passive_law(v=v, v_ref=v_ref, t=t, E=E_pas, **kwargs))
 
 def time_shift(t:float, shift:float=np.nan, tcycle:float=0.0):
-    if shift is np.nan:
+    if shift is None or np.isnan(shift):
         return t
-    elif t < tcycle - shift:
-        return t + shift
-    else:
-        return t + shift - tcycle
+    # the shifted times past the end of the cycle are wrapped to its start
+    return t + shift - tcycle * (t >= tcycle - shift)
 
 
 BOLD = '\033[1m'
@@ -6,6 +6,7 @@ import pandas as pd
 
 class OdeModel():
     def __init__(self, time_setup_dict) -> None:
+        TimeClass.check_window(time_setup_dict)
         self.time_object = TimeClass(time_setup_dict=time_setup_dict)
         self._state_variable_dict = pd.Series()
         self.all_sv_data = pd.DataFrame(index=self.time_object.time.index, dtype='float64')
@@ -91,11 +92,15 @@ class OdeModel():
             del self.name
         if hasattr(self, 'all_sv_data'):
             del self.all_sv_data
-        for comp in self.components.values():
-            del comp
-        del self.components
-        for sv in self._state_variable_dict.values:
-            del sv
-        del self._state_variable_dict
-        del self.time_object
+        # the attributes are only deleted if they were set, the model may not be fully built (e.g. __init__ raised)
+        if hasattr(self, 'components'):
+            for comp in self.components.values():
+                del comp
+            del self.components
+        if hasattr(self, '_state_variable_dict'):
+            for sv in self._state_variable_dict.values:
+                del sv
+            del self._state_variable_dict
+        if hasattr(self, 'time_object'):
+            del self.time_object
         return
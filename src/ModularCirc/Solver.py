@@ -2,6 +2,12 @@ from .Time import TimeClass
 from .StateVariable import StateVariable
 from .Models.OdeModel import OdeModel
 from .HelperRoutines import bold_text
+from .Compiler import CompiledModel, fingerprint, secondary_dependencies, secondary_order, column_coloring
+from .Compiler import newton_secondary
+from .Compiler import NEWTON_TOL, NEWTON_MAX_ITER
+from .SolverStats import SolverStats
+from . import FixedStepIntegrators
+from .FixedStepIntegrators import FIXED_STEP_METHODS
 from pandera.typing import DataFrame, Series
 from .Models.OdeModel import OdeModel
 
@@ -13,12 +19,29 @@ from scipy.integrate import solve_ivp
 from scipy.linalg import solve
 from scipy.optimize import newton, approx_fprime, root, least_squares
 
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, csc_matrix, kron, identity
 from scipy.sparse.csgraph import reverse_cuthill_mckee
 from scipy.linalg import bandwidth
-from scipy.integrate import LSODA
+from scipy.integrate import LSODA, BDF, Radau, RK23, RK45, DOP853
 
 import warnings
+import time
+import hashlib
+import os
+
+# integration methods of `solve_ivp`
+SOLVE_IVP_METHODS = {'RK23': RK23, 'RK45': RK45, 'DOP853': DOP853, 'Radau': Radau, 'BDF': BDF, 'LSODA': LSODA}
+
+
+class SolverAbort(Exception):
+    """
+    Raised when a compute budget of the solver is exceeded (see `Solver.setup`), `reason` is the dictionary stored
+    in `Solver.abort_reason`.
+    """
+    def __init__(self, reason:dict) -> None:
+        super().__init__(f"{reason['reason']} budget exceeded ({reason['value']:.3e} vs limit {reason['limit']:.3e})")
+        self.reason = reason
+
 
 class Solver():
     def __init__(self,
@@ -36,8 +59,17 @@ class Solver():
         # have their own differential equations but are instead computed from the primary state variables using algebraic
         # relationships (u_func). These variables are updated based on the current values of the primary state variables.
 
-        # DataFrame containing all state variable data from the model.
-        self._asd = model.all_sv_data
+        # Array containing all state variable data (time x state variable, row major so that the time points are
+        # contiguous), initialized from the DataFrame of the model. The array is the one updated by the solver, the
+        # DataFrame `_asd` is only built on demand.
+        self._asd_columns = model.all_sv_data.columns
+        self._asd_values  = np.array(model.all_sv_data.to_numpy(dtype=np.float64), order='C')
+        self._asd_frame   = None
+        # Initial values of the state variables (NaN for the ones initialized by function), see `set_parameters`.
+        self._y0          = self._asd_values[0].copy()
+        # Index of the time point stored in the first row of `_asd_values`, non zero when the model only stores a
+        # rolling window of the last cycles (see `TimeClass.window`).
+        self._row0        = 0
 
         # Dictionary of state variables from the model.
         self._vd  = model._state_variable_dict
@@ -67,10 +99,30 @@ class Solver():
         self._global_psv_names      = []
         # Dictionary to store the names of the secondary state variables.
         self._global_sv_init_fun    = {}
+        # Dictionary to store the names of the initialization functions.
+        self._global_sv_init_fun_n  = {}
 
         # Dictionary to store the indexes of the secondary state variables.
         self._global_sv_init_ind    = {}
 
+        # Dictionaries to store the (kernel, parameters) pairs used to generate the compiled functions.
+        self._global_psv_update_ker = {}
+        self._global_ssv_update_ker = {}
+        self._global_sv_init_ker    = {}
+
+        # Dictionaries to store the analytic partial derivatives of the update functions (see `StateVariable.set_dudt_func`).
+        self._global_psv_update_jac = {}
+        self._global_ssv_update_jac = {}
+
+        # Dictionaries to store the switching functions of the state variables (see `StateVariable.add_switch_func`)
+        # and the indexes of their inputs.
+        self._global_switch_ker = {}
+        self._global_switch_ind = {}
+
+        # Zero crossings of the switching functions located during the integration, (time, variable name, index of
+        # the switching function, direction) tuples.
+        self._event_log = []
+
         # Dictionary mapping the state variable names to their indexes.
         self._global_sv_id          = {key: id   for id, key in enumerate(model.all_sv_data.columns.to_list())}
         # Dictionary mapping the indexes to the state variable names.
@@ -85,12 +137,34 @@ class Solver():
         # Variable to store the number of converged cycles.
         self._Nconv = None
 
-        # Number of sub-iterations for the solver.
+        # Number of sub-iterations of the algebraic loops among the secondary state variables, the other secondary
+        # variables are computed once in dependency order (see `Compiler.secondary_order`).
         self._n_sub_iter = 1
 
         # flag for checking if the model is converged or not...
         self.converged = False
 
+        # Number of extrapolated cycle starts and estimated number of cycles saved (see `generate_cycle_start_function`).
+        self._n_extrapolations = 0
+        self._cycles_saved     = 0.0
+
+        # Reason of the early abort of the solver (None when the solver was not aborted) and the convergence
+        # errors of the cycles (see `setup`).
+        self._abort_reason = None
+        self._residuals    = []
+        self._cycle_residuals = None
+
+        # Statistics of the last solve (see `SolverStats`).
+        self._stats = SolverStats()
+
+        # Number of calls and cumulative time of the update functions of the state variables, [calls, time] lists
+        # indexed by the state variable index, only filled in profiling mode (see `setup`).
+        self._profile_records = {}
+
+        # Last solution of the secondary state variables when they are optimized, the starting point of the Newton
+        # solver at the next evaluation of the derivatives (see `gen_secondary_solvers`).
+        self._ssv_guess = {'z': None}
+
 
     def setup(self,
               optimize_secondary_sv:bool=False,
@@ -101,14 +175,75 @@ class Solver():
               atol=1e-6,
               rtol=1e-6,
               step = 1,
+              compiled:bool=False,
+              analytic_jacobian:bool=False,
+              vectorized:bool=False,
+              steady_state:str=None,
+              anderson_depth:int=3,
+              continuous:bool=False,
+              events:bool=False,
+              max_wall_time:float=None,
+              max_nfev:int=None,
+              min_step:float=None,
+              divergence_window:int=None,
+              profile:bool=False,
+              cache_dir:str=None,
               )->None:
         """
         Method for detecting which are the principal variables and which are the secondary ones.
 
         ## Inputs
+        method : str
+            integration method, either one of the methods of `solve_ivp` or one of the numba compiled fixed step
+            methods 'RK4', 'BackwardEuler', 'Trapezoidal' and 'SDIRK' (see `FixedStepIntegrators`), which take one
+            step per time step of the output and require `compiled=True`. SDIRK (L-stable, second order) is the
+            one to use for the stiff valve models, RK4 and Trapezoidal may not settle on a periodic solution.
         optimize_secondary_sv : boolean
             flag used to switch on the optimization for secondary variable computations, this flag needs to be
-            true when not all of the secondary variables can be expressed in terms of primary variables.
+            true when not all of the secondary variables can be expressed in terms of primary variables. The
+            secondary variables are solved by a Newton iteration (numba compiled with `compiled=True`) starting
+            from the solution at the previous evaluation of the derivatives, see `gen_secondary_solvers`.
+        compiled : boolean
+            flag used to switch on the generation of a single numba compiled function computing the derivatives
+            of the whole system (see `Compiler.CompiledModel`), all state variables need to define a kernel.
+        analytic_jacobian : boolean
+            flag used to switch on the assembly of the Jacobian of the system from the analytic partial derivatives
+            of the state variable functions, otherwise the implicit methods approximate the Jacobian using finite
+            differences and the sparsity pattern of the system.
+        vectorized : boolean
+            flag used to call `solve_ivp` in vectorized mode, the derivatives are then evaluated for blocks of
+            state vectors (one per column), e.g. all the columns of a finite difference Jacobian in one call.
+        steady_state : str
+            method used to find the periodic steady state, by default (None) every cycle starts from the end of the
+            previous one. With 'anderson' the cycle is treated as a map y0 -> y(T) and the start of every cycle is
+            found by Anderson acceleration of the shooting problem y(T) - y0 = 0, using the last `anderson_depth`
+            cycles. With 'aitken' the start of a cycle is extrapolated from the ends of the previous cycles
+            (Aitken delta squared), a cheaper alternative when the approach to the limit cycle is geometric.
+        continuous : boolean
+            flag used to integrate all the cycles with a single integrator, stepped manually, instead of calling
+            `solve_ivp` for every cycle. The step size history and the Jacobian are kept from one cycle to the
+            next, the steps are not limited by the time step of the output, which is sampled from the dense output
+            of the integrator. The integrator is restarted when the start of a cycle is changed (see `steady_state`).
+        events : boolean
+            flag used to locate the zero crossings of the switching functions of the state variables (e.g. the
+            pressure difference across a valve, see `StateVariable.add_switch_func`) with the events of `solve_ivp`.
+            The integration stops at every crossing and restarts from there, so the integrator never steps over the
+            kinks of the valve laws. The crossings are available through `events` and the `events` property of the
+            switched state variables, e.g. to time the valve openings and closings exactly.
+        max_wall_time, max_nfev, min_step, divergence_window :
+            compute budgets of `solve`, the solver is aborted when the wall clock time (in seconds) or the number of
+            evaluations of the derivatives (`solve_ivp` methods only) exceed their limits, when a step of the
+            integrator is shorter than `min_step` (stiff collapse), or when the convergence error grows over
+            `divergence_window` consecutive cycles (or is not finite). The budgets are checked after every step of
+            the integrator and every cycle, the reason of the abort is stored in `abort_reason`. None disables them.
+        profile : boolean
+            flag used to wrap the update functions of the primary and secondary state variables with timers, the
+            number of calls and the time spent in every function during `solve` are reported by `profile_report`.
+            Without the flag the update functions are called directly. Not supported by the compiled functions.
+        cache_dir : str
+            directory of the on-disk cache of the structure of the system (ordering of the variables, bandwidth,
+            sparsity pattern) and of the compiled functions, keyed by `topology_hash`. The processes and runs
+            sharing the directory reuse them instead of computing and compiling them again.
         """
         self._optimize_secondary_sv = optimize_secondary_sv
         self._step_tol  = step_tol
@@ -117,6 +252,49 @@ class Solver():
         self._atol      = atol
         self._rtol      = rtol
         self.step       = step
+        self._compiled  = compiled
+        self._analytic_jacobian = analytic_jacobian
+        self._vectorized = vectorized
+        self._steady_state = steady_state
+        self._anderson_depth = anderson_depth
+        self._continuous = continuous
+        self._events    = events
+        self._max_wall_time = max_wall_time
+        self._max_nfev  = max_nfev
+        self._min_step  = min_step
+        self._divergence_window = divergence_window
+        self._profile   = profile
+        self._cache_dir = cache_dir
+        self._integrator = None
+        self._fixed_step_Minv = None
+
+        if self._method in FIXED_STEP_METHODS and not self._compiled:
+            raise Exception(f"The fixed step method {self._method} requires the compiled functions (compiled=True).")
+
+        # the integrators of `solve_ivp` count their steps and check the budgets after every step
+        if self._method in SOLVE_IVP_METHODS:
+            self._ivp_method = self.gen_instrumented_method(SOLVE_IVP_METHODS[self._method])
+        else:
+            self._ivp_method = self._method
+
+        if self._steady_state not in (None, 'anderson', 'aitken'):
+            raise Exception(f"Unknown steady state method {self._steady_state}.")
+
+        if self._events and (self._continuous or self._method in FIXED_STEP_METHODS or self._optimize_secondary_sv):
+            raise Exception("The events are only supported by the solve_ivp methods, without continuous integration "
+                            "and without the optimization of the secondary variables.")
+
+        if self._to.window is not None and self._to.window < self.step + 1:
+            raise Exception(f"The window needs at least step + 1 = {self.step + 1} cycles for the convergence test.")
+
+        if self._profile and self._compiled:
+            raise Exception("The profiling mode times the python update functions, it requires compiled=False.")
+
+        if self._vectorized and self._optimize_secondary_sv:
+            raise Exception("The vectorized mode does not support the optimization of the secondary variables.")
+
+        if self._method in FIXED_STEP_METHODS and self._optimize_secondary_sv:
+            raise Exception("The fixed step methods do not support the optimization of the secondary variables.")
 
 
         # Loop over the state variables and check if they have an update function,
@@ -135,7 +313,14 @@ class Solver():
                 if not suppress_output: print(f'    - inputs: {component.i_inputs.to_list()}')
                 self._initialize_by_function[key] = component
                 self._global_sv_init_fun[mkey] = component.i_func
+                self._global_sv_init_fun_n[mkey] = component.i_name
                 self._global_sv_init_ind[mkey] = [self._global_sv_id[key2] for key2 in component.i_inputs.to_list()]
+                self._global_sv_init_ker[mkey] = component.i_kernel
+
+            # switching functions of the state variable, called with the inputs of its update function.
+            if len(component.switch_kernels) > 0 and (component.dudt_func is not None or component.u_func is not None):
+                self._global_switch_ker[mkey] = component.switch_kernels
+                self._global_switch_ind[mkey] = [self._global_sv_id[key2] for key2 in component.inputs.to_list()]
 
             # derivative function for a state variable. This function is used to update the state variable
             # during the numerical integration process.
@@ -145,6 +330,8 @@ class Solver():
                 if not suppress_output: print(f'    - inputs: {component.inputs.to_list()}')
                 self._global_psv_update_fun[mkey]   = component.dudt_func
                 self._global_psv_update_fun_n[mkey] = component.dudt_name
+                self._global_psv_update_ker[mkey]   = component.dudt_kernel
+                self._global_psv_update_jac[mkey]   = component.dudt_jac
                 self._global_psv_update_ind[mkey]   = [self._global_sv_id[key2] for key2 in component.inputs.to_list()]
 
                 # Pad the index array to the length of the state variable array.
@@ -163,6 +350,8 @@ class Solver():
                 if not suppress_output: print(f'    - inputs: {component.inputs.to_list()}')
                 self._global_ssv_update_fun[mkey]   = component.u_func
                 self._global_ssv_update_fun_n[mkey] = component.u_name
+                self._global_ssv_update_ker[mkey]   = component.u_kernel
+                self._global_ssv_update_jac[mkey]   = component.u_jac
                 self._global_ssv_update_ind[mkey]   = [self._global_sv_id[key2] for key2 in component.inputs.to_list()]
                 self._global_ssv_update_ind[mkey]   = np.pad(self._global_ssv_update_ind[mkey],
                                                              (0, self._N_sv-len(self._global_ssv_update_ind[mkey])),
@@ -174,16 +363,22 @@ class Solver():
 
         self.generate_dfdt_functions()
 
+        if self._events:
+            self.generate_switching_functions()
+
 
         if self._conv_cols is None:
             # If no specific columns for convergence (_conv_cols) are provided,
             # automatically select columns from the DataFrame (_asd) whose names
             # contain 'v_' or 'p_', as variables of interest for convergence checks.
-            self._cols = [col for col in self._asd.columns if 'v_' in col or 'p_' in col]
+            self._cols = [col for col in self._asd_columns if 'v_' in col or 'p_' in col]
         else:
             # If specific convergence columns are provided, use them directly.
             self._cols = self._conv_cols
 
+        # indexes of the columns used in the convergence test.
+        self._cols_ind = [self._global_sv_id[col] for col in self._cols]
+
         # End the method without returning any specific value.
         return None
 
@@ -232,9 +427,19 @@ class Solver():
                                dtype=np.float64)
 
         # Function to update the secondary state variables based on the primary state variables.
-        funcs2 = np.array(list(self._global_ssv_update_fun.values()))
+        funcs2 = np.array(list(self.profiled_functions(self._global_ssv_update_fun).values()))
         ids2   = np.stack(list(self._global_ssv_update_ind.values()))
 
+        names2 = [self._global_ssv_update_fun_n[key] for key in self._global_ssv_update_fun.keys()]
+
+        def s_u_eval_block(i, t, yi:np.ndarray[float]) -> np.ndarray[float]:
+            """ Evaluates the i-th secondary function for a block of state vectors (one per column)."""
+            res = np.asarray(funcs2[i](t=t, y=yi), dtype=np.float64)
+            if res.shape != (yi.shape[1],):
+                raise Exception(f"Secondary update function {names2[i]} does not broadcast over blocks of state "
+                                f"vectors: expected shape {(yi.shape[1],)}, got {res.shape}.")
+            return res
+
         # @nb.njit(cache=True)
         def s_u_update(t, y:np.ndarray[float]) -> np.ndarray[float]:
             """
@@ -246,42 +451,62 @@ class Solver():
 
             Returns:
                 np.ndarray[float]: A NumPy array containing the updated values of the secondary state variables.
+                When `y` is a 2D array (one state vector per column) the output has one column per state vector.
 
             Example use:
                 >>> s_u_update(t=0.0, y=self._asd.iloc[0].to_numpy())
             """
+            if y.ndim == 2:
+                out = np.empty((len(funcs2), y.shape[1]))
+                for i, inds in enumerate(ids2):
+                    out[i] = s_u_eval_block(i, t, y[inds])
+                return out
             return np.fromiter([fi(t=t, y=yi) for fi, yi in zip(funcs2, y[ids2])],
                                dtype=np.float64)
 
-        def s_u_residual(y, yall, keys):
-            """ Function to compute the residual of the secondary state variables."""
-            yall[keys] = y
-            return (y - s_u_update(0.0, yall))
-
-        def optimize(y:np.ndarray, keys):
-            """ Function to optimize the secondary state variables."""
-            yk = y[keys]
-            sol = least_squares(   # root
-                s_u_residual,
-                yk,
-                args=(y, keys),
-                ftol=1.0e-5,
-                xtol=1.0e-15,
-                loss='linear',
-                method='lm',
-                max_nfev=int(1e6)
-                )
-            y[keys] = sol.x
-            return sol.x  # sol.x
-
         # indexes of the primary state variables.
         keys3  = np.array(list(self._global_psv_update_fun.keys()))
 
         # indexes of the secondary state variables.
         keys4  = np.array(list(self._global_ssv_update_fun.keys()))
 
+        # dependencies of the secondary state variables on each other and coloring of the columns of the Jacobian
+        # of the secondary functions, used by the Newton solver (see `Compiler.newton_secondary`)
+        ssv_pattern = secondary_dependencies(self._global_ssv_update_ind)
+        ssv_colors  = column_coloring(ssv_pattern)
+        ssv_order   = secondary_order(ssv_pattern)
+
+        def s_u_sweep(t, y:np.ndarray[float]) -> np.ndarray[float]:
+            """
+            Updates the secondary state variables of `y` in place, in dependency order (see `Compiler.secondary_order`)
+            so every variable is computed once from up to date inputs, only the algebraic loops are iterated
+            (`n_sub_iter` times). `y` may be a block of state vectors (one per column).
+
+            Returns the updated values of the secondary state variables.
+            """
+            for comp, loop in ssv_order:
+                for _ in range(_n_sub_iter if loop else 1):
+                    for i in comp:
+                        if y.ndim == 2:
+                            y[keys4[i]] = s_u_eval_block(i, t, y[ids2[i]])
+                        else:
+                            y[keys4[i]] = funcs2[i](t=t, y=y[ids2[i]])
+            return y[keys4]
+
+        def s_u_system(t, y:np.ndarray[float], P) -> np.ndarray[float]:
+            return s_u_update(t, y)
+
+        def newton_python(y:np.ndarray[float]) -> bool:
+            return newton_secondary(s_u_system, 0.0, y, None, keys4, ssv_pattern, ssv_colors,
+                                    NEWTON_TOL, NEWTON_MAX_ITER)
+
+        optimize, optimize_block, s_u_residual = self.gen_secondary_solvers(newton_python, s_u_update)
+
+        # solution of the secondary state variables at the previous evaluation, the starting point of the next one
+        ssv_guess = self._ssv_guess = {'z': None}
+
         # functions to update the primary state variables.
-        funcs3 = np.array(list(self._global_psv_update_fun.values()))
+        funcs3 = np.array(list(self.profiled_functions(self._global_psv_update_fun).values()))
 
         # indexes of the primary state variables dependencies.
         ids3   = np.stack(list(self._global_psv_update_ind.values()))
@@ -324,45 +549,58 @@ class Solver():
             for val in keys3_dict2[key]:
                 sparsity_map[i].add(keys3_back_dict[val])
 
-        # creates a sparse matrix from the sparsity map
-        mat = np.zeros((len(sparsity_map),len(sparsity_map)))
-        for key, rows in sparsity_map.items():
-            mat[key, np.array(list(rows), dtype=np.int64)] = 1
-
-        # uses the reverse cuthill mckee algorithm to reduce the bandwidth of the matrix
-        sparse_mat = csr_matrix(mat)
-        perm = reverse_cuthill_mckee(sparse_mat, symmetric_mode=False)
-        perm_mat = np.zeros((len(perm), len(perm)))
-        for i,j in enumerate(perm):
-            perm_mat[i,j] = 1
-
-        self.perm_mat = perm_mat
-
-        # reorders the sparse matrix to reduce the bandwidth
-        sparse_mat_reordered = sparse_mat[perm, :][:, perm]
-
-        # calculates the bandwidth of the reordered matrix
-        sparse_mat_reordered_indexes = np.argwhere(sparse_mat_reordered.toarray())
-        temp = sparse_mat_reordered_indexes[:,0] - sparse_mat_reordered_indexes[:,1]
-        uband = np.abs(np.min(temp))
-        lband = np.max(temp)
-
-        self.lband = lband
-        self.uband = uband
+        structure = self.load_structure()
+        if structure is None:
+            # creates a sparse matrix from the sparsity map
+            mat = np.zeros((len(sparsity_map),len(sparsity_map)))
+            for key, rows in sparsity_map.items():
+                mat[key, np.array(list(rows), dtype=np.int64)] = 1
+
+            # uses the reverse cuthill mckee algorithm to reduce the bandwidth of the matrix
+            sparse_mat = csr_matrix(mat)
+            perm = reverse_cuthill_mckee(sparse_mat, symmetric_mode=False).astype(np.int64)
+
+            # reorders the sparse matrix to reduce the bandwidth
+            sparse_mat_reordered = sparse_mat[perm, :][:, perm]
+
+            # calculates the bandwidth of the reordered matrix
+            sparse_mat_reordered_indexes = np.argwhere(sparse_mat_reordered.toarray())
+            temp = sparse_mat_reordered_indexes[:,0] - sparse_mat_reordered_indexes[:,1]
+            uband = np.abs(np.min(temp))
+            lband = np.max(temp)
+            structure = {'perm': perm, 'lband': lband, 'uband': uband, 'sparsity': sparse_mat_reordered_indexes}
+            self.save_structure(structure)
+
+        # the permutations are applied by indexing, y[perm] reorders and y[inv_perm] restores the original order
+        perm     = structure['perm']
+        inv_perm = np.argsort(perm)
+        self.perm     = perm
+        self.inv_perm = inv_perm
+
+        self.lband = int(structure['lband'])
+        self.uband = int(structure['uband'])
+
+        # sparsity pattern of the Jacobian of the (reordered) system, used by the implicit methods
+        rows, cols = structure['sparsity'][:, 0], structure['sparsity'][:, 1]
+        self.jac_sparsity = csc_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(perm), len(perm)))
 
         def pv_dfdt_update(t, y:np.ndarray[float]) -> np.ndarray[float]:
 
             """ Function to compute the derivatives of the primary state variables over time."""
 
+            # in vectorized mode solve_ivp passes single state vectors as one column blocks
+            if y.ndim == 2 and y.shape[1] == 1:
+                return pv_dfdt_update(t, y[:, 0])[:, np.newaxis]
 
             # calculates the current time within the heart cycle
             ht = t%T
 
             # permutes the primary state variables
-            y2 = perm_mat.T @ y
+            y2 = y[inv_perm]
 
-            # initialises the temporary array to store the state variables
-            if len(y.shape) == 2:
+            # initialises the temporary array to store the state variables, in vectorized mode the columns of `y`
+            # are independent state vectors
+            if y.ndim == 2:
                 y_temp = np.zeros((N_zeros_0,y.shape[1]))
             else:
                 y_temp = np.zeros((N_zeros_0))
@@ -371,20 +609,453 @@ class Solver():
             y_temp[keys3] = y2
 
             # updates the secondary state variables, and optimises them if necessary
-            for _ in range(_n_sub_iter):
-                y_temp[keys4] = s_u_update(t, y_temp)
+            s_u_sweep(t, y_temp)
             if _optimize_secondary_sv:
-                y_temp[keys4] = optimize(y_temp, keys4)
+                ssv_guess['z'] = y_temp[keys4] = optimize(y_temp, keys4, ssv_guess['z'])
             # returns the derivatives of the primary state variables, reordered back to the original order
-            return perm_mat @ np.fromiter([fi(t=ht, y=yi) for fi, yi in zip(funcs3, y_temp[ids3])], dtype=np.float64)
+            if y.ndim == 2:
+                return np.array([fi(t=ht, y=yi) for fi, yi in zip(funcs3, y_temp[ids3])], dtype=np.float64)[perm]
+            return np.fromiter([fi(t=ht, y=yi) for fi, yi in zip(funcs3, y_temp[ids3])], dtype=np.float64)[perm]
 
 
         self.initialize_by_function = initialize_by_function
         self.pv_dfdt_global = pv_dfdt_update
         self.s_u_update     = s_u_update
+        self.s_u_sweep      = s_u_sweep
+        self.optimize       = optimize
+        self.optimize_block = optimize_block
+        self.s_u_residual   = s_u_residual
+
+        if self._compiled:
+            self.generate_compiled_functions(perm=perm)
+
+        if self._analytic_jacobian:
+            self.generate_jacobian_function(perm=perm)
+
+
+    def gen_secondary_solvers(self, newton, s_u_update):
+        """
+        Generates the functions optimizing the secondary state variables, `optimize` for a state vector and
+        `optimize_block` for a block of state vectors (one per column). The variables are solved in place by
+        `newton(y)` (see `Compiler.newton_secondary`), starting from a previous solution when one is given (warm
+        start) and then from the values in the state vector. A least squares fit of the residual of the secondary
+        functions `s_u_update` (`s_u_residual`, also returned) is only used when the Newton iteration fails.
+        """
+        keys4 = np.array(list(self._global_ssv_update_fun.keys()))
+
+        def solve_newton(y:np.ndarray[float], z0:np.ndarray[float]=None) -> bool:
+            starts = [y[keys4].copy(),] if z0 is None else [z0, y[keys4].copy()]
+            for z in starts:
+                y[keys4] = z
+                try:
+                    if newton(y):
+                        return True
+                except np.linalg.LinAlgError:
+                    pass
+            y[keys4] = starts[-1]
+            return False
+
+        def s_u_residual(y, yall, keys):
+            """ Function to compute the residual of the secondary state variables."""
+            yall[keys] = y
+            return (y - s_u_update(0.0, yall))
+
+        def optimize(y:np.ndarray, keys, z0:np.ndarray=None):
+            """ Function to optimize the secondary state variables, `z0` is a previous solution to start from."""
+            if np.array_equal(keys, keys4):
+                y_newton = np.array(y, dtype=np.float64)
+                if solve_newton(y_newton, z0):
+                    y[keys] = y_newton[keys]
+                    return y[keys]
+            yk = y[keys]
+            sol = least_squares(   # root
+                s_u_residual,
+                yk,
+                args=(y, keys),
+                ftol=1.0e-5,
+                xtol=1.0e-15,
+                loss='linear',
+                method='lm',
+                max_nfev=int(1e6)
+                )
+            y[keys] = sol.x
+            return sol.x  # sol.x
+
+        def s_u_residual_block(y, yall, keys):
+            """ Function to compute the residual of the secondary state variables for a block of state vectors."""
+            yall[keys] = y.reshape(len(keys), -1)
+            return (yall[keys] - s_u_update(0.0, yall)).ravel()
+
+        def optimize_block(y:np.ndarray, keys):
+            """
+            Function to optimize the secondary state variables of a block of state vectors (one per column). The
+            state vectors are solved one after the other, each one starting from the solution of the previous one
+            (e.g. consecutive time points). The ones where the Newton iteration fails are fitted together, the
+            Jacobian of the residual is approximated using its block sparsity.
+            """
+            failed = np.arange(y.shape[1])
+            if np.array_equal(keys, keys4):
+                z0, failed = None, []
+                for j in range(y.shape[1]):
+                    y_newton = np.array(y[:, j], dtype=np.float64)
+                    if solve_newton(y_newton, z0):
+                        y[keys, j] = z0 = y_newton[keys]
+                    else:
+                        failed.append(j)
+            if len(failed) == 0:
+                return y[keys]
+            y_failed = y[:, failed]
+            sol = least_squares(
+                s_u_residual_block,
+                y_failed[keys].ravel(),
+                args=(y_failed, keys),
+                jac_sparsity=kron(np.ones((len(keys), len(keys))), identity(len(failed))),
+                ftol=1.0e-5,
+                xtol=1.0e-15,
+                loss='linear',
+                method='trf',
+                max_nfev=int(1e6)
+                )
+            y[np.ix_(keys, failed)] = sol.x.reshape(len(keys), -1)
+            return y[keys]
+
+        return optimize, optimize_block, s_u_residual
+
+
+    @property
+    def topology_hash(self) -> str:
+        """
+        Hash of the topology of the set up model: the names of the state variables, the inputs and the names of
+        their functions, the kernels (by content, see `Compiler.fingerprint`) and the layout of their parameters.
+        Models with the same hash share the structure of the system and the compiled functions, whatever the
+        values of their parameters.
+        """
+        def layout(spec):
+            if spec is None:
+                return 'None'
+            kernel, parameters = spec
+            return fingerprint(kernel) + repr([(name, fingerprint(value) if callable(value) else
+                                                (len(value) if isinstance(value, tuple) else 'float'))
+                                               for name, value in parameters.items()])
+
+        parts = [repr(list(self._asd_columns)), repr(self._n_sub_iter)]
+        for names, inds, kers in [(None,                          self._global_sv_init_ind,   self._global_sv_init_ker),
+                                  (self._global_ssv_update_fun_n, self._global_ssv_update_ind, self._global_ssv_update_ker),
+                                  (self._global_psv_update_fun_n, self._global_psv_update_ind, self._global_psv_update_ker)]:
+            for key in kers.keys():
+                parts.append(f'{key}:{names[key] if names is not None else ""}:{list(np.asarray(inds[key]))}:'
+                             f'{layout(kers[key])}')
+        for key, switches in self._global_switch_ker.items():
+            parts.append(f'{key}:{[layout(spec) for spec in switches]}')
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:24]
+
+
+    def load_structure(self) -> dict:
+        """ Loads the structure of the system from the cache directory, None if it is not cached."""
+        if self._cache_dir is None:
+            return None
+        path = os.path.join(self._cache_dir, f'structure_{self.topology_hash}.npz')
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+
+    def save_structure(self, structure:dict) -> None:
+        """ Saves the structure of the system in the cache directory, written atomically."""
+        if self._cache_dir is None:
+            return
+        os.makedirs(self._cache_dir, exist_ok=True)
+        path = os.path.join(self._cache_dir, f'structure_{self.topology_hash}.npz')
+        temp = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(temp, **structure)
+        os.replace(temp, path)
+
+
+    def profiled_functions(self, funcs:dict) -> dict:
+        """
+        Returns the update functions `funcs` (indexed by state variable) wrapped with timers in profiling mode,
+        otherwise the functions themselves.
+        """
+        if not self._profile:
+            return funcs
+
+        def gen_profiled(fun, record):
+            def profiled(t, y):
+                start = time.perf_counter()
+                res = fun(t=t, y=y)
+                record[0] += 1
+                record[1] += time.perf_counter() - start
+                return res
+            return profiled
+
+        wrapped = dict()
+        for mkey, fun in funcs.items():
+            self._profile_records[mkey] = [0, 0.0]
+            wrapped[mkey] = gen_profiled(fun, self._profile_records[mkey])
+        return wrapped
+
+
+    def profile_report(self, by:str='variable') -> pd.DataFrame:
+        """
+        Returns the number of calls and the cumulative time of the update functions in the last solve (profiling
+        mode only), one row per state variable (`by='variable'`) or per function name (`by='function'`), sorted by
+        decreasing time.
+        """
+        if not self._profile:
+            raise Exception("The profile is only recorded when the solver is setup with profile=True.")
+        names = {**self._global_psv_update_fun_n, **self._global_ssv_update_fun_n}
+        report = pd.DataFrame([{'variable': self._global_sv_id_rev[mkey],
+                                'function': names[mkey],
+                                'kind'    : 'primary' if mkey in self._global_psv_update_fun else 'secondary',
+                                'calls'   : record[0],
+                                'time'    : record[1]} for mkey, record in self._profile_records.items()],
+                              columns=['variable', 'function', 'kind', 'calls', 'time'])
+        if by == 'function':
+            report = report.groupby(['function', 'kind'], as_index=False)[['calls', 'time']].sum()
+        elif by != 'variable':
+            raise Exception(f"Unknown profile grouping {by}, either 'variable' or 'function'.")
+        report['time_per_call'] = report['time'] / report['calls'].clip(lower=1)
+        return report.sort_values('time', ascending=False).reset_index(drop=True)
+
+
+    def generate_compiled_functions(self, perm:np.ndarray[int]) -> None:
+        """
+        Replaces the python closures generated by `generate_dfdt_functions` with the numba compiled, fused, versions
+        built from the kernels of the state variables. The parameters of the kernels are stored in `self._P`.
+        """
+        for kers, names in [(self._global_sv_init_ker,    self._global_sv_init_fun_n),
+                            (self._global_ssv_update_ker, self._global_ssv_update_fun_n),
+                            (self._global_psv_update_ker, self._global_psv_update_fun_n)]:
+            for key, ker in kers.items():
+                if ker is None:
+                    raise Exception(f"Variable {self._global_sv_id_rev[key]} ({names[key]}) does not define a kernel, "
+                                    "the model can not be compiled.")
+
+        self._compiled_model = CompiledModel(init_specs=self._global_sv_init_ker,
+                                             init_ids=self._global_sv_init_ind,
+                                             ssv_specs=self._global_ssv_update_ker,
+                                             ssv_ids=self._global_ssv_update_ind,
+                                             psv_specs=self._global_psv_update_ker,
+                                             psv_ids=self._global_psv_update_ind,
+                                             perm=perm,
+                                             N_sv=self._N_sv,
+                                             tcycle=self._to.tcycle,
+                                             n_sub_iter=self._n_sub_iter,
+                                             cache_dir=self._cache_dir,
+                                             key=self.topology_hash if self._cache_dir is not None else None)
+        self._P = self._compiled_model.P
+
+        pv_dfdt_compiled = self._compiled_model.pv_dfdt_update
+        s_u_compiled     = self._compiled_model.s_u_update
+        pv_dfdt_block    = self._compiled_model.pv_dfdt_update_block
+        s_u_block        = self._compiled_model.s_u_update_block
+        sweep_compiled   = self._compiled_model.s_u_sweep
+        sweep_block      = self._compiled_model.s_u_sweep_block
+        init_compiled    = self._compiled_model.initialize_by_function
+        P = self._P
+
+        def pv_dfdt_update(t, y:np.ndarray[float]) -> np.ndarray[float]:
+            if y.ndim == 2:
+                return pv_dfdt_block(t, y, P)
+            return pv_dfdt_compiled(t, y, P)
+
+        def s_u_update(t, y:np.ndarray[float]) -> np.ndarray[float]:
+            if y.ndim == 2:
+                return s_u_block(t, y, P)
+            return s_u_compiled(t, y, P)
+
+        def s_u_sweep(t, y:np.ndarray[float]) -> np.ndarray[float]:
+            if y.ndim == 2:
+                return sweep_block(t, y, P)
+            return sweep_compiled(t, y, P)
+
+        def initialize_by_function(y:np.ndarray[float]) -> np.ndarray[float]:
+            return init_compiled(y, P)
+
+        if self._optimize_secondary_sv:
+            newton_compiled   = self._compiled_model.s_u_newton
+            pv_dfdt_secondary = self._compiled_model.pv_dfdt_update_secondary
+            optimize, optimize_block, s_u_residual = self.gen_secondary_solvers(lambda y: newton_compiled(y, P),
+                                                                                s_u_update)
+            self.optimize, self.optimize_block, self.s_u_residual = optimize, optimize_block, s_u_residual
+
+            keys3 = np.array(list(self._global_psv_update_fun.keys()))
+            keys4 = np.array(list(self._global_ssv_update_fun.keys()))
+            inv_perm = np.argsort(perm)
+            N_sv = self._N_sv
+            ssv_guess = self._ssv_guess = {'z': None}
+
+            def pv_dfdt_update(t, y:np.ndarray[float]) -> np.ndarray[float]:
+                y_temp = np.zeros(N_sv)
+                y_temp[keys3] = y[inv_perm]
+                sweep_compiled(t, y_temp, P)
+                ssv_guess['z'] = y_temp[keys4] = optimize(y_temp, keys4, ssv_guess['z'])
+                return pv_dfdt_secondary(t, y_temp, P)
+
+        self.pv_dfdt_global = pv_dfdt_update
+        self.s_u_update     = s_u_update
+        self.s_u_sweep      = s_u_sweep
+        self.initialize_by_function = initialize_by_function
+
+
+    @property
+    def parameter_names(self) -> list[str]:
+        """ Names of the entries of the parameter vector of the compiled solver, see `Compiler.CompiledModel`."""
+        return self._compiled_model.parameter_names
+
+
+    def set_parameters(self, P:np.ndarray[float], y0:np.ndarray[float]=None, dt:float=None) -> None:
+        """
+        Sets the parameter vector of a compiled solver (same layout as `parameter_names`, e.g. the output of
+        `EnsembleSolver.member_parameters` for a model with the same topology) and resets the solution fields, so
+        the solver can solve a new case without rebuilding the model and the compiled functions. The duration of
+        the heart cycle (first entry) may change, see `TimeClass.set_tcycle`.
 
-        self.optimize = optimize
-        self.s_u_residual = s_u_residual
+        ## Inputs
+        P : np.ndarray
+            parameter vector.
+        y0 : np.ndarray
+            initial values of the state variables (NaN for the ones initialized by function), by default the
+            initial values of the model.
+        dt : float
+            time step of the outputs, by default scaled with the duration of the heart cycle.
+        """
+        if not self._compiled:
+            raise Exception("The parameters can only be set for a solver setup with compiled=True.")
+        if self._events or self._analytic_jacobian:
+            raise Exception("The events and the analytic Jacobian use the parameters of the model, "
+                            "the parameters can not be set.")
+        P = np.asarray(P, dtype=np.float64)
+        if P.shape != self._P.shape:
+            raise Exception(f"The parameter vector needs {len(self._P)} entries, one per parameter.")
+        # the compiled closures hold a reference to the parameter vector, which is updated in place
+        self._P[:] = P
+        if P[0] != self._to.tcycle or (dt is not None and dt != self._to.dt):
+            self._to.set_tcycle(P[0], dt=dt)
+        else:
+            self._to.store_cycles(0, min(self._to.window or self._to.ncycles, self._to.ncycles))
+
+        if y0 is not None:
+            self._y0 = np.asarray(y0, dtype=np.float64).copy()
+        self._asd_values = np.zeros((self._to.n_t, self._N_sv))
+        self._asd_values[0] = self._y0
+        self._asd_frame  = None
+        self._row0       = 0
+        self._fixed_step_Minv = None
+        self._Nconv      = None
+        self.converged   = False
+
+
+    def generate_switching_functions(self) -> None:
+        """
+        Generates `self.switching_functions`, computing the values of all the switching functions of the state
+        variables for a (reordered) primary state vector, and `self.switch_events`, the corresponding event functions
+        of `solve_ivp` (one per switching function).
+        """
+        kernels = []
+        ids     = []
+        self._switch_names = []
+        for key, switches in self._global_switch_ker.items():
+            for j, spec in enumerate(switches):
+                kernels.append(spec)
+                ids.append(self._global_switch_ind[key])
+                self._switch_names.append((self._global_sv_id_rev[key], j))
+
+        keys3 = np.array(list(self._global_psv_update_fun.keys()), dtype=np.int64)
+        keys4 = np.array(list(self._global_ssv_update_fun.keys()), dtype=np.int64)
+        N_sv  = self._N_sv
+        T     = self._to.tcycle
+        inv_perm    = self.inv_perm
+        s_u_sweep   = self.s_u_sweep
+
+        # the event functions are evaluated one after the other at the same point, the values are computed once
+        last = {'t': None, 'y': None, 'values': None}
+
+        def switching_functions(t, y:np.ndarray[float]) -> np.ndarray[float]:
+            if last['t'] == t and np.array_equal(last['y'], y):
+                return last['values']
+            y_temp = np.zeros(N_sv)
+            y_temp[keys3] = y[inv_perm]
+            s_u_sweep(t, y_temp)
+            values = np.array([kernel(t=t%T, y=y_temp[inds], **parameters)
+                               for (kernel, parameters), inds in zip(kernels, ids)], dtype=np.float64)
+            last['t'], last['y'], last['values'] = t, y.copy(), values
+            return values
+
+        def gen_event(k):
+            def event(t, y):
+                return switching_functions(t, y)[k]
+            return event
+
+        self.switching_functions = switching_functions
+        self.switch_events = [gen_event(k) for k in range(len(kernels))]
+
+
+    def generate_jacobian_function(self, perm:np.ndarray[int]) -> None:
+        """
+        Generates `self.pv_jacobian`, the function assembling the Jacobian of `pv_dfdt_global` from the analytic
+        partial derivatives of the state variable functions. The secondary state variables are eliminated using
+        the chain rule, i.e. J = F_pp + F_ps (I - G_ss)^-1 G_sp, where F are the partial derivatives of the primary
+        functions and G those of the secondary functions.
+        """
+        if self._optimize_secondary_sv:
+            raise Exception("The analytic Jacobian does not support the optimization of the secondary variables.")
+
+        def gen_partials(jacs, kers, inds):
+            partials = []
+            for key, jac in jacs.items():
+                if jac is None or kers[key] is None:
+                    raise Exception(f"Variable {self._global_sv_id_rev[key]} does not define its partial derivatives, "
+                                    "the analytic Jacobian can not be assembled.")
+                partials.append((key, jac, kers[key][1], inds[key][inds[key] >= 0]))
+            return partials
+
+        ssv_partials = gen_partials(self._global_ssv_update_jac, self._global_ssv_update_ker, self._global_ssv_update_ind)
+        psv_partials = gen_partials(self._global_psv_update_jac, self._global_psv_update_ker, self._global_psv_update_ind)
+
+        keys3 = np.array(list(self._global_psv_update_fun.keys()))
+        keys4 = np.array(list(self._global_ssv_update_fun.keys()), dtype=np.int64)
+        inv_perm = self.inv_perm
+        eye4 = np.eye(len(keys4))
+
+        T = self._to.tcycle
+        N_zeros_0 = self._N_sv
+        s_u_sweep = self.s_u_sweep
+
+        # LSODA expects banded Jacobians to be packed, jac_packed[uband + i - j, j] = jac[i, j], the last lband rows
+        # are used as workspace by the banded LU factorization
+        lband, uband = self.lband, self.uband
+        diag = np.subtract.outer(np.arange(len(keys3)), np.arange(len(keys3)))
+        band_i, band_j = np.nonzero((diag <= lband) & (-diag <= uband))
+        packed = self._method == 'LSODA'
+
+        def pv_jacobian(t, y:np.ndarray[float]):
+            """ Function to compute the Jacobian of the derivatives of the primary state variables."""
+            ht = t%T
+
+            y_temp = np.zeros(N_zeros_0)
+            y_temp[keys3] = y[inv_perm]
+            s_u_sweep(t, y_temp)
+
+            A = np.zeros((N_zeros_0, N_zeros_0))
+            for key, jac, parameters, ids in ssv_partials:
+                np.add.at(A[key], ids, jac(t=t, y=y_temp[ids], **parameters))
+            for key, jac, parameters, ids in psv_partials:
+                np.add.at(A[key], ids, jac(t=ht, y=y_temp[ids], **parameters))
+
+            J = A[np.ix_(keys3, keys3)]
+            if len(keys4) > 0:
+                J = J + A[np.ix_(keys3, keys4)] @ solve(eye4 - A[np.ix_(keys4, keys4)], A[np.ix_(keys4, keys3)])
+            J = J[perm, :][:, perm]
+
+            if packed:
+                J_packed = np.zeros((2 * lband + uband + 1, len(keys3)))
+                J_packed[uband + band_i - band_j, band_j] = J[band_i, band_j]
+                return J_packed
+            return csc_matrix(J)
+
+        self.pv_jacobian = pv_jacobian
 
 
     def advance_cycle(self, y0, cycleID, step = 1):
@@ -393,80 +1064,530 @@ class Solver():
         n_t = self._to.n_c - 1
         end_cycle = cycleID + step
         # retrieves the time points for the current cycle, n_t is the step size
-        t = self._to._sym_t.values[cycleID*n_t:end_cycle*n_t+1]
+        t = self._to.cycle_times(cycleID, end_cycle)
+        self._cycle_residuals = None
+        self.shift_window(end_cycle=end_cycle)
+        row0 = self._row0
 
         # solves the system of ODEs
+        if self._method in FIXED_STEP_METHODS:
+            # the fixed step integrators write directly in the array of the state variables
+            if not self.integrate_fixed_step(y0=y0, t=t, cycleID=cycleID):
+                return False
+            self._stats.add(n_steps=len(t) - 1)
+        else:
+            if self._continuous:
+                y = self.integrate_continuous(y0=y0, t=t, cycleID=cycleID, end_cycle=end_cycle)
+            elif self._events:
+                y = self.integrate_events(y0=y0, t=t)
+            else:
+                y = self.integrate_cycle(y0=y0, t=t)
+            if y is None:
+                return False
+
+            # updates the state variables in the DataFrame
+            ids = list(self._global_psv_update_fun.keys())
+            self._asd_values[cycleID*n_t-row0:(end_cycle)*n_t+1-row0, ids] = y[:, 0:n_t*step+1].T
+        self._asd_frame = None
+
+        if cycleID == 0: return False
+
+        cycleP = end_cycle - 1
+
+        cs   = self._asd_values[cycleP*n_t-row0:end_cycle*n_t-row0, self._cols_ind]
+        cp   = self._asd_values[(cycleP-1) *n_t-row0:(cycleP)*n_t-row0, self._cols_ind]
+
+        self._cycle_residuals = self.cycle_error(cs, cp)
+        self._residuals.append(np.max(self._cycle_residuals))
+        if self._residuals[-1] > self._step_tol : return False
+        return True
+
+
+    def shift_window(self, end_cycle:int) -> None:
+        """
+        Makes room in `_asd_values` for the cycles up to `end_cycle` when the model stores a rolling window of
+        cycles, the oldest cycles are dropped and the others moved to the front of the array.
+        """
+        n_t  = self._to.n_c - 1
+        last = min(end_cycle, self._to.ncycles) * n_t + 1
+        if last - self._row0 <= len(self._asd_values):
+            return
+        row0  = last - len(self._asd_values)
+        shift = row0 - self._row0
+        self._asd_values[:len(self._asd_values)-shift] = self._asd_values[shift:]
+        self._row0 = row0
+
+
+    def integrate_cycle(self, y0, t:np.ndarray[float]):
+        """
+        Integrates the primary state variables over the time points `t` with `solve_ivp`.
+
+        Returns the values of the primary state variables at the time points or None if the integration fails.
+        """
+        res = self.run_solve_ivp(y=np.asarray(y0)[self.perm], t_span=(t[0], t[-1]), t_eval=t)
+        if res.status == -1:
+            return None
+
+        # returns the primary state variables in the original order
+        return res.y[self.inv_perm]
+
+
+    def run_solve_ivp(self, y, t_span, t_eval, events=None):
+        """ Calls `solve_ivp` for the reordered primary state vector `y`, with the options of the method."""
+        res = self._run_solve_ivp(y, t_span, t_eval, events)
+        self._stats.add(nfev=res.nfev, njev=res.njev, nlu=res.nlu)
+        return res
+
+
+    def _run_solve_ivp(self, y, t_span, t_eval, events=None):
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             if self._method != 'LSODA':
-                res = solve_ivp(fun=self.pv_dfdt_global,
-                                t_span=(t[0], t[-1]),
-                                y0=self.perm_mat @ y0,
-                                t_eval=t,
-                                max_step=self.dt,
-                                method=self._method,
-                                atol=self._atol,
-                                rtol=self._rtol,
-                                )
+                if self._analytic_jacobian:
+                    jac_options = {'jac': self.pv_jacobian}
+                elif self._method in ('BDF', 'Radau'):
+                    jac_options = {'jac_sparsity': self.jac_sparsity}
+                else:
+                    jac_options = {}
+                return solve_ivp(fun=self.pv_dfdt_global,
+                                 t_span=t_span,
+                                 y0=y,
+                                 t_eval=t_eval,
+                                 max_step=self.dt,
+                                 method=self._ivp_method,
+                                 atol=self._atol,
+                                 rtol=self._rtol,
+                                 vectorized=self._vectorized,
+                                 events=events,
+                                 **jac_options,
+                                 )
+            return solve_ivp(fun=self.pv_dfdt_global,
+                             t_span=t_span,
+                             y0=y,
+                             t_eval=t_eval,
+                             method=self._ivp_method,
+                             atol=self._atol,
+                             rtol=self._rtol,
+                             lband=self.lband,
+                             uband=self.uband,
+                             jac=self.pv_jacobian if self._analytic_jacobian else None,
+                             vectorized=self._vectorized,
+                             events=events,
+                             )
+
+
+    def integrate_events(self, y0, t:np.ndarray[float]):
+        """
+        Integrates the primary state variables over the time points `t` with `solve_ivp`, stopping at the zero
+        crossings of the switching functions and restarting from there, so every call integrates a smooth branch
+        of the valve laws. The crossings are appended to `self._event_log`.
+
+        Returns the values of the primary state variables at the time points or None if the integration fails.
+        """
+        y   = np.asarray(y0, dtype=np.float64)[self.perm]
+        out = np.empty((len(y), len(t)))
+        self._event_log = [event for event in self._event_log if event[0] < t[0]]
+
+        # a switching function can only cross zero towards the sign opposite to its current one, so the crossing
+        # the integration restarts from is not detected a second time
+        direction = -np.sign(self.switching_functions(t[0], y))
+        # number of crossings of every switching function, a valve opens and closes once per cycle, the switching
+        # functions chattering around zero (e.g. a closed valve with equal pressures) are dropped after a few ones
+        crossings = np.zeros(len(self.switch_events), dtype=np.int64)
+        max_crossings = 2 * self.step + 2
+
+        t0, n_out = t[0], 0
+        while n_out < len(t):
+            active = np.flatnonzero(crossings < max_crossings)
+            for k in active:
+                self.switch_events[k].terminal  = True
+                self.switch_events[k].direction = direction[k]
+            try:
+                res = self.run_solve_ivp(y=y, t_span=(t0, t[-1]), t_eval=t[n_out:],
+                                         events=[self.switch_events[k] for k in active] if len(active) > 0 else None)
+            except ValueError:
+                # the root of a switching function can not be bracketed on the dense output of the step (LSODA),
+                # the rest of the cycle is integrated without events
+                crossings[:] = max_crossings
+                continue
+            if res.status == -1:
+                return None
+            out[:, n_out:n_out+len(res.t)] = res.y
+            n_out += len(res.t)
+            if res.status == 0:
+                break
+
+            i = [len(te) > 0 for te in res.t_events].index(True)
+            k = active[i]
+            t0, y = res.t_events[i][0], res.y_events[i][0]
+            d = direction[k] if direction[k] != 0.0 else 1.0
+            self._event_log.append((t0, *self._switch_names[k], d))
+            direction[k]  = -d
+            crossings[k] += 1
+
+        # returns the primary state variables in the original order
+        return out[self.inv_perm]
+
+
+    def integrate_fixed_step(self, y0, t:np.ndarray[float], cycleID:int) -> bool:
+        """
+        Integrates the primary state variables over the time points `t` with the compiled fixed step method, the
+        values are written in the rows of `_asd_values` corresponding to the time points.
+
+        The inverse of the Newton iteration matrix of the implicit methods is kept from one cycle to the next and
+        only updated when the Newton iteration fails to converge.
+
+        Returns False if the integration fails.
+        """
+        n = len(self.perm)
+        if self._fixed_step_Minv is None:
+            # the iteration matrix is computed at the first step
+            self._fixed_step_Minv = np.full((n, n), np.nan)
+        cols = np.array(list(self._global_psv_update_fun.keys()), dtype=np.int64)[self.perm]
+        y0   = np.ascontiguousarray(np.asarray(y0, dtype=np.float64)[self.perm])
+        row0 = cycleID * (self._to.n_c - 1) - self._row0
+        f    = self._compiled_model.pv_dfdt_update
+
+        return FixedStepIntegrators.integrate(self._method, f, t, y0, self._P, self._asd_values, row0, cols,
+                                              self._fixed_step_Minv, float(self._atol), float(self._rtol))
+
+
+    def integrate_continuous(self, y0, t:np.ndarray[float], cycleID:int, end_cycle:int):
+        """
+        Integrates the primary state variables over the time points `t` with the persistent integrator, which is
+        created when the cycle does not start where the previous one stopped. The steps of the integrator are not
+        aligned with `t`, the values at the time points are interpolated using the dense output of the steps.
+
+        Returns the values of the primary state variables at the time points or None if the integration fails.
+        """
+        y0 = np.asarray(y0, dtype=np.float64)
+        if self._integrator is None or cycleID != self._integrator_cycle or not np.array_equal(y0, self._integrator_y):
+            self.discard_integrator()
+            if self._method == 'LSODA':
+                jac_options = {'jac': self.pv_jacobian if self._analytic_jacobian else None,
+                               'lband': self.lband,
+                               'uband': self.uband}
+            elif self._analytic_jacobian:
+                jac_options = {'jac': self.pv_jacobian}
+            elif self._method in ('BDF', 'Radau'):
+                jac_options = {'jac_sparsity': self.jac_sparsity}
             else:
-                res = solve_ivp(fun=self.pv_dfdt_global,
-                                t_span=(t[0], t[-1]),
-                                y0=self.perm_mat @ y0,
-                                t_eval=t,
-                                method=self._method,
-                                atol=self._atol,
-                                rtol=self._rtol,
-                                lband=self.lband,
-                                uband=self.uband,
-                                )
+                jac_options = {}
+            self._integrator = self._ivp_method(fun=self.pv_dfdt_global,
+                                                t0=t[0],
+                                                y0=y0[self.perm],
+                                                t_bound=self._to.t_end,
+                                                atol=self._atol,
+                                                rtol=self._rtol,
+                                                vectorized=self._vectorized,
+                                                **jac_options)
+            self._integrator_dense = None
+
+        integrator = self._integrator
+        y = np.empty((len(y0), len(t)))
+        k = 0
+        if self._integrator_dense is None:
+            y[:, 0] = y0[self.perm]
+            k = 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            while True:
+                # samples the time points covered by the last step
+                if self._integrator_dense is not None:
+                    k_end = np.searchsorted(t, integrator.t, side='right')
+                    if k_end > k:
+                        y[:, k:k_end] = self._integrator_dense(t[k:k_end])
+                        k = k_end
+                if k == len(t):
+                    break
+                try:
+                    if integrator.status != 'running' or integrator.step() is not None:
+                        self.discard_integrator()
+                        return None
+                except (RuntimeError, np.linalg.LinAlgError):
+                    # e.g. singular iteration matrix of an implicit method, the cycle is integrated from its start
+                    # with `solve_ivp` and the integrator is created again at the start of the next cycle
+                    self.discard_integrator()
+                    return self.integrate_cycle(y0=y0, t=t)
+                self._integrator_dense = integrator.dense_output()
+
+        y = y[self.inv_perm]
+        self._integrator_cycle = end_cycle
+        self._integrator_y     = y[:, -1].copy()
+        self.collect_counts(integrator)
+        return y
+
+
+    def discard_integrator(self) -> None:
+        """ Discards the persistent integrator of the continuous integration, keeping count of its evaluations."""
+        if self._integrator is not None:
+            self.collect_counts(self._integrator)
+        self._integrator = None
+
+
+    def collect_counts(self, integrator) -> None:
+        """ Adds the evaluations of the persistent `integrator` since the last call to the statistics."""
+        counts = {key: getattr(integrator, key) for key in ['nfev', 'njev', 'nlu']}
+        self._stats.add(**{key: counts[key] - integrator.counted[key] for key in counts})
+        integrator.counted = counts
+
+
+    def gen_instrumented_method(self, base):
+        """
+        Generates a subclass of the `solve_ivp` integrator class `base`, counting the steps of the integrator in the
+        statistics of the solver and checking the compute budgets after every step (see `check_budgets`). A step
+        shorter than the step size the integrator started from (and than the bounds) needed a rejection.
+        """
+        solver = self
+
+        class InstrumentedMethod(base):
+            # evaluations already added to the statistics (see `collect_counts`)
+            counted = {'nfev': 0, 'njev': 0, 'nlu': 0}
+
+            def step(self):
+                t_old, h_abs = self.t, getattr(self, 'h_abs', None)
+                message = super().step()
+                if self.status == 'failed':
+                    return message
+                rejected = 0
+                if h_abs is not None:
+                    h_max = min(h_abs, self.max_step, abs(self.t_bound - t_old))
+                    rejected = int(abs(self.t - t_old) < (1.0 - 1.0e-10) * h_max)
+                solver._stats.add(n_steps=1, n_rejected=rejected)
+                # the last step of an integration is shortened to end at the bound
+                solver.check_budgets(nfev=self.nfev - self.counted['nfev'],
+                                     step_size=self.step_size if self.status == 'running' else None)
+                return message
+
+        return InstrumentedMethod
+
+
+    def check_budgets(self, nfev:int=0, step_size:float=None) -> None:
+        """
+        Raises `SolverAbort` when the wall clock time of `solve`, the number of evaluations of the derivatives
+        (`nfev` of the running integration on top of the finished ones) or the size of the last step of the
+        integrator exceed the budgets set in `setup`.
+        """
+        if self._max_wall_time is not None:
+            elapsed = time.perf_counter() - self._solve_start
+            if elapsed > self._max_wall_time:
+                raise SolverAbort({'reason': 'wall_time', 'value': elapsed, 'limit': self._max_wall_time})
+        if self._max_nfev is not None and self._stats.total('nfev') + nfev > self._max_nfev:
+            raise SolverAbort({'reason': 'nfev', 'value': self._stats.total('nfev') + nfev, 'limit': self._max_nfev})
+        if self._min_step is not None and step_size is not None and step_size < self._min_step:
+            raise SolverAbort({'reason': 'min_step', 'value': step_size, 'limit': self._min_step})
 
-        if res.status == -1:
-            return False
 
-        # updates the primary state variables
-        y = res.y
-        y = self.perm_mat.T @ y
+    def check_divergence(self) -> None:
+        """
+        Raises `SolverAbort` when the convergence error of the cycles is not finite or has grown over the last
+        `divergence_window` cycles.
+        """
+        if self._divergence_window is None or len(self._residuals) == 0:
+            return
+        if not np.isfinite(self._residuals[-1]):
+            raise SolverAbort({'reason': 'diverging', 'value': self._residuals[-1], 'limit': np.inf})
+        last = self._residuals[-self._divergence_window-1:]
+        if len(last) == self._divergence_window + 1 and np.all(np.diff(last) > 0.0):
+            raise SolverAbort({'reason': 'diverging', 'value': last[-1], 'limit': last[0]})
 
-        # updates the state variables in the DataFrame
-        ids = list(self._global_psv_update_fun.keys())
-        inds= list(range(len(ids)))
-        self._asd.iloc[cycleID*n_t:(end_cycle)*n_t+1, ids] = y[inds, 0:n_t*step+1].T
 
-        if cycleID == 0: return False
+    def compute_secondary_sv(self, values:np.ndarray[float], block_size:int=256) -> np.ndarray[float]:
+        """
+        Computes the secondary state variables over a whole time series of state vectors (one per row of `values`),
+        every secondary function is evaluated once (in dependency order) for all the time points. When `optimize_secondary_sv` is on,
+        the secondary variables are then optimized in blocks of `block_size` time points.
 
-        cycleP = end_cycle - 1
+        Returns the values of the secondary state variables, one row per time point.
+        """
+        keys4 = np.array(list(self._global_ssv_update_fun.keys()))
+        y = np.array(np.transpose(values), dtype=np.float64, order='C')
+        self.s_u_sweep(0.0, y)
+        if self._optimize_secondary_sv:
+            for i in range(0, y.shape[1], block_size):
+                block = y[:, i:i+block_size].copy()
+                y[keys4, i:i+block_size] = self.optimize_block(block, keys4)
+        return y[keys4].T
+
+
+    def generate_cycle_start_function(self) -> None:
+        """
+        Generates `self.cycle_start`, the function computing the primary state variables at the start of a cycle
+        from the start `x` and the end `g` of the previous cycle, following `steady_state`.
+
+        With 'anderson' the start of a cycle is found by Anderson acceleration (type II) of the shooting problem
+        g(x) - x = 0, the new start is the combination of the last cycle ends which minimizes the residual of the
+        linearized problem. With 'aitken' the start is extrapolated from the ends of three consecutive cycles
+        (Aitken delta squared), when their residuals are aligned, i.e. the approach to the limit cycle is dominated
+        by a single geometric mode. The number of cycles saved by the extrapolations is estimated from the rate of the
+        geometric approach and stored in `cycles_saved`.
+
+        Primary variables defined by initialization functions (e.g. the pressure of a chamber which is also defined
+        by its volume) are recomputed from the combined state, so that the start stays on the manifold of the
+        consistent states, which the cycles preserve but the combinations do not.
+        """
+        keys3 = np.array(list(self._global_psv_update_fun.keys()))
+        keys1 = np.array(list(self._global_sv_init_fun.keys()), dtype=np.int64)
+        depth = self._anderson_depth
+        y_temp = self._asd_values[0].copy()
+        initialize_by_function = self.initialize_by_function
+
+        # history of the starts and ends of the cycles
+        X, G = [], []
+        # rate and residual of the last Aitken extrapolation, used to estimate the number of cycles saved
+        extrapolation = []
+        self._n_extrapolations = 0
+        self._cycles_saved     = 0.0
+
+        def project(y:np.ndarray[float]) -> np.ndarray[float]:
+            """ Recomputes the primary state variables defined by initialization functions."""
+            y_temp[keys3] = y
+            if len(keys1) > 0:
+                y_temp[keys1] = initialize_by_function(y=y_temp)
+            return y_temp[keys3].copy()
+
+        def anderson_start(x:np.ndarray[float], g:np.ndarray[float], scale:np.ndarray[float]) -> np.ndarray[float]:
+            # restarts the acceleration when the residual grows
+            if len(X) > 0 and np.max(np.abs(g - x) / scale) > np.max(np.abs(G[-1] - X[-1]) / scale):
+                X.clear()
+                G.clear()
+            X.append(np.array(x, dtype=np.float64))
+            G.append(np.array(g, dtype=np.float64))
+            del X[:-depth-1], G[:-depth-1]
+            if len(X) == 1:
+                return g
+
+            F  = (np.stack(G) - np.stack(X)) / scale
+            dF = np.diff(F, axis=0)
+            gamma = np.linalg.lstsq(dF.T, F[-1], rcond=None)[0]
+            y = project(g - np.diff(np.stack(G), axis=0).T @ gamma)
+            if not np.all(np.isfinite(y)):
+                X.clear()
+                G.clear()
+                return g
+            return y
+
+        def aitken_start(x:np.ndarray[float], g:np.ndarray[float], scale:np.ndarray[float],
+                         extrapolate:bool) -> np.ndarray[float]:
+            residual = np.max(np.abs(g - x) / scale)
+            if len(extrapolation) > 0:
+                # plain cycles would have reduced the residual by a factor rate per cycle
+                rate, residual_0 = extrapolation.pop()
+                if residual > 0.0:
+                    self._cycles_saved += max(0.0, np.log(residual / residual_0) / np.log(rate) - 1.0)
+            X.append(np.array(x, dtype=np.float64))
+            G.append(np.array(g, dtype=np.float64))
+            del X[:-2], G[:-2]
+            if len(X) < 2 or not extrapolate:
+                return g
+
+            d1 = (G[0] - X[0]) / scale
+            d2 = (G[1] - X[1]) / scale
+            rate = np.dot(d2, d1) / np.dot(d1, d1)
+            # the extrapolation is only valid when the residuals are aligned, i.e. a single slow mode is left
+            aligned = np.dot(d2, d1) > 0.99 * np.linalg.norm(d1) * np.linalg.norm(d2)
+            if not (0.0 < rate < 1.0 and aligned):
+                del X[0], G[0]
+                return g
+            y = project(g + rate / (1.0 - rate) * (G[1] - X[1]))
+            X.clear()
+            G.clear()
+            if not np.all(np.isfinite(y)):
+                return g
+            extrapolation.append((rate, residual))
+            self._n_extrapolations += 1
+            return y
+
+        def cycle_start(x:np.ndarray[float], g:np.ndarray[float], scale:np.ndarray[float],
+                        extrapolate:bool=True) -> np.ndarray[float]:
+            """
+            Returns the start of the next cycle, `scale` is the magnitude of every primary variable over the
+            previous cycle, used to weight the residuals. After the last cycle `extrapolate` is False, the
+            statistics are updated but the end of the cycle is returned.
+            """
+            if self._steady_state is None:
+                return g
+            scale = np.maximum(scale, 1e-10)
+            if self._steady_state == 'aitken':
+                return aitken_start(x, g, scale, extrapolate)
+            return anderson_start(x, g, scale) if extrapolate else g
 
-        cs   = self._asd[self._cols].iloc[cycleP*n_t:end_cycle*n_t, :].values
-        cp   = self._asd[self._cols].iloc[(cycleP-1) *n_t:(cycleP)*n_t, :].values
+        self.cycle_start = cycle_start
 
+
+    @staticmethod
+    def cycle_error(cs:np.ndarray[float], cp:np.ndarray[float]) -> np.ndarray[float]:
+        """
+        Relative difference between two consecutive cycles (one column per state variable), the absolute
+        difference is used for the variables which are (almost) zero during the previous cycle.
+        """
         cp_ptp = np.max(np.abs(cp), axis=0)
         cp_r   = np.max(np.abs(cs - cp), axis=0)
 
         test = cp_r / cp_ptp
         test[cp_ptp <= 1e-10] = cp_r[cp_ptp <= 1e-10]
-        if np.max(test) > self._step_tol : return False
-        return True
+        return test
 
 
     def solve(self):
 
         # initialize the solution fields
-        self._asd.loc[0, self._initialize_by_function.index] = \
-            self.initialize_by_function(y=self._asd.loc[0].to_numpy()).T
+        self._asd_values[0, list(self._global_sv_init_fun.keys())] = \
+            self.initialize_by_function(y=self._asd_values[0])
+
+        self.generate_cycle_start_function()
+        self._integrator = None
+        self._event_log  = []
+        self._abort_reason = None
+        self._residuals    = []
+        self._row0         = 0
+        self._solve_start  = time.perf_counter()
+        self._ssv_guess['z'] = None
+        for record in self._profile_records.values():
+            record[:] = [0, 0.0]
+        if self._method in FIXED_STEP_METHODS:
+            unavailable = ['nfev', 'njev', 'nlu', 'n_rejected']
+        elif self._method == 'LSODA':
+            unavailable = ['n_rejected']
+        else:
+            unavailable = []
+        self._stats = SolverStats(cols=self._cols, unavailable=unavailable)
+        keys3 = list(self._global_psv_update_fun.keys())
+        n_t   = self._to.n_c - 1
 
         # Solve the main system of ODEs..
 
+        y0 = self._asd_values[0, keys3]
         for i in range(0, self._to.ncycles, self.step): # step is a pulse, we might wabnt to do it in all pulses
             # print(i)
-            y0 = self._asd.iloc[i * (self._to.n_c-1), list(self._global_psv_update_fun.keys())].to_list()
+            self._stats.start_cycle(i)
             try:
                 # advances the cycle one step at the time, and only that step,
                 #changes are to select a range of cycles up to to ith, + dept of cycle instead of selecting that index.
                 flag = self.advance_cycle(y0=y0, cycleID=i, step=self.step)
-            except ValueError:
+                self._stats.end_cycle(residuals=self._cycle_residuals)
+                self.check_budgets()
+                self.check_divergence()
+            except ValueError as e:
+                self._stats.end_cycle()
                 self._Nconv = i-1
                 self.converged = False
+                self._abort_reason = {'reason': 'error', 'message': str(e), 'cycle': i}
                 break
+            except SolverAbort as e:
+                # the stored cycles are the ones completed before the abort
+                self._stats.end_cycle()
+                self._Nconv = i-1
+                self.converged = False
+                self._abort_reason = dict(e.reason, cycle=i)
+                break
+            # computes the start of the next cycle from the start and the end of the current one
+            end  = min(i + self.step, self._to.ncycles)
+            last = (flag and i > self._to.export_min) or i + self.step - 1 == self._to.ncycles - 1
+            row0 = self._row0
+            y0 = self.cycle_start(x=y0, g=self._asd_values[end*n_t-row0, keys3],
+                                  scale=np.max(np.abs(self._asd_values[i*n_t-row0:end*n_t+1-row0, keys3]), axis=0),
+                                  extrapolate=not last)
             if flag and i > self._to.export_min:
                 self._Nconv = i + self.step - 1
                 self.converged = True
@@ -475,26 +1596,76 @@ class Solver():
                 self._Nconv = i + self.step - 1
                 self.converged = False
 
-        self._to.n_t = (self.Nconv+1)*(self._to.n_c-1) + 1
-
-        self._asd = self._asd.iloc[:self._to.n_t]
-        self._to._sym_t   = self._to._sym_t.head(self._to.n_t)
-        self._to._cycle_t = self._to._cycle_t.head(self._to.n_t)
+        # keeps the stored cycles up to the last one, all of them or the ones of the rolling window
+        self._asd_values = self._asd_values[:(self.Nconv+1)*(self._to.n_c-1) + 1 - self._row0]
+        self._asd_frame  = None
+        self._to.store_cycles(self._row0 // (self._to.n_c-1), self.Nconv+1)
 
 
+        start = time.perf_counter()
         keys4  = np.array(list(self._global_ssv_update_fun.keys()))
-        temp   = np.zeros(self._asd.iloc[:,keys4].shape)
-        for i, line in enumerate(self._asd.values) :
-            line[keys4] = self.s_u_update(0.0, line)
-            if self._optimize_secondary_sv:
-                temp[i,:] = self.optimize(line, keys4)
-            else:
-                temp[i,:] = line[keys4]
-        self._asd.iloc[:,keys4] = temp
+        if len(keys4) > 0:
+            self._asd_values[:,keys4] = self.compute_secondary_sv(self._asd_values)
+        self._stats.secondary_time = time.perf_counter() - start
 
+        start = time.perf_counter()
         for key in self._vd.keys():
             self._vd[key]._u = self._asd[key]
 
+        if self._events:
+            # keeps the crossings of the stored cycles and passes them to the switched state variables
+            t_start, t_end = self._to._sym_t.values[0], self._to._sym_t.values[-1]
+            self._event_log = [event for event in self._event_log if t_start <= event[0] <= t_end]
+            events = self.events
+            for key in self._global_switch_ker.keys():
+                name = self._global_sv_id_rev[key]
+                self._vd[name]._events = events.loc[events['variable'] == name,
+                                                    ['t', 'switch', 'direction']].reset_index(drop=True)
+        self._stats.output_time = time.perf_counter() - start
+        self._stats.finish()
+
+
+    @property
+    def _asd(self) -> DataFrame:
+        """DataFrame containing all state variable data, built from `_asd_values` when first accessed."""
+        if self._asd_frame is None:
+            self._asd_frame = pd.DataFrame(self._asd_values, columns=self._asd_columns, copy=False)
+        return self._asd_frame
+
+
+    @property
+    def stats(self) -> SolverStats:
+        """ Statistics of the last solve, see `SolverStats`."""
+        return self._stats
+
+
+    @property
+    def abort_reason(self) -> dict:
+        """
+        Reason of the early abort of `solve`, None if the solver was not aborted. Otherwise a dictionary with the
+        exceeded budget 'reason' ('wall_time', 'nfev', 'min_step', 'diverging' or 'error' for a failure of the
+        integrator), the measured 'value' and its 'limit', and the 'cycle' during which the solver was aborted.
+        """
+        return self._abort_reason
+
+
+    @property
+    def events(self) -> DataFrame:
+        """
+        Zero crossings of the switching functions located during the integration (see `setup`), one row per
+        crossing with the time 't', the name of the switched state variable, the index of its switching function
+        and the direction of the crossing (+1 when the switching function becomes positive, e.g. a valve opening).
+        """
+        return pd.DataFrame(self._event_log, columns=['t', 'variable', 'switch', 'direction'])
+
+
+    @property
+    def perm_mat(self) -> np.ndarray[float]:
+        """Dense permutation matrix equivalent to `self.perm`, i.e. perm_mat @ y == y[perm]."""
+        perm_mat = np.zeros((len(self.perm), len(self.perm)))
+        perm_mat[np.arange(len(self.perm)), self.perm] = 1.0
+        return perm_mat
+
 
     @property
     def vd(self) -> Series[StateVariable]:
@@ -511,6 +1682,18 @@ class Solver():
         return self._Nconv
 
 
+    @property
+    def n_extrapolations(self) -> int:
+        """Number of cycle starts extrapolated by the last call to `solve` (`steady_state='aitken'`)."""
+        return self._n_extrapolations
+
+
+    @property
+    def cycles_saved(self) -> float:
+        """Estimated number of cycles saved by the extrapolations of the last call to `solve`."""
+        return self._cycles_saved
+
+
     @property
     def optimize_secondary_sv(self)->bool:
         return self._optimize_secondary_sv
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import time
+
+# counters of the integrators recorded for every cycle
+COUNTERS = ['nfev', 'njev', 'nlu', 'n_steps', 'n_rejected']
+
+
+class SolverStats():
+    """
+    Statistics of a `Solver.solve` run, filled during the solve.
+
+    Every cycle (or group of `step` cycles) has one record with its wall clock time, the evaluations of the
+    derivatives ('nfev') and of the Jacobian ('njev'), the LU decompositions ('nlu'), the accepted steps of the
+    integrator ('n_steps'), the steps which needed at least one rejection ('n_rejected') and the convergence errors
+    of the variables used in the convergence test. The counters an integrator does not report (e.g. the rejected
+    steps of LSODA, the evaluations of the fixed step methods) are NaN. The time spent computing the secondary
+    state variables and building the outputs once the cycles are integrated is stored separately.
+    """
+    def __init__(self, cols:list=None, unavailable:list=None) -> None:
+        """
+        ## Inputs
+        cols : list
+            names of the variables used in the convergence test.
+        unavailable : list
+            counters not reported by the integrator.
+        """
+        self._cols        = list(cols) if cols is not None else []
+        self._unavailable = list(unavailable) if unavailable is not None else []
+        self._records     = []
+        self._residuals   = []
+        self._current     = None
+        self._start       = time.perf_counter()
+        self._totals      = {key: 0 for key in COUNTERS}
+
+        self.secondary_time = 0.0
+        self.output_time    = 0.0
+        self.total_time     = 0.0
+
+    def start_cycle(self, cycleID:int) -> None:
+        self._current = {'cycle': cycleID, 'wall_time': time.perf_counter()}
+        self._current.update({key: 0 for key in COUNTERS})
+
+    def add(self, **counts) -> None:
+        """ Adds counts (e.g. `nfev=10`) to the record of the current cycle."""
+        for key, value in counts.items():
+            if self._current is not None:
+                self._current[key] += value
+            self._totals[key] += value
+
+    def end_cycle(self, residuals:np.ndarray[float]=None) -> None:
+        """ Closes the record of the current cycle, `residuals` are the convergence errors of the variables."""
+        if self._current is None:
+            return
+        self._current['wall_time'] = time.perf_counter() - self._current['wall_time']
+        self._records.append(self._current)
+        self._residuals.append(np.full(len(self._cols), np.nan) if residuals is None else np.asarray(residuals))
+        self._current = None
+
+    def finish(self) -> None:
+        self.total_time = time.perf_counter() - self._start
+
+    def total(self, key:str) -> int:
+        """ Total of a counter over the cycles, including the one being integrated."""
+        return self._totals[key]
+
+    @property
+    def cycles(self) -> pd.DataFrame:
+        """ One row per cycle, the convergence errors are in the columns named after the variables."""
+        records = pd.DataFrame(self._records, columns=['cycle', 'wall_time'] + COUNTERS)
+        records[self._unavailable] = np.nan
+        residuals = pd.DataFrame(np.reshape(self._residuals, (len(self._residuals), len(self._cols))),
+                                 columns=self._cols)
+        return pd.concat([records, residuals], axis=1)
+
+    @property
+    def totals(self) -> dict:
+        """ Totals of the run: counters, number of cycles and times."""
+        totals = {key: (np.nan if key in self._unavailable else self._totals[key]) for key in COUNTERS}
+        totals.update({'n_cycles'      : len(self._records),
+                       'cycles_time'   : float(np.sum([record['wall_time'] for record in self._records])),
+                       'secondary_time': self.secondary_time,
+                       'output_time'   : self.output_time,
+                       'total_time'    : self.total_time})
+        return totals
+
+    @staticmethod
+    def aggregate(stats:dict) -> pd.DataFrame:
+        """ Totals of several runs (e.g. the cases of a batch), one row per key of the dictionary `stats`."""
+        return pd.DataFrame.from_dict({key: value.totals for key, value in stats.items() if value is not None},
+                                      orient='index')
+
+    def __repr__(self) -> str:
+        totals = self.totals
+        return (f"SolverStats: {totals['n_cycles']} cycles in {totals['total_time']:.3f} s \n" +
+                f" - cycles: {totals['cycles_time']:.3f} s, nfev: {totals['nfev']}, njev: {totals['njev']}, " +
+                f"nlu: {totals['nlu']}, steps: {totals['n_steps']} ({totals['n_rejected']} with rejections) \n" +
+                f" - secondary variables: {totals['secondary_time']:.3f} s, outputs: {totals['output_time']:.3f} s")
@@ -18,19 +18,41 @@ class StateVariable():
             'u_name'    : None, # str
             'i_func'    : None, # initialization function
             'i_inputs'  : None, # initialization function inputs
+            'dudt_kernel' : None, # (kernel, parameters) pair used by the compiled solver
+            'u_kernel'    : None, # (kernel, parameters) pair used by the compiled solver
+            'i_kernel'    : None, # (kernel, parameters) pair used by the compiled solver
+            'dudt_jac'    : None, # partial derivatives of the kernel with respect to the inputs
+            'u_jac'       : None, # partial derivatives of the kernel with respect to the inputs
+            'switch_kernels' : [], # (kernel, parameters) pairs of the switching functions, see `add_switch_func`
         })
+        # times of the zero crossings of the switching functions, filled by the solver (see `Solver.setup`)
+        self._events = None
 
     def __repr__(self) -> str:
         return f" > variable name: {self._name}"
 
-    def set_dudt_func(self, function, function_name:str)->None:
+    def set_dudt_func(self, function, function_name:str, kernel=None, parameters:dict=None, jac=None)->None:
         self._ode_sys_mapping['dudt_func'] = function
         self._ode_sys_mapping['dudt_name'] = function_name
+        self._ode_sys_mapping['dudt_kernel'] = (kernel, parameters) if kernel is not None else None
+        self._ode_sys_mapping['dudt_jac']    = jac
         return
 
-    def set_u_func(self, function, function_name:str)->None:
+    def set_u_func(self, function, function_name:str, kernel=None, parameters:dict=None, jac=None)->None:
         self._ode_sys_mapping['u_func'] = function
         self._ode_sys_mapping['u_name'] = function_name
+        self._ode_sys_mapping['u_kernel'] = (kernel, parameters) if kernel is not None else None
+        self._ode_sys_mapping['u_jac']    = jac
+        return
+
+    def add_switch_func(self, kernel, parameters:dict=None)->None:
+        """
+        Adds a switching function, called with the same inputs as the update function of the variable, whose zero
+        crossings are the points where the update function switches branch (e.g. a valve opening or closing).
+        """
+        spec = (kernel, parameters if parameters is not None else {})
+        if spec not in self._ode_sys_mapping['switch_kernels']:
+            self._ode_sys_mapping['switch_kernels'] = self._ode_sys_mapping['switch_kernels'] + [spec,]
         return
 
     def set_inputs(self, inputs:Series[str]):
@@ -41,9 +63,10 @@ class StateVariable():
         self._name = name
         return
 
-    def set_i_func(self, function, function_name:str)->None:
+    def set_i_func(self, function, function_name:str, kernel=None, parameters:dict=None)->None:
         self._ode_sys_mapping['i_func'] = function
         self._ode_sys_mapping['i_name'] = function_name
+        self._ode_sys_mapping['i_kernel'] = (kernel, parameters) if kernel is not None else None
 
     def set_i_inputs(self, inputs:Series[str])->None:
         self._ode_sys_mapping['i_inputs'] = inputs
@@ -88,6 +111,34 @@ class StateVariable():
     def i_inputs(self):
         return self._ode_sys_mapping['i_inputs']
 
+    @property
+    def dudt_kernel(self):
+        return self._ode_sys_mapping['dudt_kernel']
+
+    @property
+    def u_kernel(self):
+        return self._ode_sys_mapping['u_kernel']
+
+    @property
+    def i_kernel(self):
+        return self._ode_sys_mapping['i_kernel']
+
+    @property
+    def dudt_jac(self):
+        return self._ode_sys_mapping['dudt_jac']
+
+    @property
+    def u_jac(self):
+        return self._ode_sys_mapping['u_jac']
+
+    @property
+    def switch_kernels(self):
+        return self._ode_sys_mapping['switch_kernels']
+
+    @property
+    def events(self):
+        return self._events
+
     def __del__(self):
         if hasattr(self, '_name'):
             del self._name
@@ -97,6 +148,8 @@ class StateVariable():
             del self._u
         if hasattr(self, '_cv'):
             del self._cv
+        if hasattr(self, '_events'):
+            del self._events
         if hasattr(self, '_ode_sys_mapping'):
             # print(self._ode_sys_mapping)
             for item in self._ode_sys_mapping.values:
@@ -43,6 +43,59 @@ class TimeClass():
         else:
             return None
 
+    @property
+    def window(self):
+        """
+        Number of cycles stored by the model and the solver, the solver keeps a rolling window of the last `window`
+        cycles instead of all the `ncycles` cycles. None (default) stores all the cycles.
+        """
+        if 'window' in self._time_setup_dict.keys():
+            return self._time_setup_dict['window']
+        else:
+            return None
+
+    @property
+    def t_end(self):
+        """ Time of the end of the last cycle of the simulation."""
+        return self._one_cycle_t.values[-1] + (self.ncycles - 1) * self.tcycle
+
+    def cycle_times(self, first:int, last:int) -> np.ndarray:
+        """
+        Returns the time points of the cycles `first`, ..., `last - 1` (including the end of the last one), the same
+        values as the corresponding entries of `_sym_t` when all the cycles are stored.
+        """
+        last = min(last, self.ncycles)
+        return np.concatenate([self._one_cycle_t.values[:-1] + cycle * self.tcycle for cycle in range(first, last)]
+                              + [[self._one_cycle_t.values[-1] + (last - 1) * self.tcycle]])
+
+    @staticmethod
+    def check_window(time_setup_dict:dict) -> None:
+        """
+        Raises an exception if the rolling window of the time setup holds less than max(2, export_min) cycles, the
+        cycles compared by the convergence checks.
+        """
+        window, export_min = time_setup_dict.get('window', None), time_setup_dict.get('export_min', 1)
+        if window is not None and window < max(2, export_min):
+            raise Exception(f"The window needs at least max(2, export_min) = {max(2, export_min)} cycles.")
+
+    def store_cycles(self, first:int, last:int) -> None:
+        """ Sets the stored time arrays to the cycles `first`, ..., `last - 1`, see `cycle_times`."""
+        self._sym_t   = pd.Series(self.cycle_times(first, last))
+        self._cycle_t = pd.Series(np.concatenate([np.tile(self._one_cycle_t.values[:-1], last - first),
+                                                  self._one_cycle_t.values[-1:]]))
+        self.time = pd.DataFrame({'cycle_t' : self._cycle_t, 'sym_t' : self._sym_t})
+        self.n_t = len(self._sym_t)
+
+    def set_tcycle(self, tcycle:float, dt:float=None) -> None:
+        """
+        Changes the duration of the heart cycle and the time step, by default the time step is scaled with the
+        duration of the cycle. The stored time arrays are reset to the first cycles.
+        """
+        if dt is None:
+            dt = self.dt * tcycle / self.tcycle
+        self._time_setup_dict = dict(self._time_setup_dict, tcycle=tcycle, dt=dt)
+        self._initialize_time_array()
+
     def _initialize_time_array(self):
         # discretization of on heart beat, used as template
         self._one_cycle_t = pd.Series(np.linspace(
@@ -52,14 +105,21 @@ class TimeClass():
             dtype= np.float64
             ))
 
-        # discretization of the entire simulation duration
+        # number of stored cycles, all of them unless a rolling window is used
+        TimeClass.check_window(self._time_setup_dict)
+        if self.window is None:
+            n_stored = self.ncycles
+        else:
+            n_stored = min(self.window, self.ncycles)
+
+        # discretization of the stored cycles, the entire simulation duration without a rolling window
         self._sym_t = pd.Series(
-            [t+cycle*self.tcycle for cycle in range(self.ncycles) for t in self._one_cycle_t[:-1]] + [self._one_cycle_t.values[-1]+(self.ncycles-1)*self.tcycle,]
+            [t+cycle*self.tcycle for cycle in range(n_stored) for t in self._one_cycle_t[:-1]] + [self._one_cycle_t.values[-1]+(n_stored-1)*self.tcycle,]
         )
 
         # array of the current time within the heart cycle
         self._cycle_t = pd.Series(
-            [t for _ in range(self.ncycles) for t in self._one_cycle_t[:-1]] + [self._one_cycle_t.values[-1],]
+            [t for _ in range(n_stored) for t in self._one_cycle_t[:-1]] + [self._one_cycle_t.values[-1],]
         )
 
         self.time = pd.DataFrame({'cycle_t' : self._cycle_t, 'sym_t' : self._sym_t})
@@ -2,14 +2,22 @@ import numpy as np
 import pandas as pd
 import json
 import joblib
+import copy
 import os
+import tempfile
 
+from joblib.externals.loky import get_reusable_executor
 from tqdm import tqdm
 from scipy.stats.qmc import (LatinHypercube, Sobol, Halton, QMCEngine, scale)
+from scipy.spatial import cKDTree
 
 from .Models.OdeModel import OdeModel
 from .Models.ParametersObject import ParametersObject
 from .Solver import Solver
+from .SolverStats import SolverStats
+from .BatchStore import BatchStore, BatchManifest, FAILED
+from .EnsembleSolver import EnsembleSolver
+from .Compiler import CompiledModel
 
 DEFAULT_RANDOM_SEED = 42
 
@@ -19,10 +27,67 @@ sampler_dictionary = {
     'Halton': Halton,
 }
 
+# compiled solver of a worker process of the parallel batches reusing a solver, built once per worker by
+# `_init_worker` and reused by all the chunks of samples the worker solves (see `_BatchRunner.run_batch`)
+_WORKER = dict()
+
+
+def _init_worker(runner, row, kwargs) -> None:
+    _WORKER['solver']   = runner._reused_solver(row, **kwargs)
+    _WORKER['out_cols'] = kwargs.get('out_cols', None)
+
+
+def _solve_chunk(P:np.ndarray[float], y0:np.ndarray[float], dt:np.ndarray[float], labels=None,
+                 store_path:str=None):
+    """
+    Solves a chunk of samples (one per row of `P` and `y0`, see `Solver.set_parameters`) with the solver of the
+    worker. Returns the outputs of the last cycle of every sample in an array (time points, outputs and time), NaN
+    for the samples which did not converge, the names of the outputs, the converged flags and the statistics of
+    the solves.
+
+    With a `store_path`, the outputs are written to the slots of the samples `labels` of the store in that
+    directory instead, and flushed to the disk before returning, and None is returned in place of the outputs. The
+    store is mapped for every chunk, the workers outlive the batches and their stores.
+    """
+    solver   = _WORKER['solver']
+    out_cols = _WORKER['out_cols']
+    store    = BatchStore(store_path, mode='r+') if store_path is not None else None
+    values, converged, stats = [], [], []
+    for k in range(len(P)):
+        solver.set_parameters(P[k], y0=y0[k], dt=dt[k])
+        solver.solve()
+        n_c = solver._to.n_c
+        columns = list(solver._asd_columns) if out_cols is None else list(out_cols)
+        case = np.full((n_c, len(columns) + 1), np.nan)
+        if solver.converged:
+            case[:, :-1] = solver._asd[columns].tail(n_c).to_numpy()
+            case[:, -1]  = solver._to._sym_t.values[-n_c:]
+        converged.append(bool(solver.converged))
+        stats.append(solver.stats)
+        if store is None:
+            values.append(case)
+        else:
+            store.write(labels[k], case if solver.converged else False)
+    if store is not None:
+        store.flush()
+        return None, columns, converged, stats
+    return values, columns, converged, stats
+
+
 class _BatchRunner:
     def __init__(self, sampler:str='LHS', seed=DEFAULT_RANDOM_SEED) -> None:
         self._sample_generator = sampler_dictionary[sampler]
         self._seed      = seed
+        # statistics of the solves of the last batch, one entry per sample (see `SolverStats`)
+        self._case_stats = dict()
+        # compiled solver reused by the samples and the entries of its parameter vector and initial values set by
+        # every sampled parameter (see `setup_parameter_map`)
+        self._solver        = None
+        self._parameter_map = None
+        # options and initializer arguments of the worker processes of the parallel batches reusing a solver, kept
+        # while the options do not change so that the workers are reused (see `_worker_executor`)
+        self._worker_key      = None
+        self._worker_initargs = None
         return
 
     def setup_sampler(self, template_json):
@@ -61,6 +126,10 @@ class _BatchRunner:
         self._samples  = pd.DataFrame(samples_scaled, columns=list(self._parameters_2_sample.keys()))
         for key, val in self._parameters_constant.items():
             self._samples[key] = val
+        # samples in the unit hypercube and mappings applied to them, replayed on the samples added by
+        # `run_adaptive`
+        self._unit_samples = samples
+        self._mappings     = []
         return
 
     @property
@@ -74,6 +143,7 @@ class _BatchRunner:
                 self._samples[key2] = self._samples[key] * self._samples['T'] / ref_time
             if key not in mappings: self._samples.drop(key, inplace=True, axis=1)
         self._ref_time = ref_time
+        self._record_mapping('map_sample_timings', map=map, ref_time=ref_time)
         return
 
     def map_vessel_volume(self):
@@ -86,8 +156,34 @@ class _BatchRunner:
         for vessel in vessels:
             self._samples[vessel + '.v'] = self._samples['v_tot'] * self._samples[vessel + '.c'] / tot_vessels_c
         self._samples.drop('v_tot', axis=1, inplace=True)
+        self._record_mapping('map_vessel_volume')
         return
 
+    def _record_mapping(self, name:str, **kwargs) -> None:
+        if hasattr(self, '_mappings'):
+            self._mappings.append((name, kwargs))
+
+    def _new_samples(self, unit_samples:np.ndarray[float]) -> pd.DataFrame:
+        """
+        Samples of the points `unit_samples` of the unit hypercube, scaled as in `sample` and mapped as the samples
+        of the batch, indexed after the samples of the batch.
+        """
+        index = pd.RangeIndex(len(self._samples), len(self._samples) + len(unit_samples))
+        samples_scaled = scale(sample=unit_samples, l_bounds=self._l_bounds, u_bounds=self._u_bounds)
+        samples = pd.DataFrame(samples_scaled, columns=list(self._parameters_2_sample.keys()), index=index)
+        for key, val in self._parameters_constant.items():
+            samples[key] = val
+
+        batch, mappings = self._samples, self._mappings
+        self._samples, self._mappings = samples, []
+        try:
+            for name, kwargs in mappings:
+                getattr(self, name)(**kwargs)
+            samples = self._samples
+        finally:
+            self._samples, self._mappings = batch, mappings
+        return samples[batch.columns]
+
 
     def setup_model(self, model:OdeModel, po:ParametersObject, time_setup:dict):
         self._model_generator = model
@@ -96,17 +192,364 @@ class _BatchRunner:
         return
 
 
-    def run_batch(self, n_jobs=1, **kwargs):
+    def run_batch(self, n_jobs=1, reuse_solver:bool=False, store_path:str=None, chunk_size:int=None,
+                  resume:bool=False, shared_buffer:bool=False, **kwargs):
+        """
+        Solves all the samples, the keyword arguments are passed to `Solver.setup` (budgets, method, ...). With
+        `reuse_solver` all the samples are solved with a single compiled solver whose parameters are set for every
+        sample, see `setup_parameter_map`, instead of building a model and a solver per sample. The parallel runs
+        (`n_jobs > 1`) then build the solver once per worker process and send the parameter vectors of the samples
+        to the workers in chunks of `chunk_size` samples (by default 4 chunks per worker), see `_solve_chunk`.
+        The samples are solved one model at a time when the map can not be set up.
+
+        With a `store_path`, the outputs of every sample are written to a `BatchStore` in that directory as soon as
+        the sample is solved, instead of being collected in memory, and the store is returned. The directory also
+        holds the manifest of the run (see `BatchManifest`), with `resume` a run which was stopped is continued:
+        only the samples which did not converge or were not solved are scheduled.
+
+        With `shared_buffer`, the parallel runs reusing a solver do not send the outputs back from the workers: the
+        workers write them to the slots of the samples in the mapped block of the store, see `_solve_shared`. The
+        block is kept in a temporary directory when the batch has no `store_path`, and read back at the end.
+        """
+        self._case_stats = dict()
+        samples, manifest = self._batch_samples(store_path, resume)
+        if store_path is not None and len(samples) == 0:
+            return self._store_outputs(store_path, iter([]), manifest, resume)
         if n_jobs == 1:
-            success = self._samples.apply(lambda row : self._run_case(row, **kwargs), axis=1)
+            solve_case = self._solve_case
+            if reuse_solver and self.setup_parameter_map(**kwargs):
+                solve_case = self._solve_case_reused
+
+            def run(row):
+                output, self._case_stats[row.name] = solve_case(row, **kwargs)
+                return output
+            if store_path is not None:
+                return self._store_outputs(store_path, ((row.name, run(row)) for _, row in samples.iterrows()),
+                                           manifest, resume)
+            success = self._samples.apply(run, axis=1)
+        elif reuse_solver and self.setup_parameter_map(**kwargs):
+            if shared_buffer and store_path is not None:
+                return self._solve_shared(samples, n_jobs, chunk_size, store_path, manifest, resume, **kwargs)
+            if shared_buffer:
+                with tempfile.TemporaryDirectory() as path:
+                    store  = self._solve_shared(samples, n_jobs, chunk_size, path, **kwargs)
+                    cases  = [(row, store.case(row.name)) for _, row in samples.iterrows()]
+                    del store
+                return [False if case is None else self._case_output(row, case.drop('T', axis=1), case['T'].values)
+                        for row, case in cases]
+            outputs = self._solve_reused_parallel(samples, n_jobs, chunk_size, **kwargs)
+            if store_path is not None:
+                return self._store_outputs(store_path, outputs, manifest, resume)
+            return [output for _, output in outputs]
         else:
-            success = joblib.Parallel(n_jobs=n_jobs)(
-                                        joblib.delayed(self._run_case)(row, **kwargs)
-                                        for _, row in tqdm(self._samples.iterrows(), total=len(self._samples))
+            results = joblib.Parallel(n_jobs=n_jobs, return_as='list' if store_path is None else 'generator')(
+                                        joblib.delayed(self._solve_case)(row, **kwargs)
+                                        for _, row in tqdm(samples.iterrows(), total=len(samples))
                                      )
+            if store_path is not None:
+                def collect():
+                    for index, (output, stats) in zip(samples.index, results):
+                        self._case_stats[index] = stats
+                        yield index, output
+                return self._store_outputs(store_path, collect(), manifest, resume)
+            success = [output for output, _ in results]
+            self._case_stats = {index: stats for index, (_, stats) in zip(self._samples.index, results)}
         return success
 
-    def _run_case(self, row, **kwargs):
+    def _batch_samples(self, store_path:str=None, resume:bool=False):
+        """
+        Returns the samples to solve and the manifest of the run directory `store_path` (None without directory),
+        all the samples unless the run is resumed.
+        """
+        if store_path is None:
+            if resume:
+                raise Exception("Only the batches with a run directory (store_path) can be resumed.")
+            return self._samples, None
+        if not resume:
+            BatchStore.remove(store_path)
+        manifest = BatchManifest(store_path, self._samples, resume=resume)
+        return self._samples.loc[~self._samples.index.isin(manifest.completed)], manifest
+
+    def _reused_chunks(self, samples:pd.DataFrame, n_jobs:int, chunk_size:int=None, store_path:str=None, **kwargs):
+        """
+        Solves the samples in `n_jobs` worker processes, each one building the compiled solver once (see
+        `_init_worker`) and solving chunks of samples from their parameter vectors, initial values and time steps.
+        Yields the samples of every chunk and the results of `_solve_chunk`, in the order of the samples, as the
+        chunks are solved. With a `store_path`, the workers write the outputs to the store in that directory.
+        """
+        n = len(samples)
+        if chunk_size is None:
+            chunk_size = max(1, int(np.ceil(n / (4 * n_jobs))))
+        cases = [self._case_parameters(row) for _, row in samples.iterrows()]
+
+        executor = self._worker_executor(n_jobs, **kwargs)
+        starts   = range(0, n, chunk_size)
+        futures  = [executor.submit(_solve_chunk, *[np.stack(arrays) for arrays in zip(*cases[start:start+chunk_size])],
+                                    labels=None if store_path is None else list(samples.index[start:start+chunk_size]),
+                                    store_path=store_path)
+                    for start in starts]
+        for start, future in tqdm(zip(starts, futures), total=len(futures)):
+            yield samples.iloc[start:start+chunk_size], future.result()
+
+    def _worker_executor(self, n_jobs:int, **kwargs):
+        """
+        Executor of the `n_jobs` worker processes solving the chunks of samples, each one building the compiled
+        solver once (see `_init_worker`). The initializer arguments are kept as long as the model, the time setup
+        and the options of the solver do not change, the executor is then reused with its workers and their solvers
+        by the following batches (e.g. the rounds of `run_adaptive`), unless it was shut down in between.
+        """
+        key = (self._model_generator, self._po_generator, dict(self._tst), self._ref_time, dict(kwargs))
+        if self._worker_initargs is None or not self._worker_key == key:
+            # the workers only need the model generators and the time setup to build the solver
+            template = copy.copy(self)
+            template._solver, template._samples, template._case_stats = None, None, dict()
+            template._worker_key, template._worker_initargs = None, None
+            self._worker_key      = key
+            self._worker_initargs = (template, self._samples.iloc[0], dict(kwargs))
+        return get_reusable_executor(max_workers=n_jobs, initializer=_init_worker, initargs=self._worker_initargs)
+
+    def _solve_reused_parallel(self, samples:pd.DataFrame, n_jobs:int, chunk_size:int=None, **kwargs):
+        """
+        Solves the samples in chunks in worker processes (see `_reused_chunks`). Yields the (sample, output) pairs
+        in the order of the samples, as the chunks are solved.
+        """
+        for chunk, (values, columns, converged, stats) in self._reused_chunks(samples, n_jobs, chunk_size, **kwargs):
+            for k, (_, row) in enumerate(chunk.iterrows()):
+                self._case_stats[row.name] = stats[k]
+                if not converged[k]:
+                    yield row.name, False
+                    continue
+                yield row.name, self._case_output(row, pd.DataFrame(values[k][:, :-1], columns=columns),
+                                                  values[k][:, -1], output_path=kwargs.get('output_path', None))
+
+    def _solve_shared(self, samples:pd.DataFrame, n_jobs:int, chunk_size:int=None, store_path:str=None,
+                      manifest:BatchManifest=None, resume:bool=False, **kwargs) -> BatchStore:
+        """
+        Solves the samples in chunks in worker processes as `_solve_reused_parallel`, the workers write the outputs
+        of the samples to their slots of a `BatchStore` mapped by the parent and all the workers, instead of sending
+        them back, and only return the converged flags and the statistics of the solves. The store is created in
+        `store_path` before the samples are sent, with the outputs of the reused solver and one more time point than
+        its cycle (see `_store_outputs`), a resumed run writes to its store.
+        """
+        store, failed = self._resumed_store(store_path, resume)
+        if store is None:
+            out_cols = kwargs.get('out_cols', None)
+            columns  = list(self._solver._asd_columns) if out_cols is None else list(out_cols)
+            store    = BatchStore.create(store_path, self._samples.index, columns + ['T'], self._solver._to.n_c + 1)
+            for label_failed in failed:
+                store.write(label_failed, False)
+        output_path = kwargs.get('output_path', None)
+        for chunk, (_, _, converged, stats) in self._reused_chunks(samples, n_jobs, chunk_size, store_path=store_path,
+                                                                   **kwargs):
+            for label, converged_k, stats_k in zip(chunk.index, converged, stats):
+                self._case_stats[label] = stats_k
+                if output_path is not None and converged_k:
+                    store.case(label).to_csv(os.path.join(output_path, f'all_outputs_{label}.csv'))
+                if manifest is not None:
+                    self._record_case(manifest, store, label, converged_k)
+        return store
+
+    @staticmethod
+    def _resumed_store(store_path:str, resume:bool=False):
+        """
+        Returns the store of a resumed run, open for writing, and the samples recorded as failed in a store which
+        needs to be created again. The store is None when the run is not resumed or has no store, and when no
+        sample converged in the previous run: the store then has no outputs and no time points, it is created again
+        with the outputs of the first converged sample and the samples which failed are recorded again.
+        """
+        if not (resume and BatchStore.exists(store_path)):
+            return None, []
+        store = BatchStore(store_path, mode='r+')
+        if store.n_t > 0:
+            return store, []
+        failed = list(store.index[store.status == FAILED])
+        del store
+        BatchStore.remove(store_path)
+        return None, failed
+
+    def _record_case(self, manifest:BatchManifest, store:BatchStore, label, converged:bool) -> None:
+        """ Records a sample whose outputs are on the disk in the journal of the `manifest`."""
+        stats = self._case_stats.get(label, None)
+        manifest.record(label,
+                        'converged' if converged else 'failed',
+                        wall_time=stats.total_time if stats is not None else np.nan,
+                        n_cycles=stats.totals['n_cycles'] if stats is not None else -1,
+                        output=f'outputs.npy[{store.position(label)}]' if converged else '')
+
+    def _store_outputs(self, store_path:str, outputs, manifest:BatchManifest=None, resume:bool=False) -> BatchStore:
+        """
+        Writes the (sample, output) pairs of `outputs` to a `BatchStore`, one at a time as they are yielded, and
+        records them in the `manifest` once they are on the disk. The store is created with the outputs of the
+        first converged sample and one more time point than its cycle, the cycles of samples with different
+        durations may differ by one time point (rounding of tcycle / dt). A resumed run writes to its store, see
+        `_resumed_store`.
+        """
+        store, failed = self._resumed_store(store_path, resume)
+        for label, output in outputs:
+            if store is None and output is not False:
+                store = BatchStore.create(store_path, self._samples.index, list(output.columns), len(output) + 1)
+                for label_failed in failed:
+                    store.write(label_failed, False)
+            if store is None:
+                failed.append(label)
+            else:
+                store.write(label, output if output is False else output.loc[label])
+            if manifest is not None:
+                if store is not None:
+                    store.flush()
+                self._record_case(manifest, store, label, output is not False)
+        if store is None:
+            store = BatchStore.create(store_path, self._samples.index, [], 0)
+            for label_failed in failed:
+                store.write(label_failed, False)
+        store.flush()
+        return store
+
+    @property
+    def stats(self) -> pd.DataFrame:
+        """ Totals of the solver statistics of the last batch, one row per sample (see `SolverStats.totals`)."""
+        return SolverStats.aggregate(self._case_stats)
+
+    def run_ensemble(self, chunk_size:int=1000, store_path:str=None, resume:bool=False, **kwargs):
+        """
+        Runs the batch with an `EnsembleSolver`, the samples are integrated together in chunks of `chunk_size`
+        members. The keyword arguments and the outputs (and `store_path`, `resume`) are the same as for `run_batch`.
+
+        The template of the ensemble is set up once. When the sampled parameters are copied into the parameter
+        vector (see `setup_parameter_map`), the rows of the members are filled from the samples, otherwise every
+        member needs a model of its own (see `EnsembleSolver.member_parameters`).
+        """
+        samples, manifest = self._batch_samples(store_path, resume)
+        conv_cols   = kwargs.get('conv_cols', None)
+        method      = kwargs.get('method', 'LSODA')
+        out_cols    = kwargs.get('out_cols', None)
+        output_path = kwargs.get('output_path', None)
+        mapped      = self.setup_parameter_map(**kwargs)
+
+        def members(chunk):
+            if mapped:
+                return [self._case_parameters(row)[:2] for _, row in chunk.iterrows()]
+            return [EnsembleSolver.member_parameters(self._setup_case(row)) for _, row in chunk.iterrows()]
+
+        def outputs():
+            ensemble = None
+            for start in tqdm(range(0, len(samples), chunk_size)):
+                chunk  = samples.iloc[start:start+chunk_size]
+                rows   = members(chunk)
+                P  = np.stack([P_m  for P_m, _  in rows])
+                y0 = np.stack([y0_m for _, y0_m in rows])
+
+                if ensemble is None:
+                    ensemble = EnsembleSolver(model=self._setup_case(chunk.iloc[0]), P=P, y0=y0)
+                    ensemble.setup(suppress_output=True, conv_cols=conv_cols, method=method)
+                else:
+                    ensemble.set_members(P=P, y0=y0)
+                ensemble.solve()
+
+                for i, (_, row) in enumerate(chunk.iterrows()):
+                    if not ensemble.converged[i]:
+                        yield row.name, False
+                        continue
+                    output = ensemble.member_output(i)
+                    yield row.name, self._case_output(row, output.drop('T', axis=1), output['T'].values,
+                                                      out_cols=out_cols, output_path=output_path)
+
+        if store_path is not None:
+            return self._store_outputs(store_path, outputs(), manifest, resume)
+        return [output for _, output in outputs()]
+
+    def run_adaptive(self, n_rounds:int, n_per_round:int, n_candidates:int=None, n_neighbours:int=8,
+                     failure_weight:float=0.5, summary=None, n_jobs=1, reuse_solver:bool=False, **kwargs):
+        """
+        Solves the samples of the batch (see `sample`), then adds `n_rounds` rounds of `n_per_round` samples where
+        they are the most informative, see `_adaptive_points`: where a nearest neighbour surrogate of the outputs
+        of the solved samples is the most uncertain, and where converged and failed samples meet (the boundary of
+        the feasible space). The new samples are picked among `n_candidates` points of the sampler (by default 20
+        per new sample), scaled and mapped as the samples of the batch (`map_sample_timings`, `map_vessel_volume`).
+        The outputs are summarised by `summary`, a function of the outputs of a sample (see `run_batch`) returning
+        a vector, by default the mean and the amplitude of every output over the cycle.
+
+        The keyword arguments are passed to `run_batch`. Returns the outputs of all the samples, in the order of the
+        samples of the batch, which then holds the new samples. The outputs of every round are needed in memory to
+        pick the samples of the next round, the run directories of `run_batch` (`store_path`, `resume`) are not
+        supported: every round would start a store and a manifest of its samples only.
+        """
+        for key in ['store_path', 'resume']:
+            if kwargs.get(key, None):
+                raise Exception(f"The adaptive batches are kept in memory, `{key}` is not supported.")
+        if summary is None:
+            def summary(output):
+                values = output.drop('T', axis=1).to_numpy()
+                return np.concatenate([values.mean(axis=0), values.max(axis=0) - values.min(axis=0)])
+        if n_candidates is None:
+            n_candidates = 20 * n_per_round
+
+        batch = self._samples
+        outputs, case_stats = list(self.run_batch(n_jobs=n_jobs, reuse_solver=reuse_solver, **kwargs)), self._case_stats
+        for _ in range(n_rounds):
+            converged = np.array([output is not False for output in outputs])
+            features  = [np.asarray(summary(output), dtype=np.float64) for output in outputs if output is not False]
+            features  = np.stack(features) if len(features) > 0 else np.empty((0, 0))
+            points = self._adaptive_points(self._sampler.random(n_candidates), self._unit_samples, features,
+                                           converged, n_per_round, n_neighbours, failure_weight)
+            samples = self._new_samples(points)
+            self._samples = samples
+            try:
+                outputs += list(self.run_batch(n_jobs=n_jobs, reuse_solver=reuse_solver, **kwargs))
+                case_stats.update(self._case_stats)
+            finally:
+                batch = pd.concat([batch, samples])
+                self._samples, self._case_stats = batch, case_stats
+                self._unit_samples = np.concatenate([self._unit_samples, points])
+        return outputs
+
+    @staticmethod
+    def _adaptive_points(candidates:np.ndarray[float], points:np.ndarray[float], features:np.ndarray[float],
+                         converged:np.ndarray[bool], n_new:int, n_neighbours:int=8,
+                         failure_weight:float=0.5) -> np.ndarray[float]:
+        """
+        Picks `n_new` of the `candidates` (points of the unit hypercube) to add to the solved `points`, with the
+        `features` of the converged ones (one row per converged point, see `run_adaptive`).
+
+        Every candidate is scored from its `n_neighbours` nearest solved points, weighted by their inverse distance:
+        the spread of the normalised features of the converged neighbours (the uncertainty of the nearest neighbour
+        surrogate, scaled to 1 at its maximum) and 4 p (1 - p), with p the weight of the failed neighbours (1 where
+        the converged and failed points are mixed). The candidates are picked one at a time, the score of the
+        candidates closer to a solved or picked point than the median spacing of the solved points is reduced in
+        proportion, so that the new points are spread out.
+        """
+        n_neighbours = min(n_neighbours, len(points))
+        distances, neighbours = cKDTree(points).query(candidates, k=n_neighbours)
+        distances, neighbours = distances.reshape(len(candidates), -1), neighbours.reshape(len(candidates), -1)
+        weights = 1.0 / np.maximum(distances, 1e-12)
+        weights /= weights.sum(axis=1, keepdims=True)
+
+        failed  = np.sum(weights * ~converged[neighbours], axis=1)
+        score   = failure_weight * 4.0 * failed * (1.0 - failed)
+        if len(features) > 1:
+            values = np.full((len(points), features.shape[1]), np.nan)
+            values[converged] = (features - features.mean(axis=0)) / np.maximum(features.std(axis=0), 1e-12)
+            values  = values[neighbours]
+            w_conv  = weights * converged[neighbours]
+            w_sum   = np.maximum(w_conv.sum(axis=1), 1e-12)[:, None]
+            mean    = np.nansum(w_conv[..., None] * values, axis=1) / w_sum
+            spread  = np.sqrt(np.nansum(w_conv[..., None] * (values - mean[:, None]) ** 2, axis=1) / w_sum)
+            spread  = spread.mean(axis=1)
+            if spread.max() > 0.0:
+                score += (1.0 - failure_weight) * spread / spread.max()
+
+        spacing = np.median(cKDTree(points).query(points, k=2)[0][:, 1]) if len(points) > 1 else 1.0
+        closest = distances[:, 0].copy()
+        picked  = []
+        for _ in range(min(n_new, len(candidates))):
+            gain = (score + 1e-3) * np.minimum(1.0, closest / spacing)
+            gain[picked] = -1.0
+            i = int(np.argmax(gain))
+            picked.append(i)
+            closest = np.minimum(closest, np.linalg.norm(candidates - candidates[i], axis=1))
+        return candidates[picked]
+
+    def _setup_case(self, row) -> OdeModel:
         time_setup = self._tst.copy()
         time_setup['tcycle']  = row['T']
         time_setup['dt']*= row['T'] / self._ref_time
@@ -123,6 +566,122 @@ class _BatchRunner:
             po._set_comp(obj,[obj,], **{param: val})
 
         model : OdeModel = self._model_generator(time_setup_dict = time_setup, parobj=po, suppress_printing=True)
+        return model
+
+    def _case_output(self, row, raw_signal:pd.DataFrame, time:np.ndarray, out_cols=None, output_path=None):
+        if out_cols is not None:
+            raw_signal = raw_signal[out_cols]
+
+        raw_signal_short = raw_signal.tail(len(time)).copy()
+        raw_signal_short.index = pd.MultiIndex.from_tuples([(row.name, i) for i in range(len(raw_signal_short))], names=
+        ['realization', 'time_ind'])
+        raw_signal_short.loc[:,'T'] = time
+
+        if output_path is not None: raw_signal_short.loc[row.name].to_csv(os.path.join(output_path, f'all_outputs_{row.name}.csv'))
+
+        return raw_signal_short
+
+    def setup_parameter_map(self, **kwargs) -> bool:
+        """
+        Sets up the compiled solver of the first sample, reused for the other samples (see `Solver.set_parameters`).
+        Every sampled parameter is perturbed once to find the entries of the parameter vector and of the initial
+        values it sets, the parameters need to be copied as they are into these entries.
+
+        Returns False if the model can not be compiled, if a sampled parameter is not copied as it is (e.g. a
+        quantity derived from several parameters), sets no entry at all (e.g. a parameter only read by python code
+        or captured by the closure of an activation function) or changes the functions used by the kernels, the
+        samples then need a model each.
+        """
+        self._solver, self._parameter_map = None, None
+        row = self._samples.iloc[0]
+        try:
+            solver = self._reused_solver(row, **kwargs)
+        except Exception:
+            return False
+
+        P_ref, y0_ref = solver._P.copy(), solver._y0.copy()
+        functions_ref = self._kernel_functions(solver)
+        parameter_map = dict()
+        for key in self._samples.columns[self._samples.nunique() > 1]:
+            value = row[key]
+            probe = value * 1.25 if value != 0.0 else 1.0
+            probe_row = row.copy()
+            probe_row[key] = probe
+            probe_solver = Solver(model=self._setup_case(probe_row))
+            probe_solver.setup(suppress_output=True)
+            P  = CompiledModel.parameter_vector(init_specs=probe_solver._global_sv_init_ker,
+                                                ssv_specs=probe_solver._global_ssv_update_ker,
+                                                psv_specs=probe_solver._global_psv_update_ker,
+                                                tcycle=probe_solver._to.tcycle)
+            y0 = probe_solver._y0
+            p_ids = np.flatnonzero(~((P == P_ref) | (np.isnan(P) & np.isnan(P_ref))))
+            y_ids = np.flatnonzero(~((y0 == y0_ref) | (np.isnan(y0) & np.isnan(y0_ref))))
+            if len(p_ids) == 0 and len(y_ids) == 0:
+                return False
+            if not (np.all(P[p_ids] == probe) and np.all(P_ref[p_ids] == value) and
+                    np.all(y0[y_ids] == probe) and np.all(y0_ref[y_ids] == value)):
+                return False
+            functions = self._kernel_functions(probe_solver)
+            if len(functions) != len(functions_ref) or any(f is not g for f, g in zip(functions, functions_ref)):
+                return False
+            parameter_map[key] = (p_ids, y_ids)
+
+        self._solver, self._parameter_map = solver, parameter_map
+        self._P_ref, self._y0_ref = P_ref, y0_ref
+        return True
+
+    def _reused_solver(self, row, **kwargs) -> Solver:
+        """ Compiled solver of the sample `row`, set up with the keyword arguments of `run_batch`."""
+        budgets = {key: kwargs[key] for key in ['max_wall_time', 'max_nfev', 'min_step', 'divergence_window']
+                   if key in kwargs}
+        solver = Solver(model=self._setup_case(row))
+        solver.setup(suppress_output=True,
+                     optimize_secondary_sv=kwargs.get('optimize_secondary_sv', False),
+                     conv_cols=kwargs.get('conv_cols', None),
+                     method=kwargs.get('method', 'LSODA'),
+                     compiled=True,
+                     cache_dir=kwargs.get('cache_dir', None),
+                     **budgets)
+        return solver
+
+    @staticmethod
+    def _kernel_functions(solver:Solver) -> list:
+        """ Kernels of the state variables of a set up solver and the functions passed as kernel parameters."""
+        functions = []
+        for specs in [solver._global_sv_init_ker, solver._global_ssv_update_ker, solver._global_psv_update_ker]:
+            for kernel, parameters in specs.values():
+                functions.append(kernel)
+                functions.extend(value for value in parameters.values() if callable(value))
+        return functions
+
+    def _run_case(self, row, **kwargs):
+        return self._solve_case(row, **kwargs)[0]
+
+    def _case_parameters(self, row):
+        """ Parameter vector, initial values and time step of a sample for the reused solver."""
+        P, y0 = self._P_ref.copy(), self._y0_ref.copy()
+        for key, (p_ids, y_ids) in self._parameter_map.items():
+            P[p_ids]  = row[key]
+            y0[y_ids] = row[key]
+        return P, y0, self._tst['dt'] * row['T'] / self._ref_time
+
+    def _solve_case_reused(self, row, **kwargs):
+        """ Solves a sample with the reused compiled solver, same outputs as `_solve_case`."""
+        P, y0, dt = self._case_parameters(row)
+
+        solver = self._solver
+        solver.set_parameters(P, y0=y0, dt=dt)
+        solver.solve()
+
+        if not solver.converged: return False, solver.stats
+
+        return (self._case_output(row, solver._asd, solver._to._sym_t.values[-solver._to.n_c:],
+                                  out_cols=kwargs.get('out_cols', None), output_path=kwargs.get('output_path', None)),
+                solver.stats)
+
+    def _solve_case(self, row, **kwargs):
+        """ Solves a sample, returns its outputs (False if the solver did not converge) and the solver statistics."""
+        model : OdeModel = self._setup_case(row)
 
         solver = Solver(model=model)
 
@@ -151,26 +710,24 @@ class _BatchRunner:
         else:
             output_path = None
 
+        # compute budgets of the case, see `Solver.setup`
+        budgets = {key: kwargs[key] for key in ['max_wall_time', 'max_nfev', 'min_step', 'divergence_window']
+                   if key in kwargs}
+        # compiled functions, shared by the cases (and the workers) through the on-disk cache
+        compilation = {key: kwargs[key] for key in ['compiled', 'cache_dir'] if key in kwargs}
+
         solver.setup(
             suppress_output=True,
             optimize_secondary_sv=optimize_secondary_sv,
             conv_cols=conv_cols,
-            method=method
+            method=method,
+            **budgets,
+            **compilation
         )
         solver.solve()
 
-        if not solver.converged: return False
-
-        if out_cols is None:
-            raw_signal = solver._asd.copy()
-        else:
-            raw_signal = solver._asd[out_cols].copy()
+        if not solver.converged: return False, solver.stats
 
-        raw_signal_short = raw_signal.tail(model.time_object.n_c).copy()
-        raw_signal_short.index = pd.MultiIndex.from_tuples([(row.name, i) for i in range(len(raw_signal_short))], names=
-        ['realization', 'time_ind'])
-        raw_signal_short.loc[:,'T'] = model.time_object._sym_t.values[-model.time_object.n_c:]
-
-        if output_path is not None: raw_signal_short.loc[row.name].to_csv(os.path.join(output_path, f'all_outputs_{row.name}.csv'))
-
-        return raw_signal_short
+        return (self._case_output(row, solver._asd, model.time_object._sym_t.values[-model.time_object.n_c:],
+                                  out_cols=out_cols, output_path=output_path),
+                solver.stats)
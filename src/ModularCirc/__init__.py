@@ -1 +1,2 @@
 from ._BatchRunner import _BatchRunner as BatchRunner
+from .BatchStore import BatchStore
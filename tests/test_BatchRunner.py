@@ -0,0 +1,246 @@
+import unittest
+import numpy as np
+import pandas as pd
+import tempfile
+import os
+import json
+from unittest import mock
+from scipy.stats.qmc import LatinHypercube
+from ModularCirc import BatchRunner, BatchStore
+from ModularCirc.BatchStore import BatchManifest, FAILED
+from ModularCirc.EnsembleSolver import EnsembleSolver
+from ModularCirc.Solver import Solver
+from ModularCirc.Models.KorakianitisMixedModel import KorakianitisMixedModel
+from ModularCirc.Models.KorakianitisMixedModel_parameters import KorakianitisMixedModel_parameters
+
+class TestBatchRunner(unittest.TestCase):
+    """
+    TestBatchRunner is a unittest.TestCase class designed to test the BatchRunner class with samples of the
+    KorakianitisMixedModel which differ by their left ventricle contractility and their heart cycle duration.
+
+    Methods
+    -------
+    setUp():
+        Initializes the batch runner with the samples and the model.
+    test_reused_solver_parallel():
+        Verifies that the parallel batch reusing a compiled solver in every worker gives the outputs of the
+        sequential batch reusing a single solver.
+    test_resume():
+        Verifies that a batch whose run was stopped is resumed from its manifest, solving only the samples which
+        are not recorded as converged, and that the store then holds the outputs of all the samples, including
+        after a run where every sample failed.
+    test_shared_buffer():
+        Verifies that the parallel batch whose workers write the outputs to a shared store gives the outputs of the
+        sequential batch, with and without a run directory.
+    test_adaptive():
+        Verifies that the adaptive rounds pick the new samples at the boundary of the converged samples and where
+        the outputs vary the most, and that a batch run in rounds returns the outputs of the initial and new samples.
+    test_ensemble_setup():
+        Verifies that the ensemble batch fills the members from the samples without setting up a solver per member,
+        and gives the outputs of the ensemble whose members are set up from a model each.
+    test_parameter_map():
+        Verifies that a sampled column which sets no entry of the parameter vector or of the initial values rejects
+        the parameter map of the reused solver.
+    """
+
+    def setUp(self):
+        """
+        Set up the samples, each sample is defined by a (E_act, T) pair, the time step is scaled by T.
+        """
+        E_act = KorakianitisMixedModel_parameters()['lv']['E_act']
+        self.runner = BatchRunner()
+        self.runner._samples = pd.DataFrame({'lv.E_act': E_act * np.array([1.0, 1.1, 1.2]),
+                                             'T'       : np.array([1.0, 0.9, 0.8])})
+        self.runner._ref_time = 1.0
+        self.runner.setup_model(model=KorakianitisMixedModel,
+                                po=KorakianitisMixedModel_parameters,
+                                time_setup={'name': 'TimeTest', 'ncycles': 30, 'tcycle': 1.0, 'dt': 0.001,
+                                            'export_min': 1})
+
+    def test_reused_solver_parallel(self):
+        """
+        Test `run_batch` with `reuse_solver` and several workers.
+
+        This test verifies that the samples are solved by the workers in chunks, in the order of the samples, and
+        that the outputs and the number of cycles of every sample match the sequential batch. A second batch with
+        the same options reuses the executor of the first one, a change of the options replaces it.
+        """
+        expected = self.runner.run_batch(n_jobs=1, reuse_solver=True, method='LSODA')
+        expected_stats = self.runner.stats
+
+        outputs = self.runner.run_batch(n_jobs=2, reuse_solver=True, chunk_size=2, method='LSODA')
+        self.assertIsNotNone(self.runner._parameter_map)
+        self.assertEqual(len(outputs), len(expected))
+        for output, output_expected in zip(outputs, expected):
+            pd.testing.assert_frame_equal(output, output_expected[output.columns])
+        np.testing.assert_array_equal(self.runner.stats['n_cycles'].values, expected_stats['n_cycles'].values)
+
+        # the following batches with the same options reuse the workers and their solvers
+        executor = self.runner._worker_executor(2, method='LSODA')
+        outputs  = self.runner.run_batch(n_jobs=2, reuse_solver=True, chunk_size=2, method='LSODA')
+        pd.testing.assert_frame_equal(outputs[-1], expected[2][outputs[-1].columns])
+        self.assertIs(self.runner._worker_executor(2, method='LSODA'), executor)
+        self.assertIsNot(self.runner._worker_executor(2, method='RK45'), executor)
+
+
+    def test_resume(self):
+        """
+        Test `run_batch` with a run directory and `resume`.
+
+        The run is stopped by cutting the journal of the manifest after the first sample, in the middle of the
+        line of the second one. The resumed run solves the second and third samples only, the manifest then
+        records all the samples as converged and the store holds the outputs of the complete run. A run where no
+        sample converged, whose store has no time points, is resumed too.
+        """
+        with tempfile.TemporaryDirectory() as path:
+            expected = self.runner.run_batch(n_jobs=1, reuse_solver=True, store_path=path, method='LSODA')
+            expected = expected.to_frame()
+            manifest = BatchManifest(path, self.runner.samples, resume=True)
+            self.assertTrue(np.all(manifest.table['status'] == 'converged'))
+
+            journal = os.path.join(path, 'manifest.csv')
+            with open(journal) as file:
+                lines = file.readlines()
+            with open(journal, 'w') as file:
+                file.write(''.join(lines[:2]) + lines[2][:5])
+            self.assertEqual(list(manifest.table['status']), ['converged', 'pending', 'pending'])
+
+            store = self.runner.run_batch(n_jobs=1, reuse_solver=True, store_path=path, resume=True, method='LSODA')
+            self.assertEqual(list(self.runner._case_stats.keys()), [1, 2])
+            self.assertTrue(np.all(store.converged))
+            self.assertTrue(np.all(manifest.table['status'] == 'converged'))
+            self.assertEqual(list(manifest.table['output']), [f'outputs.npy[{i}]' for i in range(3)])
+            pd.testing.assert_frame_equal(BatchStore(path).to_frame(), expected)
+
+            samples = self.runner._samples
+            self.runner._samples = samples.iloc[:2]
+            with self.assertRaises(Exception):
+                self.runner.run_batch(n_jobs=1, store_path=path, resume=True)
+            self.runner._samples = samples
+
+            # a run where every sample failed, its store has no time points, is resumed
+            store = self.runner.run_batch(n_jobs=1, reuse_solver=True, store_path=path, method='LSODA', max_nfev=10)
+            self.assertEqual(store.n_t, 0)
+            self.assertTrue(np.all(store.status == FAILED))
+            self.assertTrue(np.all(manifest.table['status'] == 'failed'))
+            del store
+            store = self.runner.run_batch(n_jobs=1, reuse_solver=True, store_path=path, resume=True, method='LSODA')
+            self.assertTrue(np.all(store.converged))
+            self.assertTrue(np.all(manifest.table['status'] == 'converged'))
+            pd.testing.assert_frame_equal(BatchStore(path).to_frame(), expected)
+
+    def test_shared_buffer(self):
+        """
+        Test `run_batch` with `reuse_solver`, several workers and `shared_buffer`.
+
+        The workers write the outputs of the samples to the store instead of returning them. Without a run directory
+        the outputs read back from the store match the sequential batch, with a run directory the store holds the
+        same outputs and the manifest records all the samples as converged.
+        """
+        expected = self.runner.run_batch(n_jobs=1, reuse_solver=True, method='LSODA')
+
+        outputs = self.runner.run_batch(n_jobs=2, reuse_solver=True, shared_buffer=True, chunk_size=2, method='LSODA')
+        self.assertEqual(len(outputs), len(expected))
+        for output, output_expected in zip(outputs, expected):
+            pd.testing.assert_frame_equal(output, output_expected[output.columns])
+        self.assertEqual(list(self.runner.stats.index), [0, 1, 2])
+
+        with tempfile.TemporaryDirectory() as path:
+            store = self.runner.run_batch(n_jobs=2, reuse_solver=True, shared_buffer=True, store_path=path,
+                                          method='LSODA')
+            self.assertTrue(np.all(store.converged))
+            frame = pd.concat(list(expected))
+            pd.testing.assert_frame_equal(BatchStore(path).to_frame(), frame[store.columns])
+            manifest = BatchManifest(path, self.runner.samples, resume=True)
+            self.assertTrue(np.all(manifest.table['status'] == 'converged'))
+            del store
+
+    def test_adaptive(self):
+        """
+        Test `_adaptive_points` and `run_adaptive`.
+
+        The samples picked among candidates of the unit square, with failed samples above the line x + y = 1.2 and
+        an output with a steep front at x = 0.3, are close to the line or to the front. The batch sampled from a
+        template with bounds on E_act and T is then solved in a round of 3 samples and 1 round of 2 samples, the new
+        samples are within the bounds and mapped as the first ones. The run directories of `run_batch` are rejected
+        before any sample is solved.
+        """
+        points    = LatinHypercube(d=2, seed=1).random(40)
+        converged = points.sum(axis=1) < 1.2
+        features  = np.tanh(20.0 * (points[converged, 0] - 0.3))[:, None]
+        candidates= LatinHypercube(d=2, seed=2).random(400)
+        picked    = BatchRunner._adaptive_points(candidates, points, features, converged, 8)
+        self.assertEqual(picked.shape, (8, 2))
+        self.assertTrue(np.all((np.abs(picked.sum(axis=1) - 1.2) < 0.15) | (np.abs(picked[:, 0] - 0.3) < 0.1)))
+
+        E_act = KorakianitisMixedModel_parameters()['lv']['E_act']
+        with tempfile.TemporaryDirectory() as path:
+            template = os.path.join(path, 'template.json')
+            with open(template, 'w') as file:
+                json.dump({'lv': {'E_act': [E_act, [0.9, 1.2]]}, 'T': [1.0, [0.8, 1.0]]}, file)
+            runner = BatchRunner(sampler='LHS', seed=1)
+            runner.setup_sampler(template)
+        runner.sample(3)
+        runner.map_sample_timings(ref_time=1.0)
+        runner.setup_model(model=KorakianitisMixedModel, po=KorakianitisMixedModel_parameters,
+                           time_setup=self.runner._tst)
+
+        for options in [{'store_path': 'adaptive'}, {'resume': True}]:
+            with self.assertRaises(Exception):
+                runner.run_adaptive(n_rounds=1, n_per_round=2, **options)
+        self.assertEqual(len(runner.samples), 3)
+
+        outputs = runner.run_adaptive(n_rounds=1, n_per_round=2, n_candidates=10, reuse_solver=True, method='LSODA')
+        samples = runner.samples
+        self.assertEqual(len(outputs), 5)
+        self.assertEqual(list(samples.index), list(range(5)))
+        self.assertEqual(list(runner.stats.index), list(range(5)))
+        self.assertEqual(runner._unit_samples.shape, (5, 2))
+        self.assertTrue(np.all(samples['lv.E_act'].between(0.9 * E_act, 1.2 * E_act)))
+        self.assertTrue(np.all(samples['T'].between(0.8, 1.0)))
+        for label, output in zip(samples.index, outputs):
+            if output is not False:
+                np.testing.assert_allclose(output['T'].iloc[-1] - output['T'].iloc[0], samples.loc[label, 'T'],
+                                           rtol=0.02)
+
+    def test_parameter_map(self):
+        """
+        Test `setup_parameter_map` with a sampled column which sets no entry of the parameter vector.
+
+        The rise time of the right atrium is not read by its activation function, sampling it changes neither the
+        parameter vector nor the initial values, the map is then rejected and the samples need a model each. The
+        samples of the left ventricle contractility are mapped to the entries of the parameter vector.
+        """
+        self.assertTrue(self.runner.setup_parameter_map(method='LSODA'))
+        self.assertGreater(len(self.runner._parameter_map['lv.E_act'][0]), 0)
+
+        self.runner._samples['ra.tr'] = np.array([0.2, 0.25, 0.3])
+        self.assertFalse(self.runner.setup_parameter_map(method='LSODA'))
+        self.assertIsNone(self.runner._parameter_map)
+
+    def test_ensemble_setup(self):
+        """
+        Test that `run_ensemble` sets up the solvers once, whatever the number of members.
+
+        The parameter vectors and initial values of the members are filled from the samples through the parameter
+        map, a solver is set up for the reused solver, for every sampled column (see `setup_parameter_map`) and for
+        the template of the ensemble, but not for every member. The outputs match the ensemble whose members are
+        set up from a model each.
+        """
+        with mock.patch.object(BatchRunner, 'setup_parameter_map', return_value=False):
+            expected = self.runner.run_ensemble(chunk_size=2, method='LSODA')
+
+        setup = Solver.setup
+        with mock.patch.object(Solver, 'setup', autospec=True, side_effect=setup) as solver_setup, \
+             mock.patch.object(EnsembleSolver, 'member_parameters') as member_parameters:
+            outputs = self.runner.run_ensemble(chunk_size=2, method='LSODA')
+        member_parameters.assert_not_called()
+        self.assertEqual(solver_setup.call_count, 2 + self.runner._samples.shape[1])
+
+        self.assertEqual(len(outputs), len(expected))
+        for output, output_expected in zip(outputs, expected):
+            pd.testing.assert_frame_equal(output, output_expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+import pandas as pd
+import tempfile
+import os
+from ModularCirc import BatchRunner, BatchStore
+from ModularCirc.BatchStore import CONVERGED, FAILED, PENDING
+
+class TestBatchStore(unittest.TestCase):
+    """
+    TestBatchStore is a unittest.TestCase class designed to test the BatchStore class, the on-disk store of the
+    outputs of a batch, and how the BatchRunner fills it as the outputs of the samples arrive.
+
+    Methods
+    -------
+    setUp():
+        Builds the outputs of a few samples, in the format of the outputs of `BatchRunner.run_batch`.
+    test_store_outputs():
+        Verifies that the outputs streamed to the store, including the samples which did not converge, are read
+        back lazily, one sample at a time, as slices of the block and as a single frame.
+    """
+
+    def setUp(self):
+        """
+        Set up the outputs of 4 samples with 5 time points (4 for the last one, with a shorter cycle), the first and
+        the third samples did not converge.
+        """
+        self.index   = pd.Index([10, 11, 12, 13])
+        self.columns = ['v_lv', 'p_lv', 'T']
+        self.outputs = []
+        for label in self.index:
+            if label in (10, 12):
+                self.outputs.append((label, False))
+                continue
+            n_t    = 5 if label == 11 else 4
+            values = np.random.default_rng(label).random((n_t, len(self.columns)))
+            output = pd.DataFrame(values, columns=self.columns,
+                                  index=pd.MultiIndex.from_product([[label], range(n_t)],
+                                                                   names=['realization', 'time_ind']))
+            self.outputs.append((label, output))
+
+    def test_store_outputs(self):
+        """
+        Test `BatchRunner._store_outputs` and the reader of the store.
+
+        The outputs are passed as a generator, as they are yielded by the runs of the batch. The store is created
+        with the outputs of the first converged sample, the samples which did not converge before it are
+        recorded too, and the shorter cycle fills the first time points of the block. The store reopened for reading returns the outputs of every sample, None for the samples
+        which did not converge, and the frame of all the converged samples matches the in-memory outputs.
+        """
+        runner = BatchRunner()
+        runner._samples = pd.DataFrame({'T': np.ones(len(self.index))}, index=self.index)
+        with tempfile.TemporaryDirectory() as path:
+            store = runner._store_outputs(path, (pair for pair in self.outputs))
+            self.assertEqual(store.columns, self.columns)
+            del store
+
+            store = BatchStore(path)
+            np.testing.assert_array_equal(store.status.values, [FAILED, CONVERGED, FAILED, CONVERGED])
+            self.assertIsNone(store.case(10))
+            for label, output in self.outputs:
+                if output is not False:
+                    np.testing.assert_array_equal(store.case(label).values, output.loc[label].values)
+            np.testing.assert_array_equal(store[:, :4, 2], np.stack([np.full(4, np.nan), self.outputs[1][1]['T'][:4],
+                                                                     np.full(4, np.nan), self.outputs[3][1]['T']]))
+            self.assertTrue(np.all(np.isnan(store[3, 4:])))
+            expected = pd.concat([output for _, output in self.outputs if output is not False])
+            pd.testing.assert_frame_equal(store.to_frame(), expected)
+            self.assertEqual(len(store.to_frame(labels=[10, 11])), 5)
+
+            empty = BatchStore.create(os.path.join(path, 'empty'), self.index, self.columns, 5)
+            self.assertTrue(np.all(empty.status == PENDING))
+            self.assertTrue(np.all(np.isnan(empty[:])))
+
+
+if __name__ == '__main__':
+    unittest.main()
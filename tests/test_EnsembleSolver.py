@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import logging
+from ModularCirc.Solver import Solver
+from ModularCirc.EnsembleSolver import EnsembleSolver
+from ModularCirc.Models.KorakianitisMixedModel import KorakianitisMixedModel
+from ModularCirc.Models.KorakianitisMixedModel_parameters import KorakianitisMixedModel_parameters
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Define global constants for tolerances
+RELATIVE_TOLERANCE = 1e-3
+
+class TestEnsembleSolver(unittest.TestCase):
+    """
+    TestEnsembleSolver is a unittest.TestCase class designed to test the EnsembleSolver class with members of
+    the KorakianitisMixedModel which differ by their left ventricle contractility and their heart cycle duration.
+
+    Methods
+    -------
+    setUp():
+        Initializes the models of the members and extracts their parameter vectors and initial values.
+    test_member_parameters():
+        Verifies that the parameter vector of a model matches the one of its compiled model.
+    test_ensemble_solve():
+        Verifies that every member of the ensemble converges to the same solution as the one found by the Solver
+        for the corresponding model.
+    """
+
+    def setUp(self):
+        """
+        Set up the members of the ensemble, each member is defined by a (E_act scaling, tcycle) pair.
+        """
+        self.cases = [(1.0, 1.0), (1.2, 0.8)]
+        self.models = [self.build_model(scale, tcycle) for scale, tcycle in self.cases]
+        members = [EnsembleSolver.member_parameters(model) for model in self.models]
+        self.P  = np.stack([P  for P, _  in members])
+        self.y0 = np.stack([y0 for _, y0 in members])
+
+    @staticmethod
+    def build_model(scale:float, tcycle:float) -> KorakianitisMixedModel:
+        time_setup_dict = {
+            'name': 'TimeTest',
+            'ncycles': 30,
+            'tcycle': tcycle,
+            'dt': 0.001 * tcycle,
+            'export_min': 1
+        }
+        parobj = KorakianitisMixedModel_parameters()
+        parobj._set_comp('lv', ['lv',], E_act=parobj['lv']['E_act'] * scale)
+        return KorakianitisMixedModel(time_setup_dict=time_setup_dict, parobj=parobj, suppress_printing=True)
+
+    def test_member_parameters(self):
+        """
+        Test that `EnsembleSolver.member_parameters` returns the parameter vector of the compiled model.
+        """
+        solver = Solver(model=self.build_model(*self.cases[1]))
+        solver.setup(suppress_output=True, compiled=True)
+        np.testing.assert_array_equal(self.P[1], solver._P)
+
+    def test_ensemble_solve(self):
+        """
+        Test the `solve` method of the ensemble solver.
+
+        This test verifies that all the members converge, in the same number of cycles as the Solver, and that
+        their last cycle matches the one computed by the Solver for the same model.
+        """
+        ensemble = EnsembleSolver(model=self.build_model(*self.cases[0]), P=self.P, y0=self.y0)
+        ensemble.setup(suppress_output=True, method='LSODA')
+        ensemble.solve()
+
+        for i, case in enumerate(self.cases):
+            model  = self.build_model(*case)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='LSODA', compiled=True)
+            solver.solve()
+
+            self.assertTrue(ensemble.converged[i])
+            self.assertEqual(ensemble.Nconv[i], solver.Nconv)
+
+            output   = ensemble.member_output(i)
+            expected = solver._asd.tail(model.time_object.n_c)
+            np.testing.assert_allclose(output['T'].values, model.time_object._sym_t.values[-model.time_object.n_c:])
+            np.testing.assert_allclose(output[expected.columns].values, expected.values,
+                                       rtol=RELATIVE_TOLERANCE, atol=RELATIVE_TOLERANCE * np.max(np.abs(expected.values)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,6 +35,9 @@ class TestNaghaviModel(unittest.TestCase):
         test_solver_run:
             Tests the functionality of the solver by running it with different cycle step sizes.
             Verifies solver convergence, updates to model state variables, and correctness of computed results.
+        test_solver_aitken:
+            Tests the solver with the Aitken extrapolation of the start of the cycles.
+            Verifies that cycles are saved and that the solution matches a tightly converged solution.
     """
 
     def setUp(self):
@@ -188,6 +191,33 @@ class TestNaghaviModel(unittest.TestCase):
                                         np.abs((expected_ndarray - new_ndarray)))
                 self.assertTrue((test_ndarray < RELATIVE_TOLERANCE).all())
 
+    def test_solver_aitken(self):
+        """
+        Test the solver setup with `steady_state='aitken'`.
+        This test ensures that:
+        1. The start of at least one cycle is extrapolated and the solver converges in fewer cycles.
+        2. The last cycle matches the one of a solver converged with a tight tolerance.
+        """
+        outputs = {}
+        for name, options in [('plain', {'step_tol': 0.001}),
+                              ('reference', {'step_tol': 1e-5}),
+                              ('aitken', {'step_tol': 0.001, 'steady_state': 'aitken'})]:
+            model  = NaghaviModel(time_setup_dict=self.time_setup_dict,
+                                  parobj=NaghaviModelParameters(),
+                                  suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, conv_cols=['p_lv', 'v_lv'], method='LSODA', **options)
+            solver.solve()
+            self.assertTrue(solver.converged)
+            outputs[name] = (solver, solver._asd.tail(model.time_object.n_c).values)
+
+        self.assertGreater(outputs['aitken'][0].n_extrapolations, 0)
+        self.assertGreater(outputs['aitken'][0].cycles_saved, 0.0)
+        self.assertLess(outputs['aitken'][0].Nconv, outputs['plain'][0].Nconv)
+        expected = outputs['reference'][1]
+        np.testing.assert_allclose(outputs['aitken'][1], expected,
+                                   rtol=1e-2, atol=1e-2 * np.max(np.abs(expected)))
+
 
 if __name__ == '__main__':
     unittest.main()
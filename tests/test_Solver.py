@@ -2,9 +2,19 @@ import unittest
 import numpy as np
 import json
 import os
+import tempfile
 import logging
+import sys
+import gc
+from scipy.optimize import least_squares
 from ModularCirc.Models.OdeModel import OdeModel
+from ModularCirc.Components import Rc_component
+from ModularCirc.HelperRoutines import (maynard_impedance_dqdt_jac, maynard_phi_law_jac, maynard_valve_flow_jac,
+                                        simple_bernoulli_diode_flow_jac, time_shift)
 from ModularCirc.Solver import Solver
+from ModularCirc.EnsembleSolver import EnsembleSolver
+from ModularCirc.Compiler import column_coloring, newton_secondary, secondary_order
+from ModularCirc.Analysis.BaseAnalysis import BaseAnalysis
 from ModularCirc.Models.KorakianitisMixedModel import KorakianitisMixedModel
 from ModularCirc.Models.KorakianitisMixedModel_parameters import KorakianitisMixedModel_parameters
 
@@ -42,6 +52,61 @@ class TestSolver(unittest.TestCase):
     test_solver_solve():
         Tests the solve() method of the solver, ensuring the solver converges and the output matches the
         expected values.
+    test_compiled_functions():
+        Tests the numba compiled versions of pv_dfdt_update() and s_u_update(), ensuring the outputs match
+        the expected outputs of the python versions.
+    test_analytic_jacobian():
+        Tests the Jacobian assembled from the analytic partial derivatives of the components, ensuring it matches
+        a finite difference approximation and the sparsity pattern of the system.
+    test_index_permutations():
+        Tests the reordering of the state variables by index permutations, ensuring the permutations are inverse of
+        each other, match the derived dense permutation matrix and that the reordered solve gives the expected
+        outputs.
+    test_vectorized_functions():
+        Tests pv_dfdt_update() and s_u_update() in vectorized mode, ensuring that evaluating a block of state
+        vectors matches evaluating them one at a time.
+    test_state_storage():
+        Tests the preallocated array storing the state variables, ensuring the solve writes the expected outputs to
+        it and that the DataFrame of the solver and the state variables of the model are views built from it.
+    test_compute_secondary_sv():
+        Tests the compute_secondary_sv() method of the solver, ensuring the secondary state variables computed
+        for a whole time series match the ones computed one time point at a time, with and without optimization.
+    test_steady_state_anderson():
+        Tests the solve() method of the solver with the Anderson accelerated shooting, ensuring it converges in
+        fewer cycles to the periodic solution found with a tight convergence tolerance.
+    test_continuous_integration():
+        Tests the solve() method of the solver with a single persistent integrator, ensuring it converges in the
+        same number of cycles and to the same solution as the solver restarting the integration every cycle.
+    test_fixed_step_integrators():
+        Tests the solve() method of the solver with the compiled SDIRK fixed step integrator, ensuring it
+        converges to the periodic solution found with LSODA.
+    test_valve_events():
+        Tests the solve() method of the solver with the valve events, ensuring it converges to the same solution
+        as the plain integration and gives the valve timings found by the analysis of the sampled pressures.
+    test_compute_budgets():
+        Tests the solve() method of the solver with compute budgets, ensuring the solver is aborted when a budget
+        is exceeded and reports the reason of the abort.
+    test_solver_stats():
+        Tests the statistics recorded by the solve() method, ensuring there is one record per integrated cycle
+        with the integrator counters and the convergence errors of the variables of the convergence test.
+    test_profiling():
+        Tests the profiling mode of the solver, ensuring every update function is timed and the report groups
+        the calls by state variable and by function name.
+    test_rolling_window():
+        Tests the solve() method of the solver with a model storing a rolling window of cycles, ensuring only the
+        window is stored and the last cycle matches the one found when all the cycles are stored.
+    test_set_parameters():
+        Tests the set_parameters() method of the compiled solver, ensuring a solver set up for one model solves a
+        model with other parameters (and another heart cycle duration) as a solver built for that model.
+    test_disk_cache():
+        Tests the on-disk cache of the solver, ensuring models which only differ by their parameters share the
+        topology hash and that a second solver loads the structure and the compiled functions from the cache.
+    test_newton_secondary():
+        Tests the Newton solver of the secondary state variables, ensuring the colored finite difference Jacobian
+        solves a coupled system and that the python and compiled solvers match the least squares fit.
+    test_secondary_order():
+        Tests the dependency order of the secondary state variables, ensuring every variable comes after the ones
+        it reads, that only the algebraic loops are iterated and that a single sweep updates the model.
     """
 
     def setUp(self):
@@ -91,6 +156,28 @@ class TestSolver(unittest.TestCase):
         self.solver.setup(suppress_output=True, method='LSODA', step=1)
 
 
+    def expected_output_errors(self, model, step:int=1) -> np.ndarray[float]:
+        """
+        Returns the errors of the means over the last cycle of the volumes, pressures and flows of the components of
+        a solved model relative to the expected values of the solve with the given cycle step size (absolute errors
+        for the values close to zero), see `test_solver_solve`.
+        """
+        output_file_path = os.path.join(self.base_dir, 'expected_outputs', 'KorakianitisMixedModel_expected_output.json')
+        with open(output_file_path, 'r') as f:
+            expected_values = json.load(f)["results"][str(step)]
+
+        tind_fin = np.arange(start=model.time_object.n_t-model.time_object.n_c, stop=model.time_object.n_t)
+        new_ndarray, expected_ndarray = [], []
+        for key, value in model.components.items():
+            for key2, values in [('V', value.V), ('P_i', value.P_i), ('Q_i', value.Q_i)]:
+                new_ndarray.append(values.values[tind_fin].mean())
+                expected_ndarray.append(expected_values[key][key2])
+        new_ndarray, expected_ndarray = np.array(new_ndarray), np.array(expected_ndarray)
+        return np.where(np.abs(expected_ndarray) > 1e-6,
+                        np.abs((expected_ndarray - new_ndarray) / expected_ndarray),
+                        np.abs((expected_ndarray - new_ndarray)))
+
+
     def test_solver_initialization(self):
         """
         Test the initialization of the solver.
@@ -387,5 +474,607 @@ class TestSolver(unittest.TestCase):
                                 f"Test failed for step size {i_cycle_step_size}: {test_ndarray}")
 
 
+    def test_compiled_functions(self):
+        """
+        Test the numba compiled functions generated when the solver is setup with `compiled=True`.
+
+        This test verifies that the compiled `pv_dfdt_update` and `s_u_update` functions return the same
+        values as the python closures, using the same inputs and expected outputs as the tests above, that a
+        variable without kernel is reported by its function name and that the volume of a Rc component without
+        initial volume gets the kernel of its initialization function.
+        """
+        solver = Solver(model=self.model)
+        solver.setup(suppress_output=True, method='LSODA', step=1, compiled=True)
+
+        y0 = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_pv_dfdt_update.npy'))
+        expected_output = np.load(os.path.join(self.base_dir, 'expected_outputs', 'pv_dfdt_update_expected_output.npy'))
+        np.testing.assert_allclose(solver.pv_dfdt_global(t=0, y=y0), expected_output)
+
+        y_temp = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_s_u_update.npy'))
+        expected_output = np.load(os.path.join(self.base_dir, 'expected_outputs', 's_u_update_expected_output.npy'))
+        np.testing.assert_allclose(solver.s_u_update(t=0.0, y=y_temp), expected_output)
+
+        # The compiled block functions match the single state vector ones
+        y_block = y0[:, np.newaxis] * np.linspace(0.9, 1.1, 4)
+        np.testing.assert_allclose(solver.pv_dfdt_global(t=0, y=y_block),
+                                   np.stack([solver.pv_dfdt_global(t=0, y=y) for y in y_block.T], axis=1))
+
+        # Every entry of the parameter vector is named
+        self.assertEqual(len(solver._compiled_model.parameter_names), len(solver._P))
+
+        # A variable without kernel is reported with the name of its function
+        key = next(iter(solver._global_sv_init_ker))
+        solver._global_sv_init_ker[key] = None
+        with self.assertRaisesRegex(Exception, f"\\({solver._global_sv_init_fun_n[key]}\\) does not define a kernel"):
+            solver.generate_compiled_functions(perm=solver.perm)
+
+        # The volume of a Rc component without initial volume is initialized from its pressure
+        rc = Rc_component(name='rc', time_object=self.model.time_object, r=0.1, c=2.0, v_ref=10.0, p=80.0)
+        rc.setup()
+        self.assertEqual(rc._V.i_name, 'grounded_capacitor_model_volume')
+        self.assertEqual(rc._V.i_kernel[1], {'v_ref': 10.0, 'c': 2.0})
+        np.testing.assert_allclose(rc._V.i_func(0.0, np.array([80.0])), 10.0 + 2.0 * 80.0)
+
+
+    def test_analytic_jacobian(self):
+        """
+        Test the Jacobian generated when the solver is setup with `analytic_jacobian=True`.
+
+        This test verifies that the Jacobian assembled from the analytic partial derivatives of the components
+        matches a central finite difference approximation of `pv_dfdt_update`, and that its non-zero entries
+        are contained in the sparsity pattern passed to the implicit methods. The Jacobian packed by bands for
+        LSODA is unpacked and compared to the same approximation, and a LSODA solve using it gives the expected
+        outputs.
+        """
+        solver = Solver(model=self.model)
+        solver.setup(suppress_output=True, method='BDF', step=1, analytic_jacobian=True)
+
+        y0 = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_pv_dfdt_update.npy'))
+        for t in [0.0, 0.1, 0.3]:
+            jac = solver.pv_jacobian(t=t, y=y0).toarray()
+
+            jac_fd = np.zeros(jac.shape)
+            for i, h in enumerate(1.0e-6 * np.maximum(1.0, np.abs(y0))):
+                dy = np.zeros(len(y0))
+                dy[i] = h
+                jac_fd[:, i] = (solver.pv_dfdt_global(t=t, y=y0 + dy) - solver.pv_dfdt_global(t=t, y=y0 - dy)) / (2.0 * h)
+
+            np.testing.assert_allclose(jac, jac_fd, rtol=1e-4, atol=1e-4 * np.max(np.abs(jac_fd)))
+            self.assertTrue(np.all(solver.jac_sparsity.toarray()[jac != 0.0] != 0.0))
+
+        # LSODA gets the Jacobian packed by bands, jac_packed[uband + i - j, j] = jac[i, j], with lband more rows
+        solver_lsoda = Solver(model=self.model)
+        solver_lsoda.setup(suppress_output=True, method='LSODA', step=1, analytic_jacobian=True)
+        lband, uband = solver_lsoda.lband, solver_lsoda.uband
+        for t in [0.0, 0.1, 0.3]:
+            jac_packed = solver_lsoda.pv_jacobian(t=t, y=y0)
+            self.assertEqual(jac_packed.shape, (2 * lband + uband + 1, len(y0)))
+            self.assertTrue(np.all(jac_packed[lband + uband + 1:] == 0.0))
+            jac = np.zeros((len(y0), len(y0)))
+            for i in range(len(y0)):
+                for j in range(max(0, i - lband), min(len(y0), i + uband + 1)):
+                    jac[i, j] = jac_packed[uband + i - j, j]
+
+            jac_fd = np.zeros(jac.shape)
+            for i, h in enumerate(1.0e-6 * np.maximum(1.0, np.abs(y0))):
+                dy = np.zeros(len(y0))
+                dy[i] = h
+                jac_fd[:, i] = (solver_lsoda.pv_dfdt_global(t=t, y=y0 + dy) -
+                                solver_lsoda.pv_dfdt_global(t=t, y=y0 - dy)) / (2.0 * h)
+            np.testing.assert_allclose(jac, jac_fd, rtol=1e-4, atol=1e-4 * np.max(np.abs(jac_fd)))
+
+        # the LSODA solve with the analytic Jacobian gives the expected outputs
+        model = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                       parobj=KorakianitisMixedModel_parameters(),
+                                       suppress_printing=True)
+        solver_lsoda = Solver(model=model)
+        solver_lsoda.setup(suppress_output=True, method='LSODA', step=1, analytic_jacobian=True)
+        solver_lsoda.solve()
+        self.assertTrue(solver_lsoda.converged)
+        test_ndarray = self.expected_output_errors(model, step=1)
+        self.assertTrue((test_ndarray < RELATIVE_TOLERANCE).all(), f"{test_ndarray}")
+
+
+    def test_index_permutations(self):
+        """
+        Test the index permutations `perm` and `inv_perm` used to apply the RCM reordering of the state variables.
+
+        This test verifies that the permutations are integer arrays inverse of each other, that the dense matrix
+        derived from `perm` applies the same reordering and that a solve with a cycle step size of 3 gives the
+        expected outputs.
+        """
+        perm, inv_perm = self.solver.perm, self.solver.inv_perm
+        self.assertTrue(np.issubdtype(perm.dtype, np.integer) and np.issubdtype(inv_perm.dtype, np.integer))
+        np.testing.assert_array_equal(perm[inv_perm], np.arange(len(perm)))
+        np.testing.assert_array_equal(inv_perm[perm], np.arange(len(perm)))
+
+        y = np.random.rand(len(perm))
+        np.testing.assert_array_equal(self.solver.perm_mat @ y, y[perm])
+        np.testing.assert_array_equal(self.solver.perm_mat.T @ y[perm], y)
+
+        self.solver.setup(suppress_output=True, method='LSODA', step=3)
+        self.solver.solve()
+        self.assertTrue(self.solver.converged or self.solver._Nconv is not None)
+        test_ndarray = self.expected_output_errors(self.model, step=3)
+        self.assertTrue((test_ndarray < RELATIVE_TOLERANCE).all(), f"{test_ndarray}")
+
+
+    def test_vectorized_functions(self):
+        """
+        Test the functions generated when the solver is setup with `vectorized=True`.
+
+        This test verifies that `pv_dfdt_update` and `s_u_update` evaluated on a block of state vectors (one per
+        column) return the same values as evaluating every column separately, that single column blocks
+        keep their shape, and that the valve Jacobians and `time_shift` broadcast over blocks.
+        """
+        solver = Solver(model=self.model)
+        solver.setup(suppress_output=True, method='BDF', step=1, vectorized=True)
+
+        y0 = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_pv_dfdt_update.npy'))
+        y_block = y0[:, np.newaxis] * np.linspace(0.9, 1.1, 4)
+        np.testing.assert_allclose(solver.pv_dfdt_global(t=0.3, y=y_block),
+                                   np.stack([solver.pv_dfdt_global(t=0.3, y=y) for y in y_block.T], axis=1))
+        self.assertEqual(solver.pv_dfdt_global(t=0.3, y=y_block[:, :1]).shape, (len(y0), 1))
+
+        y_temp = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_s_u_update.npy'))
+        y_block = y_temp[:, np.newaxis] * np.linspace(0.9, 1.1, 4)
+        np.testing.assert_allclose(solver.s_u_update(t=0.0, y=y_block),
+                                   np.stack([solver.s_u_update(t=0.0, y=y) for y in y_block.T], axis=1))
+
+        # the valve kernels, their Jacobians and the shifted time accept blocks which cross the switching points
+        rng = np.random.default_rng(0)
+        y_block = np.stack([rng.uniform(-5.0, 5.0, 6), rng.uniform(-5.0, 5.0, 6),
+                            rng.uniform(-1.0, 1.0, 6), np.array([0.0, 1.0e-6, 0.2, 0.5, 0.8, 1.0])])
+        kernels = [(simple_bernoulli_diode_flow_jac, dict(CQ=2.0, RRA=0.1), 2),
+                   (maynard_valve_flow_jac, dict(CQ=2.0, RRA=0.0), 3),
+                   (maynard_phi_law_jac, dict(Ko=0.5, Kc=0.3), 3),
+                   (maynard_impedance_dqdt_jac, dict(CQ=2.0, R=0.1, L=0.01, RRA=0.0), 4)]
+        for fun, kwargs, n in kernels:
+            y_fun = np.vstack([y_block[:2], y_block[3:]]) if n == 3 else y_block[:n]
+            np.testing.assert_allclose(fun(t=0.0, y=y_fun, **kwargs),
+                                       np.stack([fun(t=0.0, y=y, **kwargs) for y in y_fun.T], axis=1),
+                                       err_msg=fun.__name__)
+        t_block = np.linspace(0.0, 0.99, 7)
+        np.testing.assert_allclose(time_shift(t_block, shift=0.3, tcycle=1.0),
+                                   [time_shift(t, shift=0.3, tcycle=1.0) for t in t_block])
+
+
+    def test_state_storage(self):
+        """
+        Test the preallocated array `_asd_values` storing the state variables of the solver.
+
+        This test verifies that the solve writes the expected outputs to a contiguous float64 array of the stored
+        time points and state variables, that the DataFrame `_asd` is only built when it is accessed, shares the
+        memory of the array and is reused, and that the state variables of the model hold the same values.
+        """
+        self.solver.solve()
+        self.assertTrue(self.solver.converged or self.solver._Nconv is not None)
+
+        values = self.solver._asd_values
+        self.assertEqual(values.dtype, np.float64)
+        self.assertTrue(values.flags['C_CONTIGUOUS'])
+        self.assertEqual(values.shape, (self.model.time_object.n_t, len(self.solver._asd_columns)))
+
+        frame = self.solver._asd
+        self.assertIs(self.solver._asd, frame)
+        self.assertTrue(np.shares_memory(frame.values, values))
+        for key in ['v_lv', 'p_lv', 'q_ao']:
+            np.testing.assert_array_equal(self.solver._vd[key]._u.values, values[:, frame.columns.get_loc(key)])
+
+        test_ndarray = self.expected_output_errors(self.model, step=1)
+        self.assertTrue((test_ndarray < RELATIVE_TOLERANCE).all(), f"{test_ndarray}")
+
+
+    def test_compute_secondary_sv(self):
+        """
+        Test the `compute_secondary_sv` method of the solver.
+
+        This test verifies that the secondary state variables computed for a series of state vectors (one per row)
+        match the outputs of `s_u_update` and `optimize` called for every state vector separately, when the
+        optimization is done in blocks smaller than the series.
+        """
+        y_temp = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_s_u_update.npy'))
+        values = y_temp[np.newaxis, :] * np.linspace(0.9, 1.1, 5)[:, np.newaxis]
+        keys4  = np.array(list(self.solver._global_ssv_update_fun.keys()))
+
+        np.testing.assert_allclose(self.solver.compute_secondary_sv(values),
+                                   np.stack([self.solver.s_u_update(t=0.0, y=y) for y in values]))
+
+        self.solver._optimize_secondary_sv = True
+        expected = []
+        for y in values.copy():
+            y[keys4] = self.solver.s_u_update(0.0, y)
+            expected.append(self.solver.optimize(y, keys4))
+        np.testing.assert_allclose(self.solver.compute_secondary_sv(values, block_size=2), np.stack(expected),
+                                   rtol=RELATIVE_TOLERANCE)
+
+
+    def test_steady_state_anderson(self):
+        """
+        Test the `solve` method of the solver when setup with `steady_state='anderson'`.
+
+        This test verifies that the accelerated solver converges in fewer cycles than the reference solver, which
+        uses a tight convergence tolerance, and that the last cycles of both solvers match.
+        """
+        outputs = {}
+        for name, options in [('reference', {'step_tol': 1e-4}), ('anderson', {'steady_state': 'anderson'})]:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='LSODA', compiled=True, **options)
+            solver.solve()
+            self.assertTrue(solver.converged)
+            outputs[name] = (solver.Nconv, solver._asd.tail(model.time_object.n_c).values)
+
+        self.assertLess(outputs['anderson'][0], outputs['reference'][0])
+        expected = outputs['reference'][1]
+        np.testing.assert_allclose(outputs['anderson'][1], expected,
+                                   rtol=1e-2, atol=1e-2 * np.max(np.abs(expected)))
+
+
+    def test_continuous_integration(self):
+        """
+        Test the `solve` method of the solver when setup with `continuous=True`.
+
+        This test verifies that integrating all the cycles with one persistent integrator, sampled through its dense
+        output, gives the same number of cycles and the same last cycle as integrating every cycle with `solve_ivp`.
+        """
+        outputs = {}
+        for continuous in [False, True]:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='BDF', compiled=True, continuous=continuous)
+            solver.solve()
+            self.assertTrue(solver.converged)
+            outputs[continuous] = (solver.Nconv, solver._asd.tail(model.time_object.n_c).values)
+
+        self.assertEqual(outputs[True][0], outputs[False][0])
+        expected = outputs[False][1]
+        np.testing.assert_allclose(outputs[True][1], expected,
+                                   rtol=1e-2, atol=1e-2 * np.max(np.abs(expected)))
+
+    def test_fixed_step_integrators(self):
+        """
+        Test the `solve` method of the solver with the compiled fixed step SDIRK integrator.
+
+        This test verifies that the fixed step method requires the compiled functions and that, with the steps set
+        by the output time grid, it converges in the same number of cycles as LSODA to a close periodic solution.
+        """
+        with self.assertRaises(Exception):
+            Solver(model=self.model).setup(suppress_output=True, method='SDIRK')
+
+        outputs = {}
+        for method in ['LSODA', 'SDIRK']:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method=method, compiled=True)
+            solver.solve()
+            self.assertTrue(solver.converged)
+            outputs[method] = (solver.Nconv, solver._asd.tail(model.time_object.n_c).values)
+
+        self.assertEqual(outputs['SDIRK'][0], outputs['LSODA'][0])
+        expected = outputs['LSODA'][1]
+        np.testing.assert_allclose(outputs['SDIRK'][1], expected,
+                                   rtol=5e-2, atol=5e-2 * np.max(np.abs(expected)))
+
+
+    def test_valve_events(self):
+        """
+        Test the `solve` method of the solver when setup with `events=True`.
+
+        This test verifies that restarting the integration at the openings and closings of the valves gives the same
+        solution as the plain integration, and that the valve timings derived from the located events match the
+        ones found from the sampled pressures by `BaseAnalysis.compute_opening_closing_valve`.
+        """
+        outputs = {}
+        for events in [False, True]:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='LSODA', compiled=True, events=events)
+            solver.solve()
+            self.assertTrue(solver.converged)
+            analysis = BaseAnalysis(model)
+            for valve in ['ao', 'mi', 'po', 'ti']:
+                analysis.compute_opening_closing_valve(valve)
+            outputs[events] = (solver.Nconv, solver._asd.tail(model.time_object.n_c).values, analysis.valves)
+
+        self.assertEqual(outputs[True][0], outputs[False][0])
+        self.assertGreater(len(solver.events), 0)
+        expected = outputs[False][1]
+        np.testing.assert_allclose(outputs[True][1], expected,
+                                   rtol=1e-2, atol=1e-2 * np.max(np.abs(expected)))
+        for valve in ['ao', 'mi', 'po', 'ti']:
+            self.assertIsNotNone(outputs[True][2][valve].t_open)
+            self.assertLessEqual(abs(outputs[True][2][valve].open   - outputs[False][2][valve].open), 1)
+            self.assertLessEqual(abs(outputs[True][2][valve].closed - outputs[False][2][valve].closed), 1)
+
+
+    def test_compute_budgets(self):
+        """
+        Test the `solve` method of the solver when setup with compute budgets.
+
+        This test verifies that the solver is aborted as soon as the number of evaluations of the derivatives
+        exceeds its budget, keeping the cycles completed before the abort, and that the reason of the abort is
+        reported. Loose budgets leave the solution unchanged.
+        """
+        for budgets, reason in [({'max_nfev': 20000}, 'nfev'), ({'min_step': 1e-4}, 'min_step'),
+                                ({'max_nfev': 10**9, 'divergence_window': 5}, None)]:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='LSODA', **budgets)
+            solver.solve()
+            if reason is None:
+                self.assertTrue(solver.converged)
+                self.assertIsNone(solver.abort_reason)
+                continue
+            self.assertFalse(solver.converged)
+            self.assertEqual(solver.abort_reason['reason'], reason)
+            self.assertEqual(solver.Nconv, solver.abort_reason['cycle'] - 1)
+            self.assertEqual(len(solver._asd), (solver.Nconv + 1) * (model.time_object.n_c - 1) + 1)
+
+
+    def test_solver_stats(self):
+        """
+        Test the statistics of the `solve` method of the solver.
+
+        This test verifies that the statistics have one record per integrated cycle, that the counters of the
+        records add up to the totals of the solve, that the rejected steps are not reported by LSODA and that the
+        convergence errors of the cycles are the ones used in the convergence test.
+        """
+        for method in ['LSODA', 'BDF']:
+            model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method=method)
+            solver.solve()
+            self.assertTrue(solver.converged)
+
+            cycles = solver.stats.cycles
+            totals = solver.stats.totals
+            self.assertEqual(len(cycles), solver.Nconv + 1)
+            self.assertEqual(totals['n_cycles'], solver.Nconv + 1)
+            self.assertGreater(totals['nfev'], 0)
+            self.assertEqual(cycles['nfev'].sum(), totals['nfev'])
+            self.assertEqual(cycles['n_steps'].sum(), totals['n_steps'])
+            self.assertEqual(np.isnan(totals['n_rejected']), method == 'LSODA')
+            self.assertGreater(totals['total_time'], totals['cycles_time'])
+
+            residuals = cycles[solver._cols].max(axis=1).values
+            self.assertTrue(np.isnan(residuals[0]))
+            np.testing.assert_allclose(residuals[1:], solver._residuals)
+            self.assertLessEqual(residuals[-1], solver._step_tol)
+
+
+    def test_profiling(self):
+        """
+        Test the profiling mode of the solver.
+
+        This test verifies that the report has one row per primary and secondary state variable, sorted by time,
+        that all the primary update functions are called at every evaluation of the derivatives and that the report
+        by function name adds up the calls of the state variables sharing a function.
+        """
+        model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict,
+                                        parobj=KorakianitisMixedModel_parameters(),
+                                        suppress_printing=True)
+        solver = Solver(model=model)
+        solver.setup(suppress_output=True, method='LSODA', profile=True)
+        solver.solve()
+        self.assertTrue(solver.converged)
+
+        report = solver.profile_report()
+        self.assertEqual(len(report), len(solver._global_psv_update_fun) + len(solver._global_ssv_update_fun))
+        self.assertTrue(np.all(np.diff(report['time'].values) <= 0.0))
+        primary = report[report['kind'] == 'primary']
+        self.assertEqual(primary['calls'].nunique(), 1)
+        self.assertGreater(primary['calls'].iloc[0], 0)
+
+        by_function = solver.profile_report(by='function')
+        self.assertEqual(by_function['calls'].sum(), report['calls'].sum())
+        self.assertEqual(set(by_function['function']), set(report['function']))
+
+        solver.setup(suppress_output=True, method='LSODA')
+        with self.assertRaises(Exception):
+            solver.profile_report()
+
+
+    def test_rolling_window(self):
+        """
+        Test the `solve` method of the solver with a rolling window of stored cycles.
+
+        This test verifies that the model and the solver only allocate the cycles of the window, that after the
+        solve the stored time points are the ones of the last cycles and that the solution is the same as the one
+        obtained storing all the cycles. A window shorter than the cycles compared by the convergence checks is
+        rejected before the model is built.
+        """
+        window = 3
+        outputs = dict()
+        for time_setup_dict in [self.time_setup_dict, dict(self.time_setup_dict, window=window)]:
+            model  = KorakianitisMixedModel(time_setup_dict=time_setup_dict,
+                                            parobj=KorakianitisMixedModel_parameters(),
+                                            suppress_printing=True)
+            n_t = model.time_object.n_c - 1
+            if 'window' in time_setup_dict:
+                self.assertEqual(len(model.all_sv_data), window * n_t + 1)
+            solver = Solver(model=model)
+            solver.setup(suppress_output=True, method='LSODA')
+            solver.solve()
+            self.assertTrue(solver.converged)
+            outputs[len(time_setup_dict)] = (solver.Nconv, solver._asd.tail(n_t + 1).values,
+                                             model.time_object._sym_t.values[-(n_t + 1):])
+
+        Nconv, values, t = outputs[len(self.time_setup_dict) + 1]
+        self.assertEqual(len(solver._asd), min(window, Nconv + 1) * n_t + 1)
+        self.assertEqual(model.time_object.n_t, len(solver._asd))
+        np.testing.assert_array_equal(model.time_object.time['sym_t'].values, model.time_object._sym_t.values)
+        self.assertEqual(Nconv, outputs[len(self.time_setup_dict)][0])
+        np.testing.assert_array_equal(t, outputs[len(self.time_setup_dict)][2])
+        np.testing.assert_allclose(values, outputs[len(self.time_setup_dict)][1])
+
+        # the model which is not built is collected without errors
+        unraisable, hook = [], sys.unraisablehook
+        sys.unraisablehook = unraisable.append
+        try:
+            with self.assertRaises(Exception):
+                KorakianitisMixedModel(time_setup_dict=dict(self.time_setup_dict, window=1),
+                                       parobj=KorakianitisMixedModel_parameters(),
+                                       suppress_printing=True)
+            gc.collect()
+        finally:
+            sys.unraisablehook = hook
+        self.assertEqual(unraisable, [])
+
+
+    def test_set_parameters(self):
+        """
+        Test the `set_parameters` method of the solver.
+
+        This test verifies that, once its parameters and initial values are set to the ones of a model with a
+        stiffer left ventricle and a shorter heart cycle, a compiled solver converges in the same number of cycles,
+        over the same time points and to the same solution as a solver built for that model.
+        """
+        def build_model(scale, tcycle):
+            parobj = KorakianitisMixedModel_parameters()
+            parobj._set_comp('lv', ['lv',], E_act=parobj['lv']['E_act'] * scale)
+            return KorakianitisMixedModel(time_setup_dict=dict(self.time_setup_dict, tcycle=tcycle,
+                                                                dt=self.time_setup_dict['dt'] * tcycle),
+                                          parobj=parobj,
+                                          suppress_printing=True)
+
+        solver = Solver(model=build_model(1.0, 1.0))
+        solver.setup(suppress_output=True, method='LSODA', compiled=True)
+        solver.solve()
+
+        model_2  = build_model(1.2, 0.8)
+        solver_2 = Solver(model=model_2)
+        solver_2.setup(suppress_output=True, method='LSODA', compiled=True)
+        solver_2.solve()
+
+        P, y0 = EnsembleSolver.member_parameters(build_model(1.2, 0.8))
+        solver.set_parameters(P, y0=y0, dt=model_2.time_object.dt)
+        solver.solve()
+        self.assertTrue(solver.converged)
+        self.assertEqual(solver.Nconv, solver_2.Nconv)
+        np.testing.assert_array_equal(solver._to._sym_t.values, model_2.time_object._sym_t.values)
+        np.testing.assert_allclose(solver._asd.values, solver_2._asd.values)
+
+        with self.assertRaises(Exception):
+            solver.set_parameters(P[:-1])
+
+
+    def test_disk_cache(self):
+        """
+        Test the `cache_dir` option of the solver.
+
+        This test verifies that two models with different parameters have the same topology hash, that the first
+        solver writes the structure and the generated code to the cache directory and that the second one loads
+        the compiled functions from the cache (numba cache hits) and finds the solution of a solver without cache.
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            solvers = []
+            for scale in [1.0, 1.2]:
+                parobj = KorakianitisMixedModel_parameters()
+                parobj._set_comp('lv', ['lv',], E_act=parobj['lv']['E_act'] * scale)
+                model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict, parobj=parobj,
+                                                suppress_printing=True)
+                solver = Solver(model=model)
+                solver.setup(suppress_output=True, method='LSODA', compiled=True, cache_dir=cache_dir)
+                solver.solve()
+                solvers.append(solver)
+
+            key = solvers[0].topology_hash
+            self.assertEqual(solvers[1].topology_hash, key)
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, f'structure_{key}.npz')))
+            self.assertTrue(os.path.exists(os.path.join(cache_dir, f'compiled_{key}.py')))
+            self.assertGreater(sum(solvers[1]._compiled_model.pv_dfdt_update.stats.cache_hits.values()), 0)
+            np.testing.assert_array_equal(solvers[1].perm, solvers[0].perm)
+
+        model  = KorakianitisMixedModel(time_setup_dict=self.time_setup_dict, parobj=parobj, suppress_printing=True)
+        solver = Solver(model=model)
+        solver.setup(suppress_output=True, method='LSODA', compiled=True)
+        solver.solve()
+        self.assertEqual(solvers[1].Nconv, solver.Nconv)
+        np.testing.assert_array_equal(solvers[1]._asd.values, solver._asd.values)
+
+
+    def test_newton_secondary(self):
+        """
+        Test the Newton solver used by `optimize` when `optimize_secondary_sv` is on.
+
+        This test verifies that the columns sharing a color have no row in common and that `newton_secondary`
+        solves a coupled (linear) system of secondary variables exactly. For the model, the secondary variables
+        found by the python and the compiled solvers match the least squares fit of their residual, including
+        when the iteration starts from a previous solution, and cancel the residual `s_u_residual` of the solvers.
+        """
+        B = np.array([[0.0, 0.5, 0.0, 0.0],
+                      [0.0, 0.0, 0.0, 0.2],
+                      [0.3, 0.0, 0.0, 0.0],
+                      [0.0, 0.0, 0.1, 0.0]])
+        pattern = B != 0.0
+        colors  = column_coloring(pattern)
+        for c in range(colors.max() + 1):
+            self.assertLessEqual(np.max(np.sum(pattern[:, colors == c], axis=1)), 1)
+        self.assertLess(colors.max() + 1, len(colors))
+
+        keys = np.array([1, 2, 4, 5])
+        rhs  = np.array([1.0, -2.0, 3.0, 0.5])
+        y = np.zeros(6)
+        self.assertTrue(newton_secondary(lambda t, y, P: B @ y[keys] + rhs, 0.0, y, None, keys, pattern, colors,
+                                         1e-12, 10))
+        np.testing.assert_allclose(y[keys], np.linalg.solve(np.eye(4) - B, rhs))
+
+        y_temp = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_s_u_update.npy'))
+        keys4  = np.array(list(self.solver._global_ssv_update_fun.keys()))
+        y_temp[keys4] = self.solver.s_u_update(0.0, y_temp)
+
+        def residual(z):
+            y = y_temp.copy()
+            y[keys4] = z
+            return z - self.solver.s_u_update(0.0, y)
+        expected = least_squares(residual, y_temp[keys4], xtol=1e-15, ftol=1e-15, gtol=1e-15).x
+
+        compiled = Solver(model=self.model)
+        compiled.setup(suppress_output=True, method='LSODA', optimize_secondary_sv=True, compiled=True)
+        for solver in [self.solver, compiled]:
+            np.testing.assert_allclose(solver.optimize(y_temp.copy(), keys4), expected, rtol=1e-8)
+            np.testing.assert_allclose(solver.optimize(y_temp.copy(), keys4, 0.9 * expected), expected, rtol=1e-8)
+            np.testing.assert_allclose(solver.s_u_residual(expected, y_temp.copy(), keys4), 0.0, atol=1e-8)
+
+
+    def test_secondary_order(self):
+        """
+        Test `Compiler.secondary_order` and the `s_u_sweep` functions of the solver.
+
+        The dependency pattern has a chain (0 reads 2, which reads 3), a loop between two variables (1 and 4) and a
+        variable reading itself (5). The chain is evaluated from its end and the loops are flagged. For the model,
+        the python and compiled sweeps update the secondary variables of a state vector in place and match
+        `s_u_update`.
+        """
+        pattern = np.zeros((6, 6), dtype=bool)
+        for i, j in [(0, 2), (2, 3), (1, 4), (4, 1), (5, 5)]:
+            pattern[i, j] = True
+        order = secondary_order(pattern)
+        self.assertEqual([(list(comp), loop) for comp, loop in order],
+                         [([1, 4], True), ([3], False), ([2], False), ([0], False), ([5], True)])
+
+        y_temp = np.load(os.path.join(self.base_dir, 'inputs_for_tests', 'inputs_for_s_u_update.npy'))
+        keys4  = np.array(list(self.solver._global_ssv_update_fun.keys()))
+        compiled = Solver(model=self.model)
+        compiled.setup(suppress_output=True, method='LSODA', compiled=True)
+        for solver in [self.solver, compiled]:
+            y = y_temp.copy()
+            np.testing.assert_allclose(solver.s_u_sweep(0.0, y), solver.s_u_update(0.0, y_temp))
+            np.testing.assert_allclose(y[keys4], solver.s_u_update(0.0, y_temp))
+
+
 if __name__ == '__main__':
     unittest.main()